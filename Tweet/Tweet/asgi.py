@@ -13,4 +13,10 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Tweet.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Static files are answered in front of Django, not by a (sync-only)
+# middleware in the async chain, see tweet_app/static_asgi.py
+from tweet_app.static_asgi import StaticFilesApp  # noqa: E402
+
+application = StaticFilesApp(django_application)
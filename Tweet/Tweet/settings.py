@@ -13,6 +13,8 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 from pathlib import Path
 import os
 
+from .database import database_config, replica_configs
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -47,22 +49,27 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'tweet_app.instrumentation.InstrumentationMiddleware',
+    'tweet_app.replicas.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    # No WhiteNoiseMiddleware: it is sync-only and would put every request of
+    # the async stack through a thread. Tweet/asgi.py serves static files.
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'tweet_app.ratelimit.RateLimitMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'tweet_app.middleware.NoCacheMiddleware'
+    'tweet_app.middleware.CachePolicyMiddleware'
 ]
 
 ROOT_URLCONF = 'Tweet.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # Django templates, plus render timing for InstrumentationMiddleware
+        'BACKEND': 'tweet_app.instrumentation.TimedDjangoTemplates',
         'DIRS': [os.path.join(BASE_DIR, 'templates')],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -81,12 +88,76 @@ WSGI_APPLICATION = 'Tweet.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# Picked from DATABASE_URL and tuned per engine (WAL for SQLite, persistent or
+# pooled connections for Postgres), see Tweet/database.py
 DATABASES = {
+    'default': database_config(os.environ.get('DATABASE_URL', 'sqlite:///db.sqlite3'), BASE_DIR),
+}
+
+# Read replicas (tweet_app/replicas.py): reads go to a healthy replica unless
+# the request, or the same browser within REPLICA_PIN_SECONDS, has written
+DATABASES.update(replica_configs(os.environ.get('REPLICA_DATABASE_URLS', ''), BASE_DIR))
+DATABASE_ROUTERS = ['tweet_app.replicas.ReplicaRouter']
+REPLICA_PIN_SECONDS = 5
+
+
+# Caches
+# "default" is per process (fragment cache, rate counters...). "shared" is seen
+# by every worker process: Redis when REDIS_URL is set, else files on local
+# disk, so all gunicorn workers on the host agree on sessions and users.
+# File cache entries are unpickled on read, so they live in a directory only
+# this user can write (not /tmp, where anyone on the host could plant one).
+SHARED_CACHE_DIR = os.environ.get('SHARED_CACHE_DIR', os.path.join(BASE_DIR, 'cache'))
+if not os.environ.get('REDIS_URL'):
+    os.makedirs(SHARED_CACHE_DIR, mode=0o700, exist_ok=True)
+    os.chmod(SHARED_CACHE_DIR, 0o700)
+
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ['REDIS_URL'],
+    } if os.environ.get('REDIS_URL') else {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': SHARED_CACHE_DIR,
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+}
+
+# Sessions are read from the cache and only written through to the database
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+SESSION_CACHE_ALIAS = 'shared'
+
+# Email + password login, logged-in users served from the cache (tweet_app/backends.py)
+AUTHENTICATION_BACKENDS = [
+    'tweet_app.backends.EmailBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
+USER_CACHE_ALIAS = 'shared'
+
+# Per-view throttles for RateLimitMiddleware: url name -> (rate, key), see
+# tweet_app/ratelimit.py. Login and OTP limits are set in views.py.
+RATE_LIMITS = {
+    '*': ('600/m', 'ip'),
+    'tweet_like': ('60/m', 'user'),
 }
+# With Redis, buckets are shared so all workers count a client together;
+# otherwise each process keeps its own (a file cache per request is too slow).
+# The login and OTP limits (views.py) are always counted in the "shared"
+# cache: they guard passwords and paid emails, and see little traffic.
+RATELIMIT_STORE = (
+    'tweet_app.ratelimit.shared_store' if os.environ.get('REDIS_URL') else 'tweet_app.ratelimit.LocalStore'
+)
+# Render puts one proxy in front of the app
+RATELIMIT_PROXY_COUNT = 1 if os.environ.get('DJANGO_ENV') == 'production' else 0
+
+# Live updates (tweet_app/events.py) go through a Redis pub/sub channel when
+# REDIS_URL is set, so a stream on any worker sees events from all of them and
+# from the job worker; otherwise each process only sees its own.
+REDIS_URL = os.environ.get('REDIS_URL', '')
+EVENT_BROKER = 'tweet_app.events.redis_broker' if REDIS_URL else 'tweet_app.events.LocalBroker'
 
 
 # Password validation
@@ -122,6 +193,22 @@ USE_TZ = True
 
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/5.2/howto/static-files/
+# static/bundle/ is built by `manage.py build_assets` (tweet_app/assets.py);
+# collectstatic adds content hashes and .gz/.br copies, WhiteNoise (wrapped
+# around the ASGI app) serves the hashed names with a far-future immutable
+# Cache-Control; runserver uses Django's static handler
+STATIC_URL = '/static/'
+STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
+STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
+
+# Without a built bundle, pages load Bootstrap and htmx from the CDNs in
+# development only; production fails loudly instead (see assets.py)
+ASSETS_CDN_FALLBACK = DEBUG
+
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'tweet_app.assets.StaticStorage'},
+}
 
 
 # Default primary key field type
@@ -133,6 +220,26 @@ LOGIN_URL = 'login'
 LOGIN_REDIRECT_URL = 'tweet_list'
 LOGOUT_REDIRECT_URL = 'login'
 
+# Browser/proxy cache lifetime of pages served to logged-out visitors
+ANONYMOUS_CACHE_SECONDS = 60
+
+# One JSON line per request (queries, DB/template time) from tweet_app.instrumentation.
+# Only the N+1 warnings by default; REQUEST_LOG_LEVEL=INFO logs every request.
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'tweet_app.requests': {
+            'handlers': ['console'],
+            'level': os.environ.get('REQUEST_LOG_LEVEL', 'WARNING'),
+            'propagate': False,
+        },
+    },
+}
+
 
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 EMAIL_HOST = 'smtp.gmail.com'
@@ -161,20 +268,14 @@ if os.environ.get('DJANGO_ENV') == 'production':
     AWS_S3_REGION_NAME = os.environ.get('AWS_S3_REGION_NAME') 
     AWS_S3_CUSTOM_DOMAIN = f'{AWS_STORAGE_BUCKET_NAME}.s3.amazonaws.com'
     AWS_S3_FILE_OVERWRITE = False
-    DEFAULT_FILE_STORAGE = 'storages.backends.s3boto3.S3Boto3Storage'
+    # (DEFAULT_FILE_STORAGE/STATICFILES_STORAGE are gone since Django 5.1, STORAGES replaces them)
+    STORAGES['default'] = {'BACKEND': 'storages.backends.s3boto3.S3Boto3Storage'}
     AWS_LOCATION_MEDIA = 'media'
     MEDIA_URL = f'https://{AWS_S3_CUSTOM_DOMAIN}/{AWS_LOCATION_MEDIA}/'
-    # WhiteNoise settings
-    STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
-    STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
-    STATIC_URL = '/static/'
 
 else:
     # LOCAL DEVELOPMENT SETTINGS
     MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
     MEDIA_URL = '/media/'
 
-    STATIC_URL = 'static/'
-    STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
-
 
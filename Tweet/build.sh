@@ -0,0 +1,10 @@
+#!/usr/bin/env bash
+# Deploy build (Render build command: ./build.sh, run from this directory)
+set -o errexit
+
+pip install -r requirements.txt
+# The self-hosted CSS/JS/font bundle, checked against assets/vendor/SHA384SUMS
+python manage.py build_assets
+# Hashed, gzip/brotli-compressed copies in STATIC_ROOT for WhiteNoise
+python manage.py collectstatic --noinput
+python manage.py check --deploy --fail-level ERROR
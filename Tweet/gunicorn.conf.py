@@ -0,0 +1,17 @@
+# Gunicorn settings for production (Procfile: gunicorn -c gunicorn.conf.py)
+# Uvicorn workers run the ASGI app, so one worker process serves many slow
+# clients and HTMX requests concurrently instead of one request at a time.
+import multiprocessing
+import os
+
+wsgi_app = 'Tweet.asgi:application'
+worker_class = 'uvicorn_worker.UvicornWorker'
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', min(multiprocessing.cpu_count() * 2 + 1, 4)))
+
+# Recycle workers now and then, and give slow clients time to finish
+max_requests = 2000
+max_requests_jitter = 200
+timeout = 60
+graceful_timeout = 30
+keepalive = 5
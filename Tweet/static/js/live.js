@@ -0,0 +1,24 @@
+// Live like counts and "new tweets" notice, pushed by the server (tweet_app/events.py)
+(function () {
+    if (!window.EventSource) return;
+    var url = document.body.dataset.eventsUrl;
+    if (!url || !document.querySelector('[data-like-count], #new-tweets')) return;
+    var source = new EventSource(url);
+    source.addEventListener('likes', function (e) {
+        var counts = JSON.parse(e.data);
+        Object.keys(counts).forEach(function (id) {
+            var n = counts[id];
+            document.querySelectorAll('[data-like-count="' + id + '"]').forEach(function (el) {
+                el.textContent = n + (n === 1 ? ' Like' : ' Likes');
+            });
+        });
+    });
+    var fresh = 0;
+    source.addEventListener('tweet', function () {
+        var notice = document.getElementById('new-tweets');
+        if (!notice) return;
+        fresh += 1;
+        notice.querySelector('a').textContent = 'Show ' + fresh + ' new tweet' + (fresh === 1 ? '' : 's');
+        notice.classList.remove('d-none');
+    });
+})();
@@ -1,5 +1,122 @@
 from django.contrib import admin
-from .models import Tweet
+from django.contrib.admin import helpers
+from django.contrib.admin.utils import model_ngettext
+from django.contrib.auth.admin import UserAdmin
+from django.contrib.auth.models import User
+from django.http import HttpResponseRedirect
+from django.template.response import TemplateResponse
+from django.urls import reverse
+from .models import Tweet, Job, DeadJob
+from . import deletion, tasks
 # Register your models here.
 
-admin.site.register(Tweet)  
\ No newline at end of file
+
+class BulkDeleteMixin:
+    """
+    No stock "delete selected" action, and a delete page that doesn't walk
+    every row the delete would cascade to: deletion goes through deletion.py.
+    """
+
+    def get_actions(self, request):
+        actions = super().get_actions(request)
+        actions.pop('delete_selected', None)
+        return actions
+
+    def get_deleted_objects(self, objs, request):
+        objs = list(objs)
+        perms_needed = set() if self.has_delete_permission(request) else {self.opts.verbose_name}
+        return [str(obj) for obj in objs], {self.opts.verbose_name_plural: len(objs)}, perms_needed, []
+
+    def confirm_bulk_delete(self, request, queryset, action, note=''):
+        """
+        The "Are you sure?" page of Django's delete_selected, posting back to
+        `action`. Returns None once the user has confirmed.
+        """
+        if request.POST.get('post'):
+            return None
+        deletable_objects, model_count, perms_needed, protected = self.get_deleted_objects(queryset, request)
+        context = {
+            **self.admin_site.each_context(request),
+            'title': "Delete multiple objects",
+            'subtitle': None,
+            'objects_name': str(model_ngettext(queryset)),
+            'deletable_objects': [deletable_objects],
+            'model_count': dict(model_count).items(),
+            'queryset': queryset,
+            'opts': self.opts,
+            'action_checkbox_name': helpers.ACTION_CHECKBOX_NAME,
+            'media': self.media,
+            'action': action,
+            'note': note,
+        }
+        request.current_app = self.admin_site.name
+        return TemplateResponse(request, 'admin/bulk_delete_confirmation.html', context)
+
+
+@admin.register(Tweet)
+class TweetAdmin(BulkDeleteMixin, admin.ModelAdmin):
+    actions = ['delete_in_batches']
+
+    @admin.action(permissions=['delete'], description="Delete selected tweets in batches (no per-row signals)")
+    def delete_in_batches(self, request, queryset):
+        confirmation = self.confirm_bulk_delete(request, queryset, 'delete_in_batches')
+        if confirmation:
+            return confirmation
+        self.log_deletions(request, queryset)
+        deleted = deletion.delete_tweets(queryset)
+        self.message_user(request, f"Deleted {deleted} tweets.")
+
+    def delete_model(self, request, obj):
+        deletion.delete_tweets(Tweet.objects.filter(pk=obj.pk))
+
+    def delete_queryset(self, request, queryset):
+        deletion.delete_tweets(queryset)
+
+
+# Heavy accounts take too long for a request, the worker deletes them (deletion.py)
+admin.site.unregister(User)
+
+
+@admin.register(User)
+class AccountAdmin(BulkDeleteMixin, UserAdmin):
+    actions = ['delete_in_background']
+
+    @admin.action(permissions=['delete'], description="Delete selected accounts and their tweets in the background")
+    def delete_in_background(self, request, queryset):
+        confirmation = self.confirm_bulk_delete(
+            request, queryset, 'delete_in_background',
+            note="The accounts are deleted by the job worker and stay listed until it gets to them.",
+        )
+        if confirmation:
+            return confirmation
+        self.log_deletions(request, queryset)
+        user_ids = list(queryset.values_list('pk', flat=True))
+        tasks.delete_users.delay(user_ids)
+        self.message_user(request, f"Queued deletion of {len(user_ids)} accounts.")
+
+    def log_deletions(self, request, queryset):
+        # Only queued here: the history says so, the worker does the deleting
+        return [self.log_change(request, obj, "Deletion scheduled.") for obj in queryset]
+
+    def delete_model(self, request, obj):
+        tasks.delete_users.delay([obj.pk])
+
+    def delete_queryset(self, request, queryset):
+        tasks.delete_users.delay(list(queryset.values_list('pk', flat=True)))
+
+    def response_delete(self, request, obj_display, obj_id):
+        # The account is still there until the worker gets to it
+        self.message_user(request, f"Queued deletion of {obj_display}.")
+        return HttpResponseRedirect(reverse('admin:auth_user_changelist'))
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('name', 'status', 'attempts', 'run_at', 'created_at')
+    list_filter = ('status', 'name')
+
+
+@admin.register(DeadJob)
+class DeadJobAdmin(admin.ModelAdmin):
+    list_display = ('name', 'attempts', 'failed_at')
+    list_filter = ('name',)
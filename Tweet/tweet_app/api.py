@@ -0,0 +1,197 @@
+"""
+Read-only JSON API over the tweets, streamed.
+
+    GET /api/tweets/                     newest first, ?sort=top for the top feed
+    GET /api/users/<username>/tweets/    one author, newest first
+    GET /api/search/?q=...               ranked like the search page
+
+Query parameters:
+  - fields: comma-separated names from FIELDS (default DEFAULT_FIELDS)
+  - limit: rows per page, 1 to MAX_LIMIT (default PAGE_SIZE)
+  - cursor: the "next" of the previous page (same cursors as the HTML feeds)
+  - format=ndjson, or Accept: application/x-ndjson: one object per line,
+    followed by a {"next": cursor} line when there is another page.
+    Otherwise the body is {"results": [...], "next": cursor or null}.
+
+Rows are read with .values() of only the selected columns (plus the
+pagination key) through aiterator(chunk_size=CHUNK_SIZE) and written out as
+they arrive, in pieces of about FLUSH_BYTES: no model instances, and memory
+stays at one chunk however large the page.
+
+The body is read after the view and the middleware have returned, when
+ReplicaMiddleware no longer routes the request (replicas.py). stream()
+asks the router for the database while the request is still being handled
+and the row generators read from that alias.
+"""
+import json
+
+from asgiref.sync import sync_to_async
+from django.core.files.storage import default_storage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import router
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
+
+from . import pagination, ranking
+from .pagination import PAGE_SIZE, encode_cursor, pack_cursor
+from .search import search_hits
+
+# Public name -> column
+FIELDS = {
+    'id': 'id',
+    'username': 'user__username',
+    'user_id': 'user_id',
+    'text': 'text',
+    'created_at': 'created_at',
+    'updated_at': 'updated_at',
+    'like_count': 'like_count',
+    'score': 'score',
+    'photo': 'photo',
+}
+DEFAULT_FIELDS = ('id', 'username', 'text', 'created_at', 'like_count')
+MAX_LIMIT = 1000
+CHUNK_SIZE = 500
+FLUSH_BYTES = 16 * 1024
+NDJSON = 'application/x-ndjson'
+
+# sort -> (page_query, key columns, cursor of the last row)
+ORDERS = {
+    'latest': (
+        pagination.page_query, ('created_at', 'id'),
+        lambda row: encode_cursor(row['created_at'], row['id']),
+    ),
+    'top': (
+        ranking.page_query, ('score', 'id'),
+        lambda row: pack_cursor(repr(row['score']), row['id']),
+    ),
+}
+
+
+class Page:
+    """Where the row generators leave the next cursor once they are done."""
+
+    def __init__(self):
+        self.next = None
+
+
+def parse_fields(value):
+    if not value:
+        return list(DEFAULT_FIELDS)
+    fields = list(dict.fromkeys(name.strip() for name in value.split(',') if name.strip()))
+    unknown = [name for name in fields if name not in FIELDS]
+    if unknown or not fields:
+        raise ValueError(f"unknown fields {', '.join(unknown)}, pick from {', '.join(FIELDS)}")
+    return fields
+
+
+def parse_limit(value):
+    if not value:
+        return PAGE_SIZE
+    try:
+        limit = int(value)
+    except ValueError:
+        limit = 0
+    if not 1 <= limit <= MAX_LIMIT:
+        raise ValueError(f'limit must be a number from 1 to {MAX_LIMIT}')
+    return limit
+
+
+def columns(fields, *keys):
+    return list(dict.fromkeys([*(FIELDS[name] for name in fields), *keys]))
+
+
+def project(row, fields):
+    item = {name: row[FIELDS[name]] for name in fields}
+    if 'photo' in item:
+        item['photo'] = default_storage.url(item['photo']) if item['photo'] else None
+    return item
+
+
+async def keyset_rows(queryset, fields, limit, cursor, sort, page, using):
+    page_query, keys, cursor_of = ORDERS[sort]
+    rows = page_query(queryset.using(using), cursor).values(*columns(fields, *keys))[:limit + 1]
+    count = 0
+    last = None
+    async for row in rows.aiterator(chunk_size=CHUNK_SIZE):
+        # The extra row only tells there is a next page
+        if count == limit:
+            page.next = cursor_of(last)
+        else:
+            count += 1
+            last = row
+            yield row
+
+
+async def search_rows(query, fields, limit, cursor, page, using):
+    from .models import Tweet
+
+    ids, page.next = await sync_to_async(search_hits)(query, cursor, limit, using=using)
+    for start in range(0, len(ids), CHUNK_SIZE):
+        chunk = ids[start:start + CHUNK_SIZE]
+        rows = Tweet.objects.using(using).filter(pk__in=chunk).values(*columns(fields, 'id'))
+        by_id = {row['id']: row async for row in rows}
+        for pk in chunk:
+            if pk in by_id:
+                yield by_id[pk]
+
+
+async def body(rows, fields, page, ndjson):
+    encode = DjangoJSONEncoder(separators=(',', ':'), ensure_ascii=False).encode
+    out = [] if ndjson else ['{"results":[']
+    separator = ''
+    size = 0
+    async for row in rows:
+        item = encode(project(row, fields))
+        if ndjson:
+            out.append(item + '\n')
+        else:
+            out.append(separator + item)
+            separator = ','
+        size += len(item)
+        if size >= FLUSH_BYTES:
+            yield ''.join(out)
+            out, size = [], 0
+    if ndjson:
+        if page.next:
+            out.append(json.dumps({'next': page.next}) + '\n')
+    else:
+        out.append(f'],"next":{json.dumps(page.next)}}}')
+    yield ''.join(out)
+
+
+def stream(request, rows_for):
+    """
+    The response for one page: rows_for(fields, limit, cursor, page, using)
+    gives the rows, bad parameters get a 400 before anything is read.
+    """
+    from .models import Tweet
+
+    try:
+        fields = parse_fields(request.GET.get('fields'))
+        limit = parse_limit(request.GET.get('limit'))
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    ndjson = request.GET.get('format') == 'ndjson' or NDJSON in request.headers.get('Accept', '')
+    page = Page()
+    # Routed now, while ReplicaMiddleware still knows about this request
+    using = router.db_for_read(Tweet)
+    rows = rows_for(fields, limit, request.GET.get('cursor'), page, using)
+    response = StreamingHttpResponse(
+        body(rows, fields, page, ndjson), content_type=NDJSON if ndjson else 'application/json'
+    )
+    response['X-Accel-Buffering'] = 'no'
+    patch_vary_headers(response, ['Accept'])
+    return response
+
+
+def stream_tweets(request, queryset):
+    sort = 'top' if request.GET.get('sort') == 'top' else 'latest'
+    return stream(request, lambda fields, limit, cursor, page, using: keyset_rows(
+        queryset, fields, limit, cursor, sort, page, using
+    ))
+
+
+def stream_search(request, query):
+    return stream(request, lambda fields, limit, cursor, page, using: search_rows(
+        query, fields, limit, cursor, page, using
+    ))
@@ -4,3 +4,14 @@ from django.apps import AppConfig
 class TweetAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'tweet_app'
+
+    def ready(self):
+        # Register background jobs so jobs.enqueue() can find them by name
+        from . import tasks  # noqa: F401
+        # Registers the deploy check for the static asset bundle
+        from . import assets  # noqa: F401
+
+        # Count every query for InstrumentationMiddleware / QueryBudget
+        from django.db.backends.signals import connection_created
+        from .instrumentation import install
+        connection_created.connect(install, dispatch_uid='tweet_app.instrumentation')
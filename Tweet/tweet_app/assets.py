@@ -0,0 +1,243 @@
+"""
+The front-end bundle: Bootstrap, the icon font and htmx served from our own
+origin instead of four CDNs.
+
+`python manage.py build_assets` writes static/bundle/:
+  - app.css: bootstrap.min.css followed by only the bootstrap-icons rules the
+    templates use (class names found by scanning the template dirs)
+  - fonts/bootstrap-icons.woff2: the icon font cut down to those glyphs
+    (needs fontTools and Brotli; without them the full font is copied)
+  - app.js: htmx followed by static/js/live.js, loaded with `defer`
+Upstream files are downloaded into assets/vendor/ and must match the
+SHA-384 pinned for them in assets/vendor/SHA384SUMS (committed). A file
+without a pin is refused; `build_assets --pin` records the hash of a new
+download, for a maintainer to review and commit, so nothing is trusted just
+because it was the first thing a build happened to download.
+
+collectstatic then gives every file a content hash in its name and writes
+.gz and .br copies (StaticStorage below), and WhiteNoise serves the hashed
+names with a one-year immutable Cache-Control. The deploy build (build.sh)
+runs build_assets and collectstatic, so static/bundle/ is not committed.
+
+Only with ASSETS_CDN_FALLBACK (on in development) does {% asset_tags %}
+fall back to the CDN links (templates/assets_cdn.html) while the bundle is
+missing; in production a missing bundle is an error, reported by
+`manage.py check --deploy` as well.
+"""
+import base64
+import hashlib
+import os
+import re
+import shutil
+import urllib.request
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.core import checks
+from whitenoise.storage import CompressedManifestStaticFilesStorage
+
+VENDOR = {
+    'bootstrap.min.css': 'https://cdn.jsdelivr.net/npm/bootstrap@5.3.8/dist/css/bootstrap.min.css',
+    'bootstrap-icons.css': 'https://cdn.jsdelivr.net/npm/bootstrap-icons@1.11.3/font/bootstrap-icons.css',
+    'bootstrap-icons.woff2': 'https://cdn.jsdelivr.net/npm/bootstrap-icons@1.11.3/font/fonts/bootstrap-icons.woff2',
+    'htmx.min.js': 'https://unpkg.com/htmx.org@1.9.6/dist/htmx.min.js',
+}
+
+BUNDLE_DIR = 'bundle'
+BUNDLE_CSS = f'{BUNDLE_DIR}/app.css'
+BUNDLE_JS = f'{BUNDLE_DIR}/app.js'
+BUNDLE_FONT = f'{BUNDLE_DIR}/fonts/bootstrap-icons.woff2'
+
+ICON_CLASS_RE = re.compile(r'\bbi-([a-z0-9-]+)')
+ICON_RULE_RE = re.compile(r'\.bi-([a-z0-9-]+)::before\s*\{\s*content:\s*"\\([0-9a-f]+)";?\s*\}')
+ICON_BASE_RE = re.compile(r'\.bi::before,[^{]*\{[^}]*\}')
+SOURCE_MAP_RE = re.compile(r'/\*# sourceMappingURL=[^*]*\*/|//# sourceMappingURL=\S+')
+CSS_COMMENT_RE = re.compile(r'/\*.*?\*/', re.S)
+
+
+def sha384(data):
+    return base64.b64encode(hashlib.sha384(data).digest()).decode()
+
+
+def vendor_dir():
+    return os.path.join(settings.BASE_DIR, 'assets', 'vendor')
+
+
+def sums_path():
+    return os.path.join(vendor_dir(), 'SHA384SUMS')
+
+
+def static_dir():
+    return os.path.join(settings.BASE_DIR, 'static')
+
+
+def read_sums(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return dict(reversed(line.split()) for line in f if line.strip())
+
+
+def write_sums(sums):
+    with open(sums_path(), 'w') as f:
+        f.writelines(f'{digest}  {name}\n' for name, digest in sorted(sums.items()))
+
+
+def fetch(refresh=False, pin=False, log=print):
+    """
+    Downloads missing upstream files and checks each against its pinned
+    hash; returns {name: path}. pin=True records the hashes of files that
+    have none yet (never replaces an existing pin).
+    """
+    os.makedirs(vendor_dir(), exist_ok=True)
+    sums = read_sums(sums_path())
+    unpinned = [name for name in VENDOR if name not in sums]
+    if unpinned and not pin:
+        raise ValueError(
+            f"No pinned SHA-384 for {', '.join(unpinned)} in assets/vendor/SHA384SUMS; "
+            f"run `build_assets --pin` on a trusted machine and commit the file"
+        )
+    paths = {}
+    for name, url in VENDOR.items():
+        path = os.path.join(vendor_dir(), name)
+        downloaded = refresh or not os.path.exists(path)
+        if downloaded:
+            log(f'fetching {url}')
+            with urllib.request.urlopen(url, timeout=30) as response:
+                data = response.read()
+        else:
+            with open(path, 'rb') as f:
+                data = f.read()
+        digest = sha384(data)
+        if sums.setdefault(name, digest) != digest:
+            raise ValueError(f'{name} does not match its pinned SHA-384, refusing to use it')
+        if downloaded:
+            with open(path, 'wb') as f:
+                f.write(data)
+        paths[name] = path
+    if unpinned:
+        write_sums(sums)
+        log(f"pinned {', '.join(unpinned)}, review and commit assets/vendor/SHA384SUMS")
+    return paths
+
+
+def template_dirs():
+    dirs = [d for engine in settings.TEMPLATES for d in engine.get('DIRS', [])]
+    dirs.append(os.path.join(settings.BASE_DIR, 'tweet_app', 'templates'))
+    return dirs
+
+
+def used_icons():
+    """Every bi-* class name in the templates."""
+    names = set()
+    for directory in template_dirs():
+        for root, _, files in os.walk(directory):
+            for filename in files:
+                if filename.endswith('.html'):
+                    with open(os.path.join(root, filename), encoding='utf-8') as f:
+                        names.update(ICON_CLASS_RE.findall(f.read()))
+    return names
+
+
+def minify_css(css):
+    css = CSS_COMMENT_RE.sub('', css)
+    css = re.sub(r'\s+', ' ', css)
+    return re.sub(r'\s*([{};:,>])\s*', r'\1', css).strip()
+
+
+def icon_css(upstream_css, icons):
+    """The @font-face, the shared ::before rule and one rule per used icon."""
+    codepoints = {name: code for name, code in ICON_RULE_RE.findall(upstream_css)}
+    used = sorted(name for name in icons if name in codepoints)
+    base = ICON_BASE_RE.search(upstream_css)
+    rules = [
+        '@font-face{font-display:block;font-family:"bootstrap-icons";'
+        'src:url("fonts/bootstrap-icons.woff2") format("woff2")}',
+        base.group(0) if base else '',
+        *(f'.bi-{name}::before{{content:"\\{codepoints[name]}"}}' for name in used),
+    ]
+    return minify_css('\n'.join(rules)), [int(codepoints[name], 16) for name in used]
+
+
+def subset_font(source, target, codepoints, log=print):
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    try:
+        from fontTools import subset
+    except ImportError:
+        log('fontTools is not installed, copying the whole icon font')
+        shutil.copyfile(source, target)
+        return
+    options = subset.Options()
+    options.flavor = 'woff2'
+    font = subset.load_font(source, options)
+    subsetter = subset.Subsetter(options)
+    subsetter.populate(unicodes=codepoints)
+    subsetter.subset(font)
+    subset.save_font(font, target, options)
+
+
+def build(refresh=False, pin=False, log=print):
+    """Fetches the vendor files and writes the bundle; returns the written paths."""
+    vendor = fetch(refresh=refresh, pin=pin, log=log)
+    out = static_dir()
+
+    def read(path):
+        with open(path, encoding='utf-8') as f:
+            return f.read()
+
+    def write(name, text):
+        path = os.path.join(out, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        log(f'wrote {name} ({len(text.encode()) // 1024} KiB)')
+        return path
+
+    icons, codepoints = icon_css(read(vendor['bootstrap-icons.css']), used_icons())
+    # Source map comments point at files we don't ship (collectstatic would fail on them)
+    bootstrap = SOURCE_MAP_RE.sub('', read(vendor['bootstrap.min.css'])).strip()
+    written = [write(BUNDLE_CSS, bootstrap + '\n' + icons + '\n')]
+
+    subset_font(vendor['bootstrap-icons.woff2'], os.path.join(out, BUNDLE_FONT), codepoints, log=log)
+    written.append(os.path.join(out, BUNDLE_FONT))
+
+    scripts = [
+        SOURCE_MAP_RE.sub('', read(vendor['htmx.min.js'])).strip(),
+        read(os.path.join(out, 'js', 'live.js')).strip(),
+    ]
+    written.append(write(BUNDLE_JS, ';\n'.join(scripts) + '\n'))
+    return written
+
+
+def bundle_built():
+    return finders.find(BUNDLE_CSS) is not None and finders.find(BUNDLE_JS) is not None
+
+
+def cdn_fallback():
+    return getattr(settings, 'ASSETS_CDN_FALLBACK', settings.DEBUG)
+
+
+@checks.register(checks.Tags.staticfiles, deploy=True)
+def check_bundle(app_configs, **kwargs):
+    if cdn_fallback() or bundle_built():
+        return []
+    return [checks.Error(
+        'The asset bundle is not built and ASSETS_CDN_FALLBACK is off.',
+        hint='Run `manage.py build_assets` and `manage.py collectstatic` in the deploy build (build.sh).',
+        id='tweet_app.E001',
+    )]
+
+
+class StaticStorage(CompressedManifestStaticFilesStorage):
+    """
+    WhiteNoise's hashed + gzip/brotli storage, except that a file that was
+    never collected (tests, runserver before collectstatic) keeps its plain
+    name instead of raising.
+    """
+
+    manifest_strict = False
+
+    def hashed_name(self, name, content=None, filename=None):
+        if content is None and not self.exists(filename or name):
+            return name
+        return super().hashed_name(name, content, filename)
@@ -0,0 +1,87 @@
+"""
+Authentication backend: log in with email + password, and serve the
+logged-in user from the cache instead of loading the row on every request.
+
+    AUTHENTICATION_BACKENDS = ['tweet_app.backends.EmailBackend', ...]
+
+authenticate(request, email=..., password=...) is one indexed lookup on
+LOWER(email) (unique index from migration 0012). get_user()/aget_user(),
+which AuthenticationMiddleware calls for every request with a session, read
+the user from USER_CACHE_ALIAS; models.py drops the entry whenever the user
+is saved or deleted, so password changes and deactivation apply at once.
+
+Only the User row is cached. Its profile is loaded on first use within a
+request, because counters like Profile.follower_count change with F()
+updates that wouldn't invalidate a cached copy.
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import caches
+from django.db.models.functions import Lower
+
+USER_CACHE_SECONDS = 300
+
+
+def user_cache():
+    return caches[getattr(settings, 'USER_CACHE_ALIAS', 'default')]
+
+
+def user_cache_key(user_id):
+    return f'auth:user:{user_id}'
+
+
+def user_cache_timeout():
+    return getattr(settings, 'USER_CACHE_SECONDS', USER_CACHE_SECONDS)
+
+
+def forget_user(user_id):
+    user_cache().delete(user_cache_key(user_id))
+
+
+def users_by_email(email):
+    """Matches email case-insensitively, through the LOWER(email) index."""
+    return get_user_model()._default_manager.alias(email_lower=Lower('email')).filter(
+        email_lower=email.lower()
+    )
+
+
+def cacheable(user):
+    # Don't carry relations loaded during this request into the cache
+    user._state.fields_cache.clear()
+    return user
+
+
+class EmailBackend(ModelBackend):
+    def authenticate(self, request, email=None, password=None, **kwargs):
+        if email is None or password is None:
+            # Username logins (admin) are left to ModelBackend
+            return None
+        user = users_by_email(email).first()
+        if user is None:
+            # Run the hasher anyway so a missing account takes as long as a wrong password
+            get_user_model()().set_password(password)
+            return None
+        if user.check_password(password) and self.user_can_authenticate(user):
+            return user
+        return None
+
+    def get_user(self, user_id):
+        cache = user_cache()
+        user = cache.get(user_cache_key(user_id))
+        if user is None:
+            user = get_user_model()._default_manager.filter(pk=user_id).first()
+            if user is None:
+                return None
+            cache.set(user_cache_key(user_id), cacheable(user), user_cache_timeout())
+        return user if self.user_can_authenticate(user) else None
+
+    async def aget_user(self, user_id):
+        cache = user_cache()
+        user = await cache.aget(user_cache_key(user_id))
+        if user is None:
+            user = await get_user_model()._default_manager.filter(pk=user_id).afirst()
+            if user is None:
+                return None
+            await cache.aset(user_cache_key(user_id), cacheable(user), user_cache_timeout())
+        return user if self.user_can_authenticate(user) else None
@@ -0,0 +1,374 @@
+"""
+Synthetic data and a benchmark runner for the hot paths.
+
+    python manage.py seed_bench --users 2000 --tweets 100000
+    python manage.py run_bench --requests 200 --output bench/before.json
+    ... change something ...
+    python manage.py run_bench --requests 200 --compare bench/before.json
+
+seed() bulk-inserts bench users (with profiles), a follow graph, tweets
+(some with a stub photo path) and a skewed spread of likes, without going
+through the model signals, then rebuilds the search index and the
+hashtag/mention tables and the "top" feed scores once.
+
+run() drives the views through Django's test client (or the ASGI
+AsyncClient) against the configured database and reports latency
+percentiles, queries per request and throughput for each scenario. The
+like_concurrent scenario instead hammers set_like from several threads at
+once, to measure write concurrency, e.g. WAL against the old journal:
+
+    DATABASE_URL='sqlite:///db.sqlite3?journal_mode=delete' python manage.py run_bench like_concurrent
+"""
+import asyncio
+import json
+import random
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import OperationalError, connection, connections, transaction
+from django.conf import settings
+from django.test import AsyncClient, Client, override_settings
+
+from . import ranking, search, topics
+from .instrumentation import Recorder
+from .likes import Like, set_like
+from .models import Follow, Profile, Tweet
+
+USER_PREFIX = 'bench_'
+PASSWORD = 'bench-pass'
+
+WORDS = (
+    'python django async cache query index feed coffee morning deploy bug '
+    'release weekend music football code review latency database search '
+    'photo travel pizza rain server coverage test tweet friend launch'
+).split()
+TAGS = ['#django', '#python', '#perf', '#weekend', '#music', '#coffee', '#news']
+
+
+def tweet_text(rng, usernames):
+    words = rng.choices(WORDS, k=rng.randint(4, 30))
+    if rng.random() < 0.3:
+        words.append(rng.choice(TAGS))
+    if rng.random() < 0.15:
+        words.append('@' + rng.choice(usernames))
+    return ' '.join(words)[:280]
+
+
+def like_total(rng, users):
+    # Most tweets get a few likes, a handful get a lot
+    return min(int(rng.paretovariate(1.2)) - 1, users)
+
+
+def seed(users=500, tweets=20000, follows=20, photo_ratio=0.1, batch_size=1000, seed=0, log=print):
+    """Adds bench data next to whatever is in the database; returns row counts."""
+    rng = random.Random(seed)
+    first = User.objects.filter(username__startswith=USER_PREFIX).count()
+    password = make_password(PASSWORD)
+
+    with transaction.atomic():
+        new_users = User.objects.bulk_create(
+            [User(username=f'{USER_PREFIX}{first + i}', email=f'{USER_PREFIX}{first + i}@example.com',
+                  password=password) for i in range(users)],
+            batch_size=batch_size,
+        )
+    user_ids = [user.pk for user in new_users]
+    usernames = [user.username for user in new_users]
+    log(f'{len(user_ids)} users')
+
+    followers = {user_id: 0 for user_id in user_ids}
+    pairs = set()
+    for user_id in user_ids:
+        for followee_id in rng.sample(user_ids, min(follows, len(user_ids))):
+            if followee_id != user_id:
+                pairs.add((user_id, followee_id))
+    for _, followee_id in pairs:
+        followers[followee_id] += 1
+    with transaction.atomic():
+        # bulk_create skips the post_save signal that normally makes these
+        Profile.objects.bulk_create(
+            [Profile(user_id=user_id, follower_count=followers[user_id]) for user_id in user_ids],
+            batch_size=batch_size,
+        )
+        Follow.objects.bulk_create(
+            [Follow(follower_id=a, followee_id=b) for a, b in pairs], batch_size=batch_size
+        )
+    log(f'{len(pairs)} follows')
+
+    like_rows = 0
+    for done in range(0, tweets, batch_size):
+        batch = []
+        likers = []
+        for _ in range(min(batch_size, tweets - done)):
+            liked_by = rng.sample(user_ids, like_total(rng, len(user_ids)))
+            likers.append(liked_by)
+            batch.append(Tweet(
+                user_id=rng.choice(user_ids),
+                text=tweet_text(rng, usernames),
+                photo='photos/bench.jpg' if rng.random() < photo_ratio else None,
+                like_count=len(liked_by),
+            ))
+        with transaction.atomic():
+            Tweet.objects.bulk_create(batch)
+            likes = [
+                Like(tweet_id=tweet.pk, user_id=user_id)
+                for tweet, liked_by in zip(batch, likers)
+                for user_id in liked_by
+            ]
+            Like.objects.bulk_create(likes, batch_size=batch_size)
+        like_rows += len(likes)
+        log(f'{done + len(batch)} tweets')
+
+    indexed = search.get_backend().rebuild()
+    log(f'{indexed} tweets indexed for search')
+    topics.backfill(batch_size=batch_size)
+    log('hashtags and mentions indexed')
+    ranking.rescore(batch_size=batch_size)
+    log('tweets scored')
+    return {'users': len(user_ids), 'follows': len(pairs), 'tweets': tweets, 'likes': like_rows}
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    rank = max(0, min(len(sorted_values) - 1, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+def summarize(timings, queries, errors, elapsed):
+    ordered = sorted(timings)
+    ms = lambda seconds: round(seconds * 1000, 2) if seconds is not None else None  # noqa: E731
+    return {
+        'requests': len(timings),
+        'errors': errors,
+        'p50_ms': ms(percentile(ordered, 50)),
+        'p95_ms': ms(percentile(ordered, 95)),
+        'p99_ms': ms(percentile(ordered, 99)),
+        'mean_ms': ms(sum(ordered) / len(ordered)) if ordered else None,
+        'max_ms': ms(ordered[-1]) if ordered else None,
+        'queries_per_request': round(sum(queries) / len(queries), 2) if queries else None,
+        'throughput_rps': round(len(timings) / elapsed, 1) if elapsed else None,
+    }
+
+
+class Scenarios:
+    """Builds the (method, path, data) requests for each benchmarked view."""
+
+    def __init__(self, user, rng):
+        self.user = user
+        self.rng = rng
+        ids = list(Tweet.objects.order_by('-id').values_list('id', flat=True)[:5000])
+        if not ids:
+            raise ValueError('No tweets to benchmark, run seed_bench first.')
+        self.tweet_ids = ids
+        self.usernames = list(
+            User.objects.filter(username__startswith=USER_PREFIX).values_list('username', flat=True)[:1000]
+        )
+        # Like/unlike pairs on tweets the user hasn't liked, so the data ends up unchanged
+        liked = set(Like.objects.filter(user_id=user.pk).values_list('tweet_id', flat=True))
+        self.likeable = [pk for pk in ids if pk not in liked]
+
+    def tweet_list(self, i):
+        return 'get', '/tweet_home/', None
+
+    def tweet_top(self, i):
+        return 'get', '/tweet_home/', {'sort': 'top'}
+
+    def tweet_detail(self, i):
+        return 'get', f'/{self.rng.choice(self.tweet_ids)}/', None
+
+    def tweet_search(self, i):
+        return 'get', '/search/', {'search': self.rng.choice(WORDS + TAGS)}
+
+    def tweet_like(self, i):
+        tweet_id = self.likeable[(i // 2) % len(self.likeable)]
+        return 'post', f'/tweet_like/{tweet_id}', {'action': 'like' if i % 2 == 0 else 'unlike'}
+
+    def profile(self, i):
+        return 'get', f'/profile/{self.rng.choice(self.usernames or [self.user.username])}/', None
+
+    def tag(self, i):
+        return 'get', f'/tag/{self.rng.choice(TAGS)[1:]}/', None
+
+
+SCENARIOS = ['tweet_list', 'tweet_top', 'tweet_detail', 'tweet_search', 'tweet_like', 'profile', 'tag', 'like_concurrent']
+
+# Tweets the like_concurrent threads fight over
+HOT_TWEETS = 10
+
+# HTMX requests, so likes return the small partial like the button does
+HEADERS = {'HX-Request': 'true'}
+
+
+def bench_user():
+    user = User.objects.filter(username__startswith=USER_PREFIX).order_by('pk').first()
+    if user is None:
+        raise ValueError('No bench users, run seed_bench first.')
+    return user
+
+
+def run_sync(user, make_request, requests, warmup):
+    client = Client(headers=HEADERS)
+    client.force_login(user)
+    timings, queries, errors = [], [], 0
+    for i in range(warmup):
+        method, path, data = make_request(i)
+        getattr(client, method)(path, data)
+    start = time.perf_counter()
+    for i in range(warmup, warmup + requests):
+        method, path, data = make_request(i)
+        with Recorder() as recorder:
+            began = time.perf_counter()
+            response = getattr(client, method)(path, data)
+            timings.append(time.perf_counter() - began)
+        queries.append(recorder.query_count)
+        errors += response.status_code >= 400
+    return summarize(timings, queries, errors, time.perf_counter() - start)
+
+
+async def run_async(user, make_request, requests, warmup, concurrency):
+    client = AsyncClient(headers=HEADERS)
+    await client.aforce_login(user)
+    timings, queries = [], []
+    errors = 0
+    gate = asyncio.Semaphore(concurrency)
+
+    async def one(i, measure=True):
+        nonlocal errors
+        method, path, data = make_request(i)
+        async with gate:
+            with Recorder() as recorder:
+                began = time.perf_counter()
+                response = await getattr(client, method)(path, data)
+                elapsed = time.perf_counter() - began
+        if measure:
+            timings.append(elapsed)
+            queries.append(recorder.query_count)
+            errors += response.status_code >= 400
+
+    for i in range(warmup):
+        await one(i, measure=False)
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(warmup, warmup + requests)))
+    return summarize(timings, queries, errors, time.perf_counter() - start)
+
+
+def run_write_contention(requests, threads, seed):
+    """
+    Many writers on the like path at once: each thread toggles likes as its
+    own bench user on the same few hot tweets, through set_like, with its own
+    database connection. Shows what the journal mode and locking settings do
+    to write throughput (see Tweet/database.py); "errors" are writes that
+    gave up on a lock.
+    """
+    users = list(User.objects.filter(username__startswith=USER_PREFIX).order_by('pk')[:threads])
+    hot = list(Tweet.objects.order_by('-id').values_list('id', flat=True)[:HOT_TWEETS])
+    per_thread = max(1, requests // len(users))
+    liked = {
+        user.pk: set(Like.objects.filter(user_id=user.pk, tweet_id__in=hot).values_list('tweet_id', flat=True))
+        for user in users
+    }
+
+    def writer(user, rng):
+        timings, queries, errors = [], [], 0
+        try:
+            for i in range(per_thread):
+                tweet_id = rng.choice(hot)
+                with Recorder() as recorder:
+                    began = time.perf_counter()
+                    try:
+                        set_like(tweet_id, user, liked=i % 2 == 0)
+                    except OperationalError:
+                        errors += 1
+                    timings.append(time.perf_counter() - began)
+                queries.append(recorder.query_count)
+            # Leave the likes as we found them
+            for tweet_id in hot:
+                set_like(tweet_id, user, liked=tweet_id in liked[user.pk])
+        finally:
+            connections.close_all()
+        return timings, queries, errors
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(len(users)) as pool:
+        outcomes = list(pool.map(writer, users, [random.Random(seed + n) for n in range(len(users))]))
+    elapsed = time.perf_counter() - start
+    summary = summarize(
+        [t for timings, _, _ in outcomes for t in timings],
+        [q for _, queries, _ in outcomes for q in queries],
+        sum(errors for _, _, errors in outcomes),
+        elapsed,
+    )
+    summary['threads'] = len(users)
+    return summary
+
+
+def journal_mode():
+    if connection.vendor != 'sqlite':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA journal_mode')
+        return cursor.fetchone()[0]
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(scenarios=SCENARIOS, requests=100, warmup=5, client='sync', concurrency=1, write_threads=8,
+        seed=0, log=print):
+    """Benchmarks each scenario in turn and returns the results dict."""
+    user = bench_user()
+    builder = Scenarios(user, random.Random(seed))
+    results = {
+        'meta': {
+            'commit': git_commit(),
+            'started_at': datetime.now(timezone.utc).isoformat(),
+            'client': client,
+            'concurrency': concurrency if client == 'asgi' else 1,
+            'database': connection.vendor,
+            'journal_mode': journal_mode(),
+            'rows': {'users': User.objects.count(), 'tweets': Tweet.objects.count(), 'likes': Like.objects.count()},
+        },
+        'scenarios': {},
+    }
+    # The test clients send Host: testserver, and every request is the same client
+    with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'], RATELIMIT_ENABLED=False):
+        for name in scenarios:
+            make_request = getattr(builder, name, None)
+            if name == 'like_concurrent':
+                summary = run_write_contention(requests, write_threads, seed)
+            elif client == 'asgi':
+                summary = asyncio.run(run_async(user, make_request, requests, warmup, concurrency))
+            else:
+                summary = run_sync(user, make_request, requests, warmup)
+            results['scenarios'][name] = summary
+            log(name, summary)
+    return results
+
+
+def compare(current, previous):
+    """Rows of (scenario, metric, before, after, change %) for the key metrics."""
+    rows = []
+    for name, summary in current['scenarios'].items():
+        before = previous.get('scenarios', {}).get(name)
+        if not before:
+            continue
+        for metric in ('p50_ms', 'p95_ms', 'p99_ms', 'queries_per_request', 'throughput_rps'):
+            old, new = before.get(metric), summary.get(metric)
+            change = round((new - old) / old * 100, 1) if old and new is not None else None
+            rows.append((name, metric, old, new, change))
+    return rows
+
+
+def save(results, path):
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2)
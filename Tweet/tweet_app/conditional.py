@@ -0,0 +1,66 @@
+"""
+Conditional GET for the feed pages.
+
+A view decorated with @conditional_page(load) gets a weak ETag, and a
+matching If-None-Match is answered with 304 before anything is rendered.
+load(request, *args, **kwargs) runs the page's queries once and returns
+(parts, page): `parts` is anything that changes when the page would render
+differently (tweet versions, the viewer's liked ids, ...), `page` is what
+the view renders from, passed to it as the `page` keyword argument. So a 200
+costs the page's queries once, and a 304 skips only the rendering. load
+returns (None, None) for a missing object; the view raises the 404.
+
+There is no Last-Modified: likes change like_count with F() updates that
+leave updated_at alone, and deletes leave no timestamp at all, so a date
+would answer If-Modified-Since with a stale 304. The ETag covers both.
+
+Async views take an async load; it may rely on request.user being
+resolved already (see views.resolve_user).
+"""
+import hashlib
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.utils.cache import get_conditional_response
+
+
+def make_etag(request, parts):
+    viewer = request.user.pk if request.user.is_authenticated else 0
+    # HTMX "load more" requests get a partial, not the full page
+    partial = bool(request.headers.get('HX-Request'))
+    digest = hashlib.md5(repr((viewer, partial, parts)).encode()).hexdigest()
+    return f'W/"{digest}"'
+
+
+def not_modified(request, etag):
+    return get_conditional_response(request, etag=etag)
+
+
+def add_validators(request, response, etag):
+    if request.method in ('GET', 'HEAD'):
+        response.headers.setdefault('ETag', etag)
+    return response
+
+
+def conditional_page(load):
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def inner(request, *args, **kwargs):
+                parts, page = await load(request, *args, **kwargs)
+                etag = make_etag(request, parts)
+                response = not_modified(request, etag)
+                if response is None:
+                    response = await view(request, *args, page=page, **kwargs)
+                return add_validators(request, response, etag)
+        else:
+            @wraps(view)
+            def inner(request, *args, **kwargs):
+                parts, page = load(request, *args, **kwargs)
+                etag = make_etag(request, parts)
+                response = not_modified(request, etag)
+                if response is None:
+                    response = view(request, *args, page=page, **kwargs)
+                return add_validators(request, response, etag)
+        return inner
+    return decorator
@@ -0,0 +1,128 @@
+"""
+Bulk deletion of tweets and whole accounts.
+
+Tweet.delete() and User.delete() let Django's collector load every row the
+delete cascades to (for a heavy account: all their tweets, the likes and
+timeline entries of those tweets, ...) so that the models.py receivers can
+run once per tweet, all inside one long transaction. The functions here
+remove the same rows batch_size tweets at a time, each batch a short
+transaction of a few set-based DELETEs, and do in bulk what the receivers
+would have done per row:
+  - photo files and their resized copies are handed to
+    storage_cleanup.discard_files in one INSERT per batch; the
+    purge_orphan_files job then deletes them with batched storage calls
+    (one DeleteObjects per 1000 keys on S3)
+  - the batch leaves the search index in one statement
+Cached cards need nothing: their keys carry updated_at and like_count, and
+a deleted tweet is never asked for again.
+
+delete_users() also takes back what the accounts gave to others (likes,
+follows), fixing those like counts, scores and follower counts, and then
+deletes the by now small User rows the normal way.
+
+Used by the admin actions in admin.py, `manage.py delete_users` and the
+delete_users job. Progress goes to log, one line per batch.
+"""
+from django.db import router, transaction
+from django.db.models import F
+
+from . import images, ranking, search
+from .likes import Like
+from .storage_cleanup import discard_files
+
+DEFAULT_AVATAR = 'default.jpg'
+
+
+def photo_files(rows):
+    """Storage names of (photo, renditions) pairs."""
+    return [
+        name
+        for photo, renditions in rows if photo
+        for name in (photo, *images.rendition_files(renditions))
+    ]
+
+
+def delete_tweets(tweets, batch_size=500, log=None):
+    """Deletes the tweets of a queryset batch by batch; returns how many."""
+    from .models import Mention, TimelineEntry, Tweet, TweetTag
+
+    deleted = 0
+    last_pk = 0
+    while True:
+        rows = list(
+            tweets.filter(pk__gt=last_pk).order_by('pk')
+            .values_list('pk', 'photo', 'photo_renditions')[:batch_size]
+        )
+        if not rows:
+            return deleted
+        pks = [pk for pk, _, _ in rows]
+        last_pk = pks[-1]
+        with transaction.atomic():
+            # No receivers on these, so each is a single DELETE
+            for model in (Like, TimelineEntry, TweetTag, Mention):
+                model.objects.filter(tweet_id__in=pks).delete()
+            search.get_backend().remove_many(pks)
+            discard_files(photo_files((photo, renditions) for _, photo, renditions in rows))
+            # Skip the collector and the per-row post_delete receivers, done above.
+            # _raw_delete is private (the collector's fast delete, unchanged
+            # through Django 5.2); DeletionTests.test_raw_delete_is_available
+            # fails first if an upgrade changes it.
+            Tweet.objects.filter(pk__in=pks)._raw_delete(router.db_for_write(Tweet))
+        deleted += len(pks)
+        if log:
+            log(f'{deleted} tweets deleted')
+
+
+def take_back_likes(user, batch_size=500):
+    """Removes the likes a user gave, fixing like counts and scores; returns how many."""
+    from .models import Tweet
+
+    removed = 0
+    while True:
+        rows = list(Like.objects.filter(user_id=user.pk).order_by('pk').values_list('pk', 'tweet_id')[:batch_size])
+        if not rows:
+            return removed
+        tweet_ids = [tweet_id for _, tweet_id in rows]
+        with transaction.atomic():
+            Like.objects.filter(pk__in=[pk for pk, _ in rows]).delete()
+            Tweet.objects.filter(pk__in=tweet_ids, like_count__gt=0).update(like_count=F('like_count') - 1)
+            ranking.rescore_ids(tweet_ids)
+        removed += len(rows)
+
+
+def take_back_follows(user):
+    from .models import Follow, Profile
+
+    with transaction.atomic():
+        followees = Follow.objects.filter(follower=user).values_list('followee_id', flat=True)
+        Profile.objects.filter(user_id__in=followees, follower_count__gt=0).update(
+            follower_count=F('follower_count') - 1
+        )
+        Follow.objects.filter(follower=user).delete()
+        Follow.objects.filter(followee=user).delete()
+
+
+def delete_users(users, batch_size=500, log=None):
+    """Deletes accounts with everything they posted; returns {'users', 'tweets', 'likes'} counts."""
+    from .models import Mention, Profile, TimelineEntry, Tweet
+
+    counts = {'users': 0, 'tweets': 0, 'likes': 0}
+    for user in users:
+        prefix = f'{user.username}: '
+        counts['tweets'] += delete_tweets(
+            Tweet.objects.filter(user=user), batch_size, log and (lambda message: log(prefix + message))
+        )
+        counts['likes'] += take_back_likes(user, batch_size)
+        take_back_follows(user)
+        with transaction.atomic():
+            TimelineEntry.objects.filter(user=user).delete()
+            Mention.objects.filter(user=user).delete()
+            pic = Profile.objects.filter(user=user).values_list('profile_pic', 'pic_renditions').first()
+            if pic and pic[0] != DEFAULT_AVATAR:
+                discard_files(photo_files([pic]))
+            # Nothing heavy is left to cascade to
+            user.delete()
+        counts['users'] += 1
+        if log:
+            log(f'{prefix}account deleted')
+    return counts
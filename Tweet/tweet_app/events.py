@@ -0,0 +1,182 @@
+"""
+Live updates pushed to browsers over Server-Sent Events.
+
+Views and services publish small events, the /events/ stream (an async view,
+so it needs the ASGI server) forwards them to every open page:
+  - "likes":  {"<tweet id>": like_count, ...}
+  - "tweet":  {"id": ..., "user": username} for each new tweet
+
+Like counts are coalesced: a burst of likes on one tweet becomes one update
+carrying the latest count, flushed every LIKE_COALESCE_SECONDS.
+
+The broker is pluggable with the EVENT_BROKER setting (dotted path to a
+zero-argument factory):
+  - LocalBroker (default): in-process, each server process only sees its own
+    events, fine for one process
+  - RedisBroker: publishes through a redis pub/sub channel, so every process
+    (and the job worker) reaches every stream; redis_broker() builds one on
+    the server in REDIS_URL (needs the redis package)
+"""
+import asyncio
+import json
+import logging
+import threading
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+# Events kept per slow client before the oldest are dropped
+QUEUE_SIZE = 100
+
+
+def coalesce_seconds():
+    return getattr(settings, 'LIKE_COALESCE_SECONDS', 0.5)
+
+
+class Subscription:
+    """One open stream: a queue on the event loop the stream runs on."""
+
+    def __init__(self, broker):
+        self.broker = broker
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(QUEUE_SIZE)
+
+    def put(self, event, data):
+        # Called from any thread (sync views run in a thread pool under ASGI)
+        self.loop.call_soon_threadsafe(self._put, event, data)
+
+    def _put(self, event, data):
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait((event, data))
+
+    async def get(self, timeout=None):
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class LocalBroker:
+    def __init__(self):
+        self.subscriptions = set()
+        self.lock = threading.Lock()
+
+    def subscribe(self):
+        subscription = Subscription(self)
+        with self.lock:
+            self.subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            self.subscriptions.discard(subscription)
+
+    def publish(self, event, data):
+        self.deliver(event, data)
+
+    def deliver(self, event, data):
+        with self.lock:
+            subscriptions = list(self.subscriptions)
+        for subscription in subscriptions:
+            try:
+                subscription.put(event, data)
+            except RuntimeError:
+                # Its event loop is gone (server shutting down)
+                self.unsubscribe(subscription)
+
+
+class RedisBroker(LocalBroker):
+    """
+    Publishes to one redis channel and delivers what comes back on it to the
+    streams of this process. Only uses publish and pubsub, so any redis-py
+    compatible client works.
+    """
+
+    def __init__(self, client, channel='tweet_app:events'):
+        super().__init__()
+        self.client = client
+        self.channel = channel
+        self.listener = None
+
+    def subscribe(self):
+        if self.listener is None:
+            self.listener = threading.Thread(target=self.listen, daemon=True, name='events')
+            self.listener.start()
+        return super().subscribe()
+
+    def publish(self, event, data):
+        self.client.publish(self.channel, json.dumps([event, data]))
+
+    def listen(self):
+        pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(self.channel)
+        for message in pubsub.listen():
+            try:
+                event, data = json.loads(message['data'])
+            except (TypeError, ValueError):
+                continue
+            self.deliver(event, data)
+
+
+def redis_broker():
+    import redis
+    return RedisBroker(redis.Redis.from_url(settings.REDIS_URL))
+
+
+_broker = None
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        path = getattr(settings, 'EVENT_BROKER', 'tweet_app.events.LocalBroker')
+        _broker = import_string(path)()
+    return _broker
+
+
+def publish(event, data):
+    try:
+        get_broker().publish(event, data)
+    except Exception:
+        # Live updates are best effort, never fail the request over them
+        logger.exception('Could not publish %s event', event)
+
+
+_pending_likes = {}
+_pending_lock = threading.Lock()
+_flush_timer = None
+
+
+def flush_like_counts():
+    global _flush_timer
+    with _pending_lock:
+        counts = dict(_pending_likes)
+        _pending_likes.clear()
+        _flush_timer = None
+    if counts:
+        publish('likes', {str(tweet_id): count for tweet_id, count in counts.items()})
+
+
+def like_count_changed(tweet_id, like_count):
+    """Queues a like count update; one flush sends the latest count per tweet."""
+    global _flush_timer
+    delay = coalesce_seconds()
+    with _pending_lock:
+        _pending_likes[tweet_id] = like_count
+        if delay and _flush_timer is None:
+            _flush_timer = threading.Timer(delay, flush_like_counts)
+            _flush_timer.daemon = True
+            _flush_timer.start()
+    if not delay:
+        flush_like_counts()
+
+
+def tweet_posted(tweet):
+    publish('tweet', {'id': tweet.pk, 'user': tweet.user.username})
+
+
+def format_event(event, data):
+    return f'event: {event}\ndata: {json.dumps(data)}\n\n'
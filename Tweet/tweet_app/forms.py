@@ -2,6 +2,7 @@ from django import forms
 from .models import Tweet, Profile
 from django.contrib.auth.models import User
 from django.contrib.auth.forms import UserCreationForm, User
+from .backends import users_by_email
 
 
 class TweetForm(forms.ModelForm):
@@ -49,7 +50,8 @@ class UserRegistrationsForm(UserCreationForm):
     # --- KEY ADDITION: Validate Email Uniqueness Here ---
     def clean_email(self):
         email = self.cleaned_data.get('email')
-        if User.objects.filter(email=email).exists():
+        # Case-insensitive, like the unique index and EmailBackend
+        if users_by_email(email).exists():
             raise forms.ValidationError("An account with this email already exists.")
         return email
 
@@ -86,6 +88,13 @@ class UserUpdateForm(forms.ModelForm):
             'placeholder': 'Enter your Email',
         })
 
+    def clean_email(self):
+        email = self.cleaned_data.get('email')
+        # Same case-insensitive check as registration, minus this account
+        if users_by_email(email).exclude(pk=self.instance.pk).exists():
+            raise forms.ValidationError("An account with this email already exists.")
+        return email
+
 class ProfileUpdateForm(forms.ModelForm):
     class Meta:
         model = Profile
@@ -0,0 +1,112 @@
+"""
+Cache of rendered tweet card HTML.
+
+Cards are keyed by everything that changes their markup: the tweet id,
+updated_at (bumped by every save), like_count, the author's username and the
+@names that link to a user (a digest of its Mention rows, so renaming or
+deleting a mentioned account changes the card too). An edited tweet simply
+gets a new key, so stale cards are never served; the pre_save/post_delete
+handlers in models.py only drop old entries early.
+
+Cached HTML holds nothing viewer-specific. The per-viewer like button is
+rendered on every request and spliced in at VIEWER_MARKER (see
+templatetags/tweet_cards.py).
+
+Settings:
+  TWEET_CARD_CACHE_SIZE   entries kept in each process's LRU (default 2000)
+  TWEET_CARD_CACHE_ALIAS  optional django cache alias shared between workers
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.template.loader import render_to_string
+
+VIEWER_MARKER = '<!--viewer-->'
+
+CARD_TEMPLATES = ('tweet_card_feed.html', 'tweet_card_profile.html', 'tweet_card_detail.html')
+
+# Shared backend entries expire on their own, the key already carries the version
+SHARED_TIMEOUT = 60 * 60
+
+
+class LRUCache:
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.data = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            value = self.data.get(key)
+            if value is not None:
+                self.data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.data[key] = value
+            self.data.move_to_end(key)
+            while len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+
+    def delete_prefix(self, prefix):
+        with self.lock:
+            for key in [key for key in self.data if key.startswith(prefix)]:
+                del self.data[key]
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+
+
+local_cache = LRUCache(getattr(settings, 'TWEET_CARD_CACHE_SIZE', 2000))
+
+
+def shared_cache():
+    alias = getattr(settings, 'TWEET_CARD_CACHE_ALIAS', None)
+    return caches[alias] if alias else None
+
+
+def mentions_version(tweet):
+    """Digest of the linked @names; feed views load them for the whole page up front."""
+    from .topics import load_mentions
+
+    if not hasattr(tweet, 'mentioned_usernames'):
+        load_mentions([tweet])
+    if not tweet.mentioned_usernames:
+        return ''
+    return hashlib.md5(' '.join(sorted(tweet.mentioned_usernames)).encode()).hexdigest()[:12]
+
+
+def card_key(tweet, template_name):
+    version = f'{tweet.updated_at.timestamp()}:{tweet.like_count}:{tweet.user.username}:{mentions_version(tweet)}'
+    return f'card:{tweet.pk}:{template_name}:{version}'
+
+
+def render_card(tweet, template_name):
+    """Returns the card HTML for a tweet, from cache when possible."""
+    key = card_key(tweet, template_name)
+    html = local_cache.get(key)
+    if html is not None:
+        return html
+
+    shared = shared_cache()
+    if shared is not None:
+        html = shared.get(key)
+    if html is None:
+        html = render_to_string(template_name, {'tweet': tweet})
+        if shared is not None:
+            shared.set(key, html, SHARED_TIMEOUT)
+    local_cache.set(key, html)
+    return html
+
+
+def invalidate(tweet):
+    """Drops the cached cards of a tweet that is being saved or was deleted."""
+    local_cache.delete_prefix(f'card:{tweet.pk}:')
+    shared = shared_cache()
+    if shared is not None and tweet.updated_at:
+        shared.delete_many([card_key(tweet, name) for name in CARD_TEMPLATES])
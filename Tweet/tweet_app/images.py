@@ -0,0 +1,166 @@
+"""
+Image renditions for tweet photos and profile pictures.
+
+After an upload is committed, a worker thread (off the request path):
+  1. strips EXIF (GPS, camera data) from the original, keeping its orientation:
+     the clean copy is saved under a new name (photos/cat__clean.jpg), the
+     row is pointed at it and only then the upload goes to discard_files,
+     so the field never names a missing file
+  2. writes resized WebP and JPEG copies next to it, e.g.
+     photos/cat.jpg -> photos/cat__thumb.webp, photos/cat__thumb.jpg
+  3. records them in the model's renditions JSONField
+Templates use {% responsive_img %} (templatetags/tweet_images.py) to serve
+them with srcset, falling back to the original until they exist.
+
+Settings:
+  IMAGE_PROCESSING_ASYNC  False runs the work inline on commit (tests)
+  IMAGE_WORKERS           size of the thread pool (default 2)
+"""
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connections, transaction
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from .storage_cleanup import discard_files
+
+logger = logging.getLogger(__name__)
+
+# label -> width in px; avatars are cropped square
+TWEET_RENDITIONS = {'thumb': 400, 'detail': 1200}
+AVATAR_RENDITIONS = {'avatar': 150, 'avatar2x': 300}
+
+FORMATS = (('webp', 'WEBP'), ('jpeg', 'JPEG'))
+QUALITY = 80
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, 'IMAGE_WORKERS', 2), thread_name_prefix='images'
+        )
+    return _executor
+
+
+def rendition_name(name, label, ext):
+    stem, _ = os.path.splitext(name)
+    return f'{stem}__{label}.{"jpg" if ext == "jpeg" else ext}'
+
+
+def strip_exif(storage, name, image):
+    """Saves a copy of the original without metadata; returns its name (name itself if clean)."""
+    if not image.getexif() and 'exif' not in image.info:
+        return name
+    buffer = BytesIO()
+    clean = ImageOps.exif_transpose(image)
+    save_format = image.format or 'JPEG'
+    if save_format == 'JPEG' and clean.mode not in ('RGB', 'L'):
+        clean = clean.convert('RGB')
+    clean.save(buffer, save_format)
+    stem, ext = os.path.splitext(name)
+    return storage.save(f'{stem}__clean{ext}', ContentFile(buffer.getvalue()))
+
+
+def build_renditions(storage, name, sizes, square=False):
+    """Writes every size in both formats and returns the renditions dict."""
+    with storage.open(name, 'rb') as original:
+        image = Image.open(original)
+        image.load()
+    name = strip_exif(storage, name, image)
+    image = ImageOps.exif_transpose(image).convert('RGB')
+
+    renditions = {}
+    for label, width in sizes.items():
+        if square:
+            resized = ImageOps.fit(image, (width, width))
+        else:
+            resized = image.copy()
+            # Only ever shrink, and only by width
+            resized.thumbnail((width, image.height))
+        entry = {'w': resized.width, 'h': resized.height}
+        for ext, pil_format in FORMATS:
+            buffer = BytesIO()
+            resized.save(buffer, pil_format, quality=QUALITY)
+            target = rendition_name(name, label, ext)
+            if storage.exists(target):
+                storage.delete(target)
+            entry[ext] = storage.save(target, ContentFile(buffer.getvalue()))
+        renditions[label] = entry
+    return name, renditions
+
+
+def rendition_files(renditions):
+    return [
+        entry[ext]
+        for entry in (renditions or {}).values()
+        for ext, _ in FORMATS
+        if entry.get(ext)
+    ]
+
+
+def process_image(model_label, pk, field_name, renditions_field, sizes, square=False):
+    """Worker entry point: works from the saved row, not the request's instance."""
+    try:
+        model = apps.get_model(model_label)
+        obj = model.objects.filter(pk=pk).first()
+        if obj is None:
+            return
+        field = getattr(obj, field_name)
+        storage = field.storage
+        if not field or not storage.exists(field.name):
+            return
+        uploaded_name = field.name
+        name, renditions = build_renditions(storage, uploaded_name, sizes, square)
+
+        changes = {renditions_field: renditions}
+        if name != uploaded_name:
+            changes[field_name] = name
+        if hasattr(obj, 'updated_at'):
+            # New version for the card cache / ETags
+            changes['updated_at'] = timezone.now()
+        # Only if the upload wasn't replaced again while we worked
+        if model.objects.filter(pk=pk, **{field_name: uploaded_name}).update(**changes):
+            if name != uploaded_name:
+                discard_files([uploaded_name])
+        else:
+            discard_files(rendition_files(renditions) + ([name] if name != uploaded_name else []))
+    except Exception:
+        logger.exception('Image processing failed for %s %s', model_label, pk)
+
+
+def run_in_worker(*args):
+    try:
+        process_image(*args)
+    finally:
+        # Worker threads get their own connections, don't leak them
+        connections.close_all()
+
+
+def schedule_renditions(obj, field_name, renditions_field, sizes, square=False):
+    """Queues processing once the current transaction commits."""
+    job_args = (obj._meta.label, obj.pk, field_name, renditions_field, sizes, square)
+
+    def run():
+        if getattr(settings, 'IMAGE_PROCESSING_ASYNC', True):
+            get_executor().submit(run_in_worker, *job_args)
+        else:
+            process_image(*job_args)
+
+    transaction.on_commit(run)
+
+
+def schedule_tweet_photo(tweet):
+    schedule_renditions(tweet, 'photo', 'photo_renditions', TWEET_RENDITIONS)
+
+
+def schedule_profile_pic(profile):
+    schedule_renditions(profile, 'profile_pic', 'pic_renditions', AVATAR_RENDITIONS, square=True)
@@ -0,0 +1,298 @@
+"""
+Per-request query and render instrumentation.
+
+InstrumentationMiddleware records, for every request:
+  - how many SQL queries ran and the total time spent in the database
+  - repeated queries, grouped by a fingerprint of their SQL (literal lists
+    collapsed), which is what an N+1 loop looks like
+  - time spent rendering templates (needs the TimedDjangoTemplates backend)
+and reports them as a Server-Timing header (visible in the browser's network
+panel) and one JSON log line on the "tweet_app.requests" logger. A request
+that repeats one query DUPLICATE_QUERY_WARNING times or more is logged as a
+warning, the rest at INFO (settings.LOGGING shows only warnings unless
+REQUEST_LOG_LEVEL says otherwise).
+
+Queries are captured by an execute wrapper installed on every database
+connection, and attributed through a context variable, so queries run by
+async views in sync_to_async threads count towards the right request.
+A streaming response (api.py) reads its rows after the view has returned:
+the recording goes on while the body is sent and the log line is written
+when the stream closes. Its Server-Timing header, sent first, only covers
+the work done before the body.
+
+Tests use QueryBudget to pin how many queries a view may run:
+
+    with QueryBudget(6) as budget:
+        self.client.get('/tweet_home/')
+    budget.assert_no_duplicates()      # nothing repeated 3+ times
+
+Settings:
+  REQUEST_INSTRUMENTATION  False turns the middleware into a pass-through
+  SERVER_TIMING            False leaves out the Server-Timing header
+"""
+import contextvars
+import hashlib
+import json
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.template.backends.django import DjangoTemplates, Template
+
+logger = logging.getLogger('tweet_app.requests')
+
+# A query repeated this many times in one request is reported as a likely N+1
+DUPLICATE_QUERY_WARNING = 3
+
+# Every recorder active in the current context (nested ones all see a query)
+_recorders = contextvars.ContextVar('query_recorders', default=())
+
+IN_LIST_RE = re.compile(r'\bIN \((?:%s|\?)(?:, (?:%s|\?))*\)')
+LITERAL_RE = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+
+
+def fingerprint(sql):
+    """Normalizes a query so the same statement with other values matches."""
+    normalized = LITERAL_RE.sub('?', IN_LIST_RE.sub('IN (...)', sql))
+    return hashlib.md5(normalized.encode()).hexdigest()[:12], normalized
+
+
+class Recorder:
+    def __init__(self):
+        self.queries = []
+        self.template_seconds = 0.0
+        self.render_depth = 0
+
+    def __enter__(self):
+        self._token = _recorders.set(_recorders.get() + (self,))
+        return self
+
+    def __exit__(self, *exc_info):
+        _recorders.reset(self._token)
+
+    @property
+    def query_count(self):
+        return len(self.queries)
+
+    @property
+    def db_seconds(self):
+        return sum(duration for _, duration in self.queries)
+
+    def duplicates(self, threshold=2):
+        """[(count, fingerprint, sql)] for queries run at least `threshold` times."""
+        counts = Counter()
+        statements = {}
+        for sql, _ in self.queries:
+            key, normalized = fingerprint(sql)
+            counts[key] += 1
+            statements[key] = normalized
+        return [
+            (count, key, statements[key])
+            for key, count in counts.most_common()
+            if count >= threshold
+        ]
+
+
+def record_query(execute, sql, params, many, context):
+    recorders = _recorders.get()
+    if not recorders:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = time.perf_counter() - start
+        for recorder in recorders:
+            recorder.queries.append((sql, duration))
+
+
+def install(connection, **kwargs):
+    """connection_created receiver: adds the query wrapper once per connection."""
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def install_all():
+    for connection in connections.all(initialized_only=True):
+        install(connection)
+
+
+@contextmanager
+def recording(recorder):
+    """Makes recorder active again, for a stream step run outside the view."""
+    token = _recorders.set(_recorders.get() + (recorder,))
+    try:
+        yield
+    finally:
+        _recorders.reset(token)
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        recorders = _recorders.get()
+        if not recorders:
+            return super().render(context, request)
+        # Templates rendered inside another one ({% tweet_card %}) are already
+        # part of the outer timing
+        for recorder in recorders:
+            recorder.render_depth += 1
+        start = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            duration = time.perf_counter() - start
+            for recorder in recorders:
+                recorder.render_depth -= 1
+                if not recorder.render_depth:
+                    recorder.template_seconds += duration
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """The Django template backend, timing each top-level render."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return TimedTemplate(template.template, self)
+
+
+class InstrumentationMiddleware:
+    """Put it first in MIDDLEWARE so the total covers the whole stack."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = getattr(settings, 'REQUEST_INSTRUMENTATION', True)
+        if self.enabled:
+            install_all()
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.enabled:
+            return self.get_response(request)
+        start = time.perf_counter()
+        with Recorder() as recorder:
+            response = self.get_response(request)
+        return self.finish(request, response, recorder, start)
+
+    async def __acall__(self, request):
+        if not self.enabled:
+            return await self.get_response(request)
+        start = time.perf_counter()
+        with Recorder() as recorder:
+            response = await self.get_response(request)
+        return self.finish(request, response, recorder, start)
+
+    def finish(self, request, response, recorder, start):
+        self.server_timing(response, recorder, time.perf_counter() - start)
+        if not response.streaming:
+            self.log(request, response, recorder, time.perf_counter() - start)
+            return response
+
+        def done():
+            self.log(request, response, recorder, time.perf_counter() - start)
+
+        content = response.streaming_content
+        if response.is_async:
+            response.streaming_content = self.arecord_stream(content, recorder, done)
+        else:
+            response.streaming_content = self.record_stream(content, recorder, done)
+        return response
+
+    def record_stream(self, content, recorder, done):
+        iterator = iter(content)
+        try:
+            while True:
+                with recording(recorder):
+                    chunk = next(iterator, None)
+                if chunk is None:
+                    break
+                yield chunk
+        finally:
+            done()
+
+    async def arecord_stream(self, content, recorder, done):
+        iterator = aiter(content)
+        try:
+            while True:
+                with recording(recorder):
+                    chunk = await anext(iterator, None)
+                if chunk is None:
+                    break
+                yield chunk
+        finally:
+            done()
+
+    def server_timing(self, response, recorder, total_seconds):
+        if getattr(settings, 'SERVER_TIMING', True):
+            response['Server-Timing'] = ', '.join([
+                f'db;dur={recorder.db_seconds * 1000:.1f};desc="{recorder.query_count} queries"',
+                f'tpl;dur={recorder.template_seconds * 1000:.1f}',
+                f'total;dur={total_seconds * 1000:.1f}',
+            ])
+
+    def log(self, request, response, recorder, total_seconds):
+        duplicates = recorder.duplicates()
+        match = getattr(request, 'resolver_match', None)
+        line = {
+            'method': request.method,
+            'path': request.path,
+            'view': match.view_name if match else None,
+            'status': response.status_code,
+            'queries': recorder.query_count,
+            'db_ms': round(recorder.db_seconds * 1000, 1),
+            'template_ms': round(recorder.template_seconds * 1000, 1),
+            'total_ms': round(total_seconds * 1000, 1),
+            'duplicates': [
+                {'count': count, 'fingerprint': key, 'sql': sql[:200]}
+                for count, key, sql in duplicates
+            ],
+        }
+        level = logging.INFO
+        if duplicates and duplicates[0][0] >= DUPLICATE_QUERY_WARNING:
+            level = logging.WARNING
+        logger.log(level, json.dumps(line))
+
+
+class QueryBudget(Recorder):
+    """
+    Test helper: fails if the block runs more than max_queries queries.
+    Unlike assertNumQueries it is an upper bound, so making a view cheaper
+    doesn't break its test.
+    """
+
+    def __init__(self, max_queries):
+        super().__init__()
+        self.max_queries = max_queries
+
+    def __enter__(self):
+        install_all()
+        return super().__enter__()
+
+    def __exit__(self, exc_type, *exc_info):
+        super().__exit__(exc_type, *exc_info)
+        if exc_type is None and self.query_count > self.max_queries:
+            raise AssertionError(
+                f'{self.query_count} queries run, budget is {self.max_queries}:\n'
+                + '\n'.join(sql for sql, _ in self.queries)
+            )
+
+    def assert_no_duplicates(self, threshold=DUPLICATE_QUERY_WARNING):
+        # A per-row loop runs its query once per tweet on the page
+        duplicates = self.duplicates(threshold)
+        if duplicates:
+            raise AssertionError('Repeated queries (N+1?):\n' + '\n'.join(
+                f'{count}x {sql}' for count, _, sql in duplicates
+            ))
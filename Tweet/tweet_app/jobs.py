@@ -0,0 +1,144 @@
+"""
+A small database-backed job queue for slow side effects (SMTP, storage).
+
+    @job()
+    def send_otp_email(session_key, otp_time): ...
+
+    send_otp_email.delay(session_key, otp_time)   # stores a Job row, returns at once
+
+`python manage.py run_worker` claims due jobs and runs them. A failing job is
+retried with exponential backoff (RETRY_BASE_SECONDS * 2**attempt) and after
+max_attempts it is moved to the DeadJob table. Arguments must be JSON
+serializable, and are stored as they are: pass references, not secrets. Tasks live in tasks.py.
+
+Set JOBS_EAGER = True in settings to run jobs inline instead (no worker).
+"""
+import logging
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+REGISTRY = {}
+
+RETRY_BASE_SECONDS = 10
+
+# A running job whose worker died is picked up again after this long
+LOCK_TIMEOUT = timedelta(minutes=5)
+
+
+def job(name=None, max_attempts=5):
+    """Registers a function as a job and gives it a .delay(*args, **kwargs)."""
+    def register(func):
+        job_name = name or func.__name__
+        REGISTRY[job_name] = func
+
+        def delay(*args, **kwargs):
+            return enqueue(job_name, *args, max_attempts=max_attempts, **kwargs)
+
+        func.delay = delay
+        func.job_name = job_name
+        return func
+    return register
+
+
+def enqueue(name, *args, max_attempts=5, run_at=None, **kwargs):
+    from .models import Job
+
+    if getattr(settings, 'JOBS_EAGER', False):
+        REGISTRY[name](*args, **kwargs)
+        return None
+    return Job.objects.create(
+        name=name,
+        args=list(args),
+        kwargs=kwargs,
+        max_attempts=max_attempts,
+        run_at=run_at or timezone.now(),
+    )
+
+
+def enqueue_once(name, *args, delay=0, **kwargs):
+    """Enqueues name unless one is already waiting to run (for batch-style jobs)."""
+    from .models import Job
+
+    if not getattr(settings, 'JOBS_EAGER', False) and Job.objects.filter(name=name, status='pending').exists():
+        return None
+    return enqueue(name, *args, run_at=timezone.now() + timedelta(seconds=delay), **kwargs)
+
+
+def due_jobs(now):
+    return Q(status='pending', run_at__lte=now) | Q(status='running', locked_at__lt=now - LOCK_TIMEOUT)
+
+
+def claim(batch_size=10):
+    """
+    Marks up to batch_size due jobs as running and returns them. The claim is
+    a conditional UPDATE per row, so two workers never get the same job.
+    """
+    from .models import Job
+
+    now = timezone.now()
+    candidates = Job.objects.filter(due_jobs(now)).order_by('run_at').values_list('pk', flat=True)[:batch_size]
+    claimed = []
+    for pk in candidates:
+        if Job.objects.filter(due_jobs(now), pk=pk).update(
+            status='running', locked_at=now, attempts=F('attempts') + 1
+        ):
+            claimed.append(pk)
+    return list(Job.objects.filter(pk__in=claimed).order_by('run_at'))
+
+
+def run(job_row):
+    """Runs one claimed job: deletes it on success, reschedules or buries it on failure."""
+    from .models import DeadJob
+
+    func = REGISTRY.get(job_row.name)
+    try:
+        if func is None:
+            raise LookupError(f'No job registered as {job_row.name!r}')
+        func(*job_row.args, **job_row.kwargs)
+    except Exception:
+        error = traceback.format_exc()
+        logger.warning('Job %s #%s failed (attempt %s)', job_row.name, job_row.pk, job_row.attempts)
+        if job_row.attempts >= job_row.max_attempts:
+            with transaction.atomic():
+                DeadJob.objects.create(
+                    name=job_row.name,
+                    args=job_row.args,
+                    kwargs=job_row.kwargs,
+                    attempts=job_row.attempts,
+                    last_error=error,
+                    created_at=job_row.created_at,
+                )
+                job_row.delete()
+        else:
+            job_row.status = 'pending'
+            job_row.locked_at = None
+            job_row.last_error = error
+            job_row.run_at = timezone.now() + timedelta(
+                seconds=RETRY_BASE_SECONDS * 2 ** (job_row.attempts - 1)
+            )
+            job_row.save(update_fields=['status', 'locked_at', 'last_error', 'run_at'])
+        return False
+    job_row.delete()
+    return True
+
+
+def work(once=False, batch_size=10, idle_sleep=1.0):
+    """Worker loop; with once=True, drains what is due now and returns the count run."""
+    done = 0
+    while True:
+        jobs = claim(batch_size)
+        for job_row in jobs:
+            run(job_row)
+            done += 1
+        if not jobs:
+            if once:
+                return done
+            time.sleep(idle_sleep)
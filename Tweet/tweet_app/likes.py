@@ -0,0 +1,114 @@
+from collections import namedtuple
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+from . import events, ranking, trending
+from .models import Tweet
+
+# The auto-created likes through table (tweet_id, user_id)
+Like = Tweet.likes.through
+
+
+def liked_tweet_ids(user, tweets):
+    """
+    Returns the set of ids in `tweets` that `user` has liked, in one query.
+    Templates check `tweet.id in liked_ids` instead of `user in tweet.likes.all`.
+    """
+    if not user.is_authenticated:
+        return set()
+    ids = [tweet.id for tweet in tweets]
+    if not ids:
+        return set()
+    return set(
+        Like.objects.filter(user_id=user.id, tweet_id__in=ids)
+        .values_list('tweet_id', flat=True)
+    )
+
+
+async def aliked_tweet_ids(user, tweets):
+    """liked_tweet_ids for async views."""
+    if not user.is_authenticated or not tweets:
+        return set()
+    liked = Like.objects.filter(user_id=user.id, tweet_id__in=[tweet.id for tweet in tweets])
+    return {tweet_id async for tweet_id in liked.values_list('tweet_id', flat=True).aiterator()}
+
+
+LikeState = namedtuple('LikeState', ['liked', 'like_count', 'changed'])
+
+
+def set_like(tweet_id, user, liked=None):
+    """
+    Likes/unlikes a tweet in one transaction and returns a LikeState.
+
+    liked=True / liked=False are idempotent intents (liking twice is a no-op),
+    liked=None toggles. Writes go straight to the through table and the
+    counter, so there is no check-then-act window for concurrent double clicks:
+    the DELETE row count and the unique (tweet, user) constraint decide who won.
+    Raises Tweet.DoesNotExist if the tweet is gone.
+    """
+    changed = False
+    with transaction.atomic():
+        if liked is not True:
+            removed, _ = Like.objects.filter(tweet_id=tweet_id, user_id=user.id).delete()
+            if removed:
+                Tweet.objects.filter(pk=tweet_id, like_count__gt=0).update(like_count=F('like_count') - 1)
+                liked, changed = False, True
+            elif liked is None:
+                liked = True
+
+        if liked and not changed:
+            # Bumping the counter first also checks the tweet exists and takes
+            # its row lock, so concurrent inserts for the same tweet queue up here.
+            if not Tweet.objects.filter(pk=tweet_id).update(like_count=F('like_count') + 1):
+                raise Tweet.DoesNotExist
+            try:
+                with transaction.atomic():
+                    Like.objects.create(tweet_id=tweet_id, user_id=user.id)
+                changed = True
+            except IntegrityError:
+                # Already liked: undo the bump
+                Tweet.objects.filter(pk=tweet_id).update(like_count=F('like_count') - 1)
+
+        row = Tweet.objects.filter(pk=tweet_id).values_list('like_count', 'created_at').first()
+        if row is None:
+            raise Tweet.DoesNotExist
+        like_count, created_at = row
+        if changed:
+            Tweet.objects.filter(pk=tweet_id).update(score=ranking.hot_score(like_count, created_at))
+            # Push the new count to open pages once it is committed
+            transaction.on_commit(lambda: events.like_count_changed(tweet_id, like_count))
+            trending.record('like', [tweet_id], 1 if liked else -1)
+    return LikeState(bool(liked), like_count, changed)
+
+
+def reconcile_like_counts(batch_size=1000):
+    """
+    Recomputes like_count from the through table for any tweet that drifted.
+    Works in pk ranges so a big table is never locked in one statement.
+    Returns how many tweets were fixed.
+    """
+    actual = (
+        Like.objects.filter(tweet_id=OuterRef('pk'))
+        .values('tweet_id')
+        .annotate(c=Count('*'))
+        .values('c')
+    )
+    fixed = 0
+    last_pk = 0
+    while True:
+        pks = list(
+            Tweet.objects.filter(pk__gt=last_pk)
+            .order_by('pk')
+            .values_list('pk', flat=True)[:batch_size]
+        )
+        if not pks:
+            return fixed
+        last_pk = pks[-1]
+        fixed += (
+            Tweet.objects.filter(pk__in=pks)
+            .annotate(actual=Coalesce(Subquery(actual), 0))
+            .filter(~Q(like_count=F('actual')))
+            .update(like_count=Coalesce(Subquery(actual), 0))
+        )
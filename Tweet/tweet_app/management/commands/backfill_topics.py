@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from tweet_app.topics import backfill
+
+
+class Command(BaseCommand):
+    help = "Parse #hashtags and @mentions of all existing tweets into the lookup tables."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        count = backfill(batch_size=options['batch_size'], log=self.stdout.write)
+        self.stdout.write(self.style.SUCCESS(f"Indexed topics of {count} tweets."))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from tweet_app.assets import build
+
+
+class Command(BaseCommand):
+    help = "Build static/bundle/ (CSS, subset icon font, JS) from the pinned upstream files."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--refresh', action='store_true', help="Download the upstream files again.")
+        parser.add_argument(
+            '--pin', action='store_true',
+            help="Record the SHA-384 of upstream files that have no pin yet (review and commit SHA384SUMS).",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            written = build(refresh=options['refresh'], pin=options['pin'], log=self.stdout.write)
+        except ValueError as e:
+            raise CommandError(e)
+        self.stdout.write(self.style.SUCCESS(
+            f"Built {len(written)} bundle files, run collectstatic to hash and compress them."
+        ))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from tweet_app.trending import compact
+
+
+class Command(BaseCommand):
+    help = "Roll old minute trending counters into hour buckets and drop expired ones."
+
+    def handle(self, *args, **options):
+        rolled, expired = compact()
+        self.stdout.write(self.style.SUCCESS(
+            f"Compacted into {rolled} hour buckets, dropped {expired} expired."
+        ))
@@ -0,0 +1,30 @@
+import sqlite3
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from tweet_app.replicas import PRIMARY, replica_aliases
+
+
+class Command(BaseCommand):
+    help = "Snapshot the SQLite primary into each SQLite replica (to try the replica router locally)."
+
+    def handle(self, *args, **options):
+        primary = connections[PRIMARY]
+        if primary.vendor != 'sqlite':
+            raise CommandError("Only for SQLite; real databases replicate by themselves.")
+        aliases = replica_aliases()
+        if not aliases:
+            raise CommandError("No replicas configured, set REPLICA_DATABASE_URLS.")
+        primary.ensure_connection()
+        for alias in aliases:
+            replica = connections[alias]
+            replica.close()
+            # The online backup API copies a consistent snapshot, even in WAL mode
+            target = sqlite3.connect(replica.settings_dict['NAME'])
+            try:
+                primary.connection.backup(target)
+            finally:
+                target.close()
+            self.stdout.write(f"{alias}: {replica.settings_dict['NAME']}")
+        self.stdout.write(self.style.SUCCESS(f"Copied the primary to {len(aliases)} replicas."))
@@ -0,0 +1,32 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from tweet_app import tasks
+from tweet_app.deletion import delete_users
+
+
+class Command(BaseCommand):
+    help = "Delete accounts with all their tweets and likes, in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('usernames', nargs='+')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--enqueue', action='store_true', help="Queue it for the job worker instead.")
+
+    def handle(self, *args, **options):
+        users = User.objects.filter(username__in=options['usernames'])
+        missing = set(options['usernames']) - set(users.values_list('username', flat=True))
+        if missing:
+            raise CommandError(f"No such users: {', '.join(sorted(missing))}")
+        if options['enqueue']:
+            tasks.delete_users.delay(list(users.values_list('pk', flat=True)), batch_size=options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f"Queued deletion of {len(options['usernames'])} accounts."))
+            return
+        counts = delete_users(
+            users,
+            batch_size=options['batch_size'],
+            log=lambda message: self.stdout.write(f"  {message}"),
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Deleted {counts['users']} accounts, {counts['tweets']} tweets and {counts['likes']} likes they gave."
+        ))
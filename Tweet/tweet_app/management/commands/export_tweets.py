@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from tweet_app.transfer import export_data
+
+
+class Command(BaseCommand):
+    help = "Write users, profiles, follows, tweets and likes to a compressed NDJSON file."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Output file, gzip unless it ends in .xz or .bz2.")
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        counts = export_data(
+            options['path'],
+            batch_size=options['batch_size'],
+            log=lambda message: self.stdout.write(f"  {message}"),
+        )
+        summary = ', '.join(f"{count} {kind}" for kind, count in counts.items())
+        self.stdout.write(self.style.SUCCESS(f"Exported {summary} to {options['path']}."))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from tweet_app.transfer import import_data
+
+
+class Command(BaseCommand):
+    help = "Load a file written by export_tweets into an empty database and rebuild derived data."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        try:
+            counts = import_data(
+                options['path'],
+                batch_size=options['batch_size'],
+                log=lambda message: self.stdout.write(f"  {message}"),
+            )
+        except ValueError as e:
+            raise CommandError(e)
+        summary = ', '.join(f"{count} {kind}" for kind, count in counts.items())
+        self.stdout.write(self.style.SUCCESS(f"Imported {summary}."))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from tweet_app.search import get_backend
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text search index for all tweets."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        backend = get_backend()
+        count = backend.rebuild(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {type(backend).__name__} index ({count} tweets)."
+        ))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from tweet_app import tasks
+from tweet_app.likes import reconcile_like_counts
+
+
+class Command(BaseCommand):
+    help = "Recompute Tweet.like_count from the likes table for tweets that drifted."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--enqueue', action='store_true', help="Queue it for the job worker instead.")
+
+    def handle(self, *args, **options):
+        if options['enqueue']:
+            tasks.reconcile_like_counts.delay(batch_size=options['batch_size'])
+            self.stdout.write(self.style.SUCCESS("Queued like count reconciliation."))
+            return
+        fixed = reconcile_like_counts(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Reconciled like counts ({fixed} tweets fixed)."))
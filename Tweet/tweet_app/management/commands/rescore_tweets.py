@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from tweet_app import tasks
+from tweet_app.ranking import rescore
+
+
+class Command(BaseCommand):
+    help = "Recompute the stored \"top\" feed score of every tweet."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--enqueue', action='store_true', help="Queue it for the job worker instead.")
+
+    def handle(self, *args, **options):
+        if options['enqueue']:
+            tasks.rescore_tweets.delay(batch_size=options['batch_size'])
+            self.stdout.write(self.style.SUCCESS("Queued tweet rescoring."))
+            return
+        fixed = rescore(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Rescored tweets ({fixed} changed)."))
@@ -0,0 +1,60 @@
+import json
+import logging
+
+from django.core.management.base import BaseCommand, CommandError
+
+from tweet_app import bench
+
+
+class Command(BaseCommand):
+    help = "Benchmark the feeds, detail, search, like, profile and tag views (run seed_bench first)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('scenarios', nargs='*', help=f"Any of {', '.join(bench.SCENARIOS)} (default: all).")
+        parser.add_argument('--requests', type=int, default=100, help="Measured requests per scenario.")
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument('--client', choices=['sync', 'asgi'], default='sync')
+        parser.add_argument('--concurrency', type=int, default=1, help="In-flight requests (asgi client only).")
+        parser.add_argument('--write-threads', type=int, default=8, help="Writer threads for like_concurrent.")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help="Write the results as JSON here.")
+        parser.add_argument('--compare', help="A previous --output file to compare against.")
+
+    def handle(self, *args, **options):
+        # One log line per request would drown the report
+        logging.getLogger('tweet_app.requests').setLevel(logging.WARNING)
+        unknown = set(options['scenarios']) - set(bench.SCENARIOS)
+        if unknown:
+            raise CommandError(f"Unknown scenario(s): {', '.join(sorted(unknown))}")
+        try:
+            results = bench.run(
+                scenarios=options['scenarios'] or bench.SCENARIOS,
+                requests=options['requests'],
+                warmup=options['warmup'],
+                client=options['client'],
+                concurrency=options['concurrency'],
+                write_threads=options['write_threads'],
+                seed=options['seed'],
+                log=self.report,
+            )
+        except ValueError as e:
+            raise CommandError(e)
+
+        if options['output']:
+            bench.save(results, options['output'])
+            self.stdout.write(self.style.SUCCESS(f"Results saved to {options['output']}."))
+
+        if options['compare']:
+            with open(options['compare']) as f:
+                previous = json.load(f)
+            self.stdout.write(f"\nCompared to {previous['meta'].get('commit') or options['compare']}:")
+            for name, metric, old, new, change in bench.compare(results, previous):
+                change = f"{change:+.1f}%" if change is not None else "n/a"
+                self.stdout.write(f"  {name:<14} {metric:<20} {old!s:>10} -> {new!s:<10} {change}")
+
+    def report(self, name, summary):
+        self.stdout.write(
+            f"{name:<14} p50 {summary['p50_ms']}ms  p95 {summary['p95_ms']}ms  p99 {summary['p99_ms']}ms  "
+            f"{summary['queries_per_request']} queries/req  {summary['throughput_rps']} req/s  "
+            f"{summary['errors']} errors"
+        )
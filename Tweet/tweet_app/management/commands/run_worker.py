@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from tweet_app import tasks  # noqa: F401  (registers the jobs)
+from tweet_app.jobs import work
+
+
+class Command(BaseCommand):
+    help = "Run queued background jobs (OTP mail, storage cleanup, ...)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Run what is due now and exit.")
+        parser.add_argument('--batch-size', type=int, default=10)
+        parser.add_argument('--sleep', type=float, default=1.0, help="Seconds to wait when idle.")
+
+    def handle(self, *args, **options):
+        done = work(once=options['once'], batch_size=options['batch_size'], idle_sleep=options['sleep'])
+        self.stdout.write(self.style.SUCCESS(f"Ran {done} jobs."))
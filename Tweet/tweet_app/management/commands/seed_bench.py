@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from tweet_app.bench import seed
+
+
+class Command(BaseCommand):
+    help = "Bulk-generate bench users, follows, tweets and likes for run_bench."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=500)
+        parser.add_argument('--tweets', type=int, default=20000)
+        parser.add_argument('--follows', type=int, default=20, help="Accounts each user follows.")
+        parser.add_argument('--photo-ratio', type=float, default=0.1, help="Share of tweets with a (stub) photo.")
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        counts = seed(
+            users=options['users'],
+            tweets=options['tweets'],
+            follows=options['follows'],
+            photo_ratio=options['photo_ratio'],
+            batch_size=options['batch_size'],
+            seed=options['seed'],
+            log=lambda message: self.stdout.write(f"  {message}"),
+        )
+        summary = ', '.join(f"{count} {name}" for name, count in counts.items())
+        self.stdout.write(self.style.SUCCESS(f"Seeded {summary}."))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from tweet_app.timeline import TIMELINE_LENGTH, get_store
+
+
+class Command(BaseCommand):
+    help = "Drop home timeline entries beyond the newest TIMELINE_LENGTH per user."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--length', type=int, default=TIMELINE_LENGTH)
+
+    def handle(self, *args, **options):
+        removed = get_store().trim(options['length'])
+        self.stdout.write(self.style.SUCCESS(f"Trimmed {removed} timeline entries."))
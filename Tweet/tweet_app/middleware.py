@@ -1,8 +1,74 @@
-from django.utils.deprecation import MiddlewareMixin
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.utils.cache import patch_cache_control, patch_vary_headers
 
-class NoCacheMiddleware(MiddlewareMixin):
-    def process_response(self, request, response):
-        response['Cache-Control'] = 'no-cache, no-store, must-revalidate'
-        response['Pragma'] = 'no-cache'
-        response['Expires'] = '0'
+# Pages that must never be stored anywhere (forms with personal data, OTP flow)
+NO_STORE_URL_NAMES = {
+    'profile_edit',
+    'register',
+    'login',
+    'logout',
+    'password_reset',
+    'password_reset_done',
+    'password_reset_confirm',
+    'password_reset_complete',
+}
+
+
+class CachePolicyMiddleware:
+    """
+    Picks a Cache-Control header per response (unless the view set one):
+      - no-store for sensitive pages, non-GET requests and non-200 responses
+      - private, no-cache for logged-in users and responses setting cookies,
+        so browsers keep the page but revalidate (cheap with conditional.py's 304s)
+      - public, max-age=ANONYMOUS_CACHE_SECONDS for everything else
+
+    Runs natively under both WSGI and ASGI, so async views don't bounce
+    through a thread just for this.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        response = self.get_response(request)
+        user = getattr(request, 'user', None)
+        return self.apply_policy(request, response, user is not None and user.is_authenticated)
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        user = await request.auser() if hasattr(request, 'auser') else None
+        return self.apply_policy(request, response, user is not None and user.is_authenticated)
+
+    def apply_policy(self, request, response, authenticated):
+        if response.has_header('Cache-Control'):
+            return response
+
+        match = getattr(request, 'resolver_match', None)
+        url_name = match.url_name if match else None
+
+        if (
+            url_name in NO_STORE_URL_NAMES
+            or request.method not in ('GET', 'HEAD')
+            or response.status_code not in (200, 304)
+        ):
+            patch_cache_control(response, no_store=True, no_cache=True, must_revalidate=True)
+        elif (
+            authenticated
+            or response.cookies
+            # CsrfViewMiddleware runs after us and will add a csrftoken cookie
+            or request.META.get('CSRF_COOKIE_NEEDS_UPDATE')
+        ):
+            patch_cache_control(response, private=True, no_cache=True)
+        else:
+            patch_cache_control(
+                response, public=True, max_age=getattr(settings, 'ANONYMOUS_CACHE_SECONDS', 60)
+            )
+        patch_vary_headers(response, ['Cookie'])
         return response
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.8 on 2026-10-18 09:47
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_like_count(apps, schema_editor):
+    Tweet = apps.get_model('tweet_app', 'Tweet')
+    Like = Tweet.likes.through
+    counts = (
+        Like.objects.filter(tweet_id=OuterRef('pk'))
+        .values('tweet_id')
+        .annotate(c=Count('*'))
+        .values('c')
+    )
+    Tweet.objects.update(like_count=Coalesce(Subquery(counts), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tweet_app', '0005_tweet_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tweet',
+            name='like_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_like_count, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,62 @@
+import re
+
+from django.db import migrations, utils
+
+# search.split_text as it was when the index was added: the migration must
+# keep working whatever happens to tweet_app.search later
+# (`manage.py rebuild_search_index` reindexes with the current tokenizer).
+TAG_RE = re.compile(r'[#@]\w+')
+
+
+def split_text(text):
+    tags = ' '.join(tag.lower() for tag in TAG_RE.findall(text))
+    body = text.replace('#', ' ').replace('@', ' ')
+    return body, tags
+
+
+def create_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'sqlite':
+        try:
+            schema_editor.execute(
+                "CREATE VIRTUAL TABLE tweet_app_tweet_fts USING fts5("
+                "body, tags, tokenize=\"unicode61 tokenchars '#@_'\")"
+            )
+        except utils.OperationalError:
+            # SQLite built without FTS5: search falls back to icontains
+            return
+        Tweet = apps.get_model('tweet_app', 'Tweet')
+        rows = [(pk, *split_text(text)) for pk, text in Tweet.objects.values_list('id', 'text')]
+        if rows:
+            with connection.cursor() as cursor:
+                cursor.executemany(
+                    "INSERT INTO tweet_app_tweet_fts (rowid, body, tags) VALUES (%s, %s, %s)", rows
+                )
+    elif connection.vendor == 'postgresql':
+        schema_editor.execute(
+            "ALTER TABLE tweet_app_tweet ADD COLUMN search_vector tsvector "
+            "GENERATED ALWAYS AS (to_tsvector('simple', text)) STORED"
+        )
+        schema_editor.execute(
+            "CREATE INDEX tweet_search_vector_idx ON tweet_app_tweet USING GIN (search_vector)"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE IF EXISTS tweet_app_tweet_fts")
+    elif connection.vendor == 'postgresql':
+        schema_editor.execute("DROP INDEX IF EXISTS tweet_search_vector_idx")
+        schema_editor.execute("ALTER TABLE tweet_app_tweet DROP COLUMN IF EXISTS search_vector")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tweet_app', '0006_tweet_like_count'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
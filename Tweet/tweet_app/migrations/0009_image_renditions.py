@@ -0,0 +1,23 @@
+# Generated by Django 5.2.8 on 2026-10-18 09:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tweet_app', '0008_follow_timeline'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='pic_renditions',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='tweet',
+            name='photo_renditions',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
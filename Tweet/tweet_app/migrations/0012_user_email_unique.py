@@ -0,0 +1,52 @@
+from django.db import migrations
+from django.db.models import F
+from django.db.models.functions import Lower
+
+# auth.User belongs to Django, so the index is plain SQL: unique per
+# lower-cased email (what EmailBackend looks up), ignoring blank emails
+# (e.g. superusers created without one). SQLite and Postgres both support
+# expression and partial indexes.
+CREATE_INDEX = (
+    "CREATE UNIQUE INDEX auth_user_email_lower_uniq "
+    "ON auth_user (LOWER(email)) WHERE email <> ''"
+)
+DROP_INDEX = "DROP INDEX IF EXISTS auth_user_email_lower_uniq"
+
+
+def clear_duplicate_emails(apps, schema_editor):
+    """
+    The index can't be built while two accounts share an address in
+    different case. Each address stays with the account that logged in last
+    (the oldest one if neither has); the others get a blank email, which
+    the index ignores, and are listed so they can be contacted and fixed.
+    """
+    User = apps.get_model('auth', 'User')
+    users = User.objects.using(schema_editor.connection.alias).exclude(email='')
+    # LOWER() of the database, like the index (SQLite only folds ASCII)
+    rows = users.annotate(email_lower=Lower('email')).order_by(
+        'email_lower', F('last_login').desc(nulls_last=True), 'pk'
+    ).values_list('pk', 'username', 'email', 'email_lower')
+    cleared = []
+    previous = None
+    for pk, username, email, email_lower in rows.iterator(chunk_size=2000):
+        if email_lower == previous:
+            cleared.append((pk, username, email))
+        previous = email_lower
+    if cleared:
+        users.filter(pk__in=[pk for pk, _, _ in cleared]).update(email='')
+        print(f'\n  Cleared the email of {len(cleared)} account(s) sharing an address with another:')
+        for pk, username, email in cleared:
+            print(f'    #{pk} {username} <{email}>')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('tweet_app', '0011_orphan_files'),
+    ]
+
+    operations = [
+        migrations.RunPython(clear_duplicate_emails, migrations.RunPython.noop),
+        migrations.RunSQL(CREATE_INDEX, DROP_INDEX),
+    ]
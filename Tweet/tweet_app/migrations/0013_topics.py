@@ -0,0 +1,58 @@
+# Generated by Django 5.2.8 on 2026-10-18 10:13
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tweet_app', '0012_user_email_unique'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Hashtag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='TweetTag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField()),
+                ('tag', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='tweet_app.hashtag')),
+                ('tweet', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='tweet_app.tweet')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='tweet',
+            name='tags',
+            field=models.ManyToManyField(blank=True, related_name='tweets', through='tweet_app.TweetTag', to='tweet_app.hashtag'),
+        ),
+        migrations.CreateModel(
+            name='Mention',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField()),
+                ('tweet', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='tweet_app.tweet')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='mentions', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'created_at', 'tweet'], name='mention_user_created_idx')],
+                'constraints': [models.UniqueConstraint(fields=('tweet', 'user'), name='unique_mention')],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='tweettag',
+            index=models.Index(fields=['tag', 'created_at', 'tweet'], name='tweettag_tag_created_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='tweettag',
+            constraint=models.UniqueConstraint(fields=('tweet', 'tag'), name='unique_tweet_tag'),
+        ),
+    ]
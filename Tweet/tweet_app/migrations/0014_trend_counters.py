@@ -0,0 +1,28 @@
+# Generated by Django 5.2.8 on 2026-10-18 10:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tweet_app', '0013_topics'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrendCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('tag', 'Hashtag uses'), ('like', 'Tweet likes')], max_length=8)),
+                ('key', models.BigIntegerField()),
+                ('resolution', models.CharField(choices=[('m', 'Minute'), ('h', 'Hour')], max_length=1)),
+                ('bucket', models.DateTimeField()),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['kind', 'bucket'], name='trend_kind_bucket_idx'), models.Index(fields=['resolution', 'bucket'], name='trend_resolution_bucket_idx')],
+                'constraints': [models.UniqueConstraint(fields=('kind', 'key', 'resolution', 'bucket'), name='unique_trend_bucket')],
+            },
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.8 on 2026-10-18 10:17
+
+import math
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.db import migrations, models
+
+# Frozen copy of ranking.hot_score as of this migration, so later changes to
+# the app code don't change what it does. ranking.rescore() applies the
+# current formula.
+EPOCH = datetime(2025, 1, 1, tzinfo=timezone.utc)
+GRAVITY_SECONDS = 45000
+
+
+def hot_score(like_count, created_at):
+    return round(math.log10(max(like_count, 1)) + (created_at - EPOCH).total_seconds() / GRAVITY_SECONDS, 7)
+
+
+def backfill_score(apps, schema_editor):
+    Tweet = apps.get_model('tweet_app', 'Tweet')
+    tweets = Tweet.objects.only('like_count', 'created_at')
+    batch = []
+    for tweet in tweets.iterator(chunk_size=1000):
+        tweet.score = hot_score(tweet.like_count, tweet.created_at)
+        batch.append(tweet)
+        if len(batch) == 1000:
+            Tweet.objects.bulk_update(batch, ['score'])
+            batch = []
+    Tweet.objects.bulk_update(batch, ['score'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tweet_app', '0014_trend_counters'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tweet',
+            name='score',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='tweet',
+            index=models.Index(fields=['score', 'id'], name='tweet_score_id_idx'),
+        ),
+        migrations.RunPython(backfill_score, migrations.RunPython.noop),
+    ]
@@ -3,6 +3,9 @@ from django.contrib.auth.models import User
 # os is no longer needed for this
 from django.db.models.signals import post_delete, pre_save, post_save
 from django.dispatch import receiver
+from django.utils import timezone
+from . import search, fragment_cache, images, backends, topics, trending, ranking
+from .storage_cleanup import discard_files
 
 # Create your models here.
 
@@ -10,19 +13,52 @@ class Tweet(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     text = models.TextField(max_length=280)
     photo = models.ImageField(upload_to="photos/", blank=True, null=True)
+    # Resized copies of photo, filled in by images.py after upload
+    photo_renditions = models.JSONField(default=dict, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     likes = models.ManyToManyField(User, related_name='tweet_likes', blank = True)
+    # Denormalized copy of likes.count(), kept in sync with F() updates in likes.py
+    like_count = models.PositiveIntegerField(default=0)
+    # Rank in the "top" feed, see ranking.py; rewritten whenever like_count changes
+    score = models.FloatField(default=0)
+    # Filled in from the text by topics.py
+    tags = models.ManyToManyField('Hashtag', through='TweetTag', related_name='tweets', blank=True)
+
+    class Meta:
+        # Keyset pagination (see pagination.py) walks these as range scans
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='tweet_created_id_idx'),
+            models.Index(fields=['user', 'created_at'], name='tweet_user_created_idx'),
+            models.Index(fields=['score', 'id'], name='tweet_score_id_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.text[:50]}"
     
     def total_likes(self):
-        return self.likes.count()
+        return self.like_count
 
     # We can remove the custom .delete() and .save() methods
     # The signals below will handle everything
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the photo as loaded, so the update signal needs no extra SELECT
+        loaded = dict(zip(field_names, values))
+        if 'photo' in loaded and 'photo_renditions' in loaded:
+            instance._loaded_photo = (loaded['photo'], loaded['photo_renditions'])
+        if 'text' in loaded:
+            instance._loaded_text = loaded['text']
+        return instance
+
+    def photo_files(self):
+        """The photo and its resized copies, as storage names."""
+        if not self.photo:
+            return []
+        return [self.photo.name, *images.rendition_files(self.photo_renditions)]
+
 
 # ✅ When tweet deleted → delete the image file from S3
 @receiver(post_delete, sender=Tweet)
@@ -31,8 +67,39 @@ def delete_photo_on_tweet_delete(sender, instance, **kwargs):
     Deletes photo from S3 when Tweet is deleted.
     'instance' is the Tweet object that was deleted.
     """
-    if instance.photo:
-        instance.photo.delete(save=False)
+    # Storage round-trips happen later, in one batch (storage_cleanup.py)
+    discard_files(instance.photo_files())
+
+# ✅ Keep the full-text search index in step with the tweets table
+@receiver(post_save, sender=Tweet)
+def index_tweet_for_search(sender, instance, **kwargs):
+    search.get_backend().index(instance)
+
+@receiver(post_delete, sender=Tweet)
+def remove_tweet_from_search(sender, instance, **kwargs):
+    search.get_backend().remove(instance.pk)
+
+# ✅ New tweets start with their "top" feed score
+@receiver(pre_save, sender=Tweet)
+def score_new_tweet(sender, instance, **kwargs):
+    if instance._state.adding:
+        instance.score = ranking.hot_score(instance.like_count, instance.created_at)
+
+# ✅ Re-parse #hashtags and @mentions when a tweet is posted or its text edited
+@receiver(post_save, sender=Tweet)
+def index_tweet_topics(sender, instance, created, **kwargs):
+    if created or instance.text != getattr(instance, '_loaded_text', None):
+        tagged = topics.index_tweet(instance)
+        instance._loaded_text = instance.text
+        if created:
+            trending.record('tag', [row.tag_id for row in tagged])
+
+# ✅ Drop cached card HTML of a tweet that changes or goes away
+@receiver(pre_save, sender=Tweet)
+@receiver(post_delete, sender=Tweet)
+def invalidate_tweet_cards(sender, instance, **kwargs):
+    if instance.pk:
+        fragment_cache.invalidate(instance)
 
 # ✅ When tweet updated → delete old image if replaced
 @receiver(pre_save, sender=Tweet)
@@ -44,19 +111,20 @@ def delete_old_photo_on_update(sender, instance, **kwargs):
     if not instance.pk:
         return
 
-    try:
-        # Get the 'old' version of the object from the database
-        old_tweet = Tweet.objects.get(pk=instance.pk)
-    except Tweet.DoesNotExist:
-        return # Object is new, so no old photo to delete
+    loaded = getattr(instance, '_loaded_photo', None)
+    if loaded is None:
+        # Instance wasn't loaded from the DB with its photo (e.g. built by hand)
+        loaded = Tweet.objects.filter(pk=instance.pk).values_list('photo', 'photo_renditions').first()
+        if loaded is None:
+            return # Object is new, so no old photo to delete
+    old_photo, old_renditions = loaded
 
     # Check if the photo field has changed, and if the old photo exists
-    if old_tweet.photo and old_tweet.photo != instance.photo:
-        # Delete the old photo from S3
-        old_tweet.photo.delete(save=False)
-    
-
-
+    if old_photo and old_photo != instance.photo.name:
+        # Delete the old photo and its resized copies from S3 (later, batched)
+        discard_files([old_photo, *images.rendition_files(old_renditions)])
+        instance.photo_renditions = {}
+    instance._loaded_photo = (instance.photo.name, instance.photo_renditions)
 
 
 #Profile model to extend User model
@@ -64,10 +132,47 @@ class Profile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     bio = models.TextField(max_length=500, blank=True)
     profile_pic = models.ImageField(upload_to='profile_pics/', default='default.jpg', blank=True, null=True)
+    # Resized copies of profile_pic, filled in by images.py after upload
+    pic_renditions = models.JSONField(default=dict, blank=True)
+    # Denormalized Follow count, decides fan-out-on-write vs on-read (timeline.py)
+    follower_count = models.PositiveIntegerField(default=0)
 
     def __str__(self):
         return f'{self.user.username} Profile'
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Same as Tweet: the update signal compares against the picture as loaded
+        loaded = dict(zip(field_names, values))
+        if 'profile_pic' in loaded and 'pic_renditions' in loaded:
+            instance._loaded_pic = (loaded['profile_pic'], loaded['pic_renditions'])
+        return instance
+
+# ✅ When profile picture replaced → discard the old one and its resized copies
+@receiver(pre_save, sender=Profile)
+def delete_old_pic_on_update(sender, instance, **kwargs):
+    if not instance.pk:
+        return
+    loaded = getattr(instance, '_loaded_pic', None)
+    if loaded is None:
+        loaded = Profile.objects.filter(pk=instance.pk).values_list('profile_pic', 'pic_renditions').first()
+        if loaded is None:
+            return
+    old_pic, old_renditions = loaded
+    if old_pic != instance.profile_pic.name:
+        files = images.rendition_files(old_renditions)
+        # The shared default picture is never ours to delete
+        if old_pic and old_pic != Profile._meta.get_field('profile_pic').default:
+            files.append(old_pic)
+        discard_files(files)
+        instance.pic_renditions = {}
+
+@receiver(post_save, sender=Profile)
+def remember_saved_pic(sender, instance, **kwargs):
+    # After save: a new upload only gets its final storage name while saving
+    instance._loaded_pic = (instance.profile_pic.name, instance.pic_renditions)
+
 # --- SIGNALS (Auto-create Profile when User is created) ---
 @receiver(post_save, sender=User)
 def create_profile(sender, instance, created, **kwargs):
@@ -76,4 +181,146 @@ def create_profile(sender, instance, created, **kwargs):
 
 @receiver(post_save, sender=User)
 def save_profile(sender, instance, **kwargs):
-    instance.profile.save()
\ No newline at end of file
+    instance.profile.save()
+
+# ✅ Logged-in users are cached by EmailBackend, drop the copy when they change
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def forget_cached_user(sender, instance, **kwargs):
+    backends.forget_user(instance.pk)
+
+
+# Follow graph: follower sees followee's tweets on their home timeline
+class Follow(models.Model):
+    follower = models.ForeignKey(User, on_delete=models.CASCADE, related_name='following')
+    followee = models.ForeignKey(User, on_delete=models.CASCADE, related_name='followers')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['follower', 'followee'], name='unique_follow'),
+        ]
+
+    def __str__(self):
+        return f'{self.follower.username} follows {self.followee.username}'
+
+
+# Precomputed home timeline rows, written at tweet time by timeline.fan_out_tweet
+class TimelineEntry(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    tweet = models.ForeignKey(Tweet, on_delete=models.CASCADE)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'tweet'], name='unique_timeline_entry'),
+        ]
+
+
+# --- #hashtags and @mentions (see topics.py) ---
+class Hashtag(models.Model):
+    # Lowercased, without the #
+    name = models.CharField(max_length=100, unique=True)
+
+    def __str__(self):
+        return f'#{self.name}'
+
+
+class TweetTag(models.Model):
+    tweet = models.ForeignKey(Tweet, on_delete=models.CASCADE)
+    tag = models.ForeignKey(Hashtag, on_delete=models.CASCADE)
+    # Copy of tweet.created_at, so a tag page is one index range scan
+    created_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['tweet', 'tag'], name='unique_tweet_tag'),
+        ]
+        indexes = [
+            models.Index(fields=['tag', 'created_at', 'tweet'], name='tweettag_tag_created_idx'),
+        ]
+
+
+class Mention(models.Model):
+    tweet = models.ForeignKey(Tweet, on_delete=models.CASCADE)
+    # The user mentioned, not the author
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='mentions')
+    created_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['tweet', 'user'], name='unique_mention'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'created_at', 'tweet'], name='mention_user_created_idx'),
+        ]
+
+
+
+# Decayed activity counts for trending.py, one row per (kind, key, bucket)
+class TrendCounter(models.Model):
+    KINDS = [('tag', 'Hashtag uses'), ('like', 'Tweet likes')]
+    RESOLUTIONS = [('m', 'Minute'), ('h', 'Hour')]
+
+    kind = models.CharField(max_length=8, choices=KINDS)
+    # Hashtag id or Tweet id, depending on kind
+    key = models.BigIntegerField()
+    resolution = models.CharField(max_length=1, choices=RESOLUTIONS)
+    # Start of the minute/hour
+    bucket = models.DateTimeField()
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'key', 'resolution', 'bucket'], name='unique_trend_bucket'),
+        ]
+        indexes = [
+            models.Index(fields=['kind', 'bucket'], name='trend_kind_bucket_idx'),
+            models.Index(fields=['resolution', 'bucket'], name='trend_resolution_bucket_idx'),
+        ]
+
+
+# Media files waiting for storage_cleanup.purge_orphan_files
+class OrphanFile(models.Model):
+    name = models.CharField(max_length=500)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.name
+
+
+# --- Background jobs (see jobs.py) ---
+class Job(models.Model):
+    PENDING = 'pending'
+    RUNNING = 'running'
+    STATUS_CHOICES = [(PENDING, 'Pending'), (RUNNING, 'Running')]
+
+    name = models.CharField(max_length=100)
+    args = models.JSONField(default=list, blank=True)
+    kwargs = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'run_at'], name='job_status_run_at_idx')]
+
+    def __str__(self):
+        return f'{self.name} ({self.status}, attempt {self.attempts})'
+
+
+# Jobs that used up all their attempts, kept for inspection / requeue
+class DeadJob(models.Model):
+    name = models.CharField(max_length=100)
+    args = models.JSONField(default=list, blank=True)
+    kwargs = models.JSONField(default=dict, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField()
+    failed_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f'{self.name} (failed {self.failed_at:%Y-%m-%d %H:%M})'
@@ -0,0 +1,84 @@
+import base64
+from datetime import datetime
+
+from django.db.models import Q
+
+PAGE_SIZE = 20
+
+
+def pack_cursor(*parts):
+    """Joins cursor values into an opaque url-safe token."""
+    raw = "|".join(str(part) for part in parts).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def unpack_cursor(cursor):
+    """Splits a token from pack_cursor back into strings, or None if garbled."""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        return base64.urlsafe_b64decode(padded).decode().split("|")
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def encode_cursor(created_at, pk):
+    """
+    Turns the (created_at, id) of the last tweet on a page into an opaque
+    url-safe token the client hands back to get the next page.
+    """
+    return pack_cursor(created_at.isoformat(), pk)
+
+
+def decode_cursor(cursor):
+    """
+    Returns (created_at, id) for a cursor, or None if it is missing/garbled
+    (a bad cursor just means "start from the top").
+    """
+    try:
+        created_at, pk = unpack_cursor(cursor)
+        return datetime.fromisoformat(created_at), int(pk)
+    except (TypeError, ValueError):
+        return None
+
+
+def page_query(queryset, cursor, id_field="id"):
+    """
+    Keyset pagination over tweets, newest first.
+
+    Instead of OFFSET we filter on (created_at, id) being strictly before the
+    cursor, so every page is an index range scan on (created_at, id) and costs
+    the same no matter how deep the client has scrolled. Rows that point at
+    a tweet and copy its created_at (topics.py) page with id_field="tweet_id".
+    """
+    queryset = queryset.order_by("-created_at", f"-{id_field}")
+    position = decode_cursor(cursor)
+    if position:
+        created_at, pk = position
+        queryset = queryset.filter(
+            Q(created_at__lt=created_at) | Q(created_at=created_at, **{f"{id_field}__lt": pk})
+        )
+    return queryset
+
+
+def split_page(tweets, page_size):
+    # We fetch one extra row to know if there is another page without a COUNT
+    next_cursor = None
+    if len(tweets) > page_size:
+        tweets = tweets[:page_size]
+        last = tweets[-1]
+        next_cursor = encode_cursor(last.created_at, last.pk)
+    return tweets, next_cursor
+
+
+def paginate_tweets(queryset, cursor=None, page_size=PAGE_SIZE):
+    """Returns (tweets, next_cursor); next_cursor is None on the last page."""
+    tweets = list(page_query(queryset, cursor)[:page_size + 1])
+    return split_page(tweets, page_size)
+
+
+async def apaginate_tweets(queryset, cursor=None, page_size=PAGE_SIZE):
+    """paginate_tweets for async views."""
+    tweets = [tweet async for tweet in page_query(queryset, cursor)[:page_size + 1].aiterator()]
+    return split_page(tweets, page_size)
@@ -0,0 +1,103 @@
+"""
+The "top" feed: tweets ranked by a stored score.
+
+    score = log10(max(like_count, 1)) + (created_at - EPOCH) / GRAVITY_SECONDS
+
+Likes count logarithmically, and every GRAVITY_SECONDS of age costs as much
+as a tenfold difference in likes. Because the recency term grows with the
+creation time instead of shrinking with the age, the order of two tweets
+never changes as the clock moves. The score only has to be rewritten when
+like_count does (set_like does that in the same transaction), and the top
+feed is an index range scan on (score, id), paginated on a (score, id)
+cursor like search results.
+
+rescore() recomputes every stored score in pk batches. Run it
+(`manage.py rescore_tweets`, or the rescore_tweets job) after changing the
+constants, after bulk loads that skip the model signals, or after
+reconcile_like_counts fixes drifted counters.
+"""
+import math
+from datetime import datetime, timezone
+
+from django.db.models import Q
+from django.utils import timezone as django_timezone
+
+from .pagination import PAGE_SIZE, pack_cursor, unpack_cursor
+
+EPOCH = datetime(2025, 1, 1, tzinfo=timezone.utc)
+GRAVITY_SECONDS = 45000
+
+
+def hot_score(like_count, created_at):
+    created_at = created_at or django_timezone.now()
+    return round(math.log10(max(like_count, 1)) + (created_at - EPOCH).total_seconds() / GRAVITY_SECONDS, 7)
+
+
+def decode_cursor(cursor):
+    try:
+        score, pk = unpack_cursor(cursor)
+        return float(score), int(pk)
+    except (TypeError, ValueError):
+        return None
+
+
+def page_query(queryset, cursor):
+    """Tweets best first, strictly after the (score, id) in the cursor."""
+    queryset = queryset.order_by('-score', '-id')
+    position = decode_cursor(cursor)
+    if position:
+        score, pk = position
+        queryset = queryset.filter(Q(score__lt=score) | Q(score=score, id__lt=pk))
+    return queryset
+
+
+def split_page(tweets, page_size):
+    next_cursor = None
+    if len(tweets) > page_size:
+        tweets = tweets[:page_size]
+        next_cursor = pack_cursor(repr(tweets[-1].score), tweets[-1].pk)
+    return tweets, next_cursor
+
+
+async def apaginate_tweets(queryset, cursor=None, page_size=PAGE_SIZE):
+    """Returns (tweets, next_cursor) for one page of the top feed."""
+    tweets = [tweet async for tweet in page_query(queryset, cursor)[:page_size + 1].aiterator()]
+    return split_page(tweets, page_size)
+
+
+def rescore(batch_size=1000):
+    """Rewrites the stored score of every tweet whose score is off; returns how many."""
+    from .models import Tweet
+
+    fixed = 0
+    last_pk = 0
+    while True:
+        rows = list(
+            Tweet.objects.filter(pk__gt=last_pk).order_by('pk')
+            .values_list('pk', 'like_count', 'created_at', 'score')[:batch_size]
+        )
+        if not rows:
+            return fixed
+        last_pk = rows[-1][0]
+        fixed += fix_scores(rows, batch_size)
+
+
+def rescore_ids(pks, batch_size=1000):
+    """rescore() for just these tweets, e.g. after their like_count changed in bulk."""
+    from .models import Tweet
+
+    rows = Tweet.objects.filter(pk__in=pks).values_list('pk', 'like_count', 'created_at', 'score')
+    return fix_scores(list(rows), batch_size)
+
+
+def fix_scores(rows, batch_size):
+    """Writes the scores of (pk, like_count, created_at, score) rows that are off."""
+    from .models import Tweet
+
+    stale = [
+        Tweet(pk=pk, score=new_score)
+        for pk, like_count, created_at, score in rows
+        if (new_score := hot_score(like_count, created_at)) != score
+    ]
+    Tweet.objects.bulk_update(stale, ['score'], batch_size=batch_size)
+    return len(stale)
@@ -0,0 +1,257 @@
+"""
+Token-bucket rate limiting for the endpoints a single client can abuse.
+
+A rate like '10/m' is a bucket of 10 tokens refilled at 10 per minute: bursts
+up to 10 pass, after that one request per 6 seconds. Rates: 'N/s', 'N/m',
+'N/h', 'N/d', or with a count of units, '3/10m'.
+
+Three ways to apply a limit, all answering 429 with Retry-After:
+
+  - RATE_LIMITS in settings, enforced by RateLimitMiddleware by URL name:
+        RATE_LIMITS = {'tweet_like': ('60/m', 'user'), '*': ('600/m', 'ip')}
+    ('*' applies to every request on top of any per-view limit)
+  - the @ratelimit(name, rate, key) decorator, sync or async views
+  - check(request, name, rate, key) inside a view, for limits on one branch
+    (returns the seconds to wait, or 0)
+
+Keys: 'ip', 'user' (falls back to the ip when logged out), or a function of
+the request. Buckets live in RATELIMIT_STORE (dotted path to a zero-argument
+factory): LocalStore (default) is per process, shared_store() keeps them in
+the 'shared' cache so all workers count together. Limits that guard
+something worth attacking (passwords, emails we pay for) pass shared=True
+and always use RATELIMIT_SHARED_STORE (shared_store() by default): with N
+workers a per-process bucket lets N times the rate through.
+
+Settings:
+  RATELIMIT_ENABLED      False turns every limit off (benchmarks)
+  RATELIMIT_PROXY_COUNT  reverse proxies in front of the app; the client ip
+                         is then read from X-Forwarded-For
+"""
+import functools
+import math
+import re
+import threading
+import time
+from collections import namedtuple
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.urls import Resolver404, resolve
+from django.utils.module_loading import import_string
+
+Rate = namedtuple('Rate', ['count', 'seconds'])
+
+RATE_RE = re.compile(r'(\d+)/(\d*)([smhd])')
+UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_rate(rate):
+    match = RATE_RE.fullmatch(rate.strip())
+    if not match:
+        raise ValueError(f'Bad rate {rate!r}, expected e.g. "10/m" or "3/10m"')
+    count, multiplier, unit = match.groups()
+    return Rate(int(count), int(multiplier or 1) * UNITS[unit])
+
+
+def refill(state, rate, now):
+    """Returns (tokens, wait) after taking one token from a (tokens, stamp) bucket."""
+    tokens, stamp = state if state else (rate.count, now)
+    tokens = min(rate.count, tokens + (now - stamp) * rate.count / rate.seconds)
+    if tokens >= 1:
+        return tokens - 1, 0
+    return tokens, (1 - tokens) * rate.seconds / rate.count
+
+
+class LocalStore:
+    """Buckets in a dict; buckets that have refilled completely are swept out."""
+
+    SWEEP_SECONDS = 60
+
+    def __init__(self):
+        self.buckets = {}
+        self.lock = threading.Lock()
+        self.next_sweep = 0
+
+    def consume(self, key, rate, now=None):
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            state = self.buckets.get(key)
+            tokens, wait = refill(state[:2] if state else None, rate, now)
+            # Past this point the bucket is full again, same as no bucket
+            full_at = now + (rate.count - tokens) * rate.seconds / rate.count
+            self.buckets[key] = (tokens, now, full_at)
+            if now >= self.next_sweep:
+                self.buckets = {k: v for k, v in self.buckets.items() if v[2] > now}
+                self.next_sweep = now + self.SWEEP_SECONDS
+        return wait
+
+    async def aconsume(self, key, rate):
+        return self.consume(key, rate)
+
+
+class CacheStore:
+    """
+    Buckets in a Django cache, shared by every process using it. The
+    read-modify-write isn't atomic, so a burst racing across workers can
+    get a request or two past the limit; fine for an abuse throttle.
+    """
+
+    def __init__(self, alias='default'):
+        self.alias = alias
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def key(self, key):
+        return f'ratelimit:{key}'
+
+    def consume(self, key, rate, now=None):
+        now = time.time() if now is None else now
+        tokens, wait = refill(self.cache.get(self.key(key)), rate, now)
+        self.cache.set(self.key(key), (tokens, now), math.ceil(rate.seconds))
+        return wait
+
+    async def aconsume(self, key, rate):
+        now = time.time()
+        tokens, wait = refill(await self.cache.aget(self.key(key)), rate, now)
+        await self.cache.aset(self.key(key), (tokens, now), math.ceil(rate.seconds))
+        return wait
+
+
+def shared_store():
+    return CacheStore('shared')
+
+
+_store = None
+_shared_store = None
+
+
+def get_store(shared=False):
+    global _store, _shared_store
+    if shared:
+        if _shared_store is None:
+            path = getattr(settings, 'RATELIMIT_SHARED_STORE', 'tweet_app.ratelimit.shared_store')
+            _shared_store = import_string(path)()
+        return _shared_store
+    if _store is None:
+        path = getattr(settings, 'RATELIMIT_STORE', 'tweet_app.ratelimit.LocalStore')
+        _store = import_string(path)()
+    return _store
+
+
+def enabled():
+    return getattr(settings, 'RATELIMIT_ENABLED', True)
+
+
+def client_ip(request):
+    proxies = getattr(settings, 'RATELIMIT_PROXY_COUNT', 0)
+    if proxies:
+        forwarded = [ip.strip() for ip in request.META.get('HTTP_X_FORWARDED_FOR', '').split(',') if ip.strip()]
+        if len(forwarded) >= proxies:
+            return forwarded[-proxies]
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def client_key(request, key, user=None):
+    if callable(key):
+        return str(key(request))
+    if key == 'user' and user is not None and user.is_authenticated:
+        return f'user:{user.pk}'
+    if key in ('user', 'ip'):
+        return f'ip:{client_ip(request)}'
+    raise ValueError(f'Unknown rate limit key {key!r}')
+
+
+def check(request, name, rate, key='ip', shared=False):
+    """Takes a token for this client; returns 0, or the seconds until it may retry."""
+    if not enabled():
+        return 0
+    user = getattr(request, 'user', None) if key == 'user' else None
+    return get_store(shared).consume(f'{name}:{client_key(request, key, user)}', parse_rate(rate))
+
+
+async def acheck(request, name, rate, key='ip', shared=False):
+    if not enabled():
+        return 0
+    user = await request.auser() if key == 'user' else None
+    return await get_store(shared).aconsume(f'{name}:{client_key(request, key, user)}', parse_rate(rate))
+
+
+def too_many_requests(wait):
+    retry_after = max(1, math.ceil(wait))
+    response = HttpResponse(
+        f'Too many requests, try again in {retry_after} seconds.', status=429, content_type='text/plain'
+    )
+    response['Retry-After'] = str(retry_after)
+    return response
+
+
+def ratelimit(name, rate, key='ip', methods=None, shared=False):
+    """Limits a view; with methods=('POST',) GETs are not counted."""
+    def decorator(view):
+        def applies(request):
+            return methods is None or request.method in methods
+
+        if iscoroutinefunction(view):
+            @functools.wraps(view)
+            async def wrapper(request, *args, **kwargs):
+                if applies(request):
+                    wait = await acheck(request, name, rate, key, shared)
+                    if wait:
+                        return too_many_requests(wait)
+                return await view(request, *args, **kwargs)
+        else:
+            @functools.wraps(view)
+            def wrapper(request, *args, **kwargs):
+                if applies(request):
+                    wait = check(request, name, rate, key, shared)
+                    if wait:
+                        return too_many_requests(wait)
+                return view(request, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class RateLimitMiddleware:
+    """Applies settings.RATE_LIMITS; goes after AuthenticationMiddleware."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def limits(self, request):
+        rules = getattr(settings, 'RATE_LIMITS', {})
+        if not rules or not enabled():
+            return []
+        try:
+            url_name = resolve(request.path_info).url_name
+        except Resolver404:
+            url_name = None
+        return [
+            (name, *rules[name])
+            for name in ('*', url_name)
+            if name in rules
+        ]
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        for name, rate, key in self.limits(request):
+            wait = check(request, name, rate, key)
+            if wait:
+                return too_many_requests(wait)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        for name, rate, key in self.limits(request):
+            wait = await acheck(request, name, rate, key)
+            if wait:
+                return too_many_requests(wait)
+        return await self.get_response(request)
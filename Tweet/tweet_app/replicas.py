@@ -0,0 +1,161 @@
+"""
+Read replicas: reads go to a replica, writes to 'default' (the primary).
+
+Every alias in DATABASES other than 'default' is a replica (see
+Tweet/database.py, REPLICA_DATABASE_URLS). ReplicaRouter sends a read to a
+random healthy replica only while ReplicaMiddleware is handling a request;
+management commands, jobs and anything inside transaction.atomic() read
+from the primary.
+
+Read-your-writes: the first write in a request (the router sees every
+save/update/delete) pins the rest of that request to the primary, and the
+response sets a short-lived cookie that keeps the same browser on the
+primary for REPLICA_PIN_SECONDS, long enough for the redirect after
+tweet_create or the next page after a like to see the new rows even if the
+replica lags.
+
+Each replica is probed in the background every HEALTH_CHECK_SECONDS; one
+that fails (connection refused, missing tables) is skipped until a probe
+passes again, and with none left reads fall back to the primary.
+
+Locally, two SQLite files make a primary and a replica:
+
+    REPLICA_DATABASE_URLS=sqlite:///replica.sqlite3 python manage.py copy_to_replicas
+
+(SQLite doesn't replicate, copy_to_replicas snapshots the primary.)
+"""
+import contextvars
+import random
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DatabaseError, connections
+
+PRIMARY = 'default'
+PIN_COOKIE = 'db_pin'
+HEALTH_CHECK_SECONDS = 10
+
+
+class RequestState:
+    def __init__(self, pinned=False):
+        self.pinned = pinned
+        self.wrote = False
+
+
+# Set by ReplicaMiddleware; shared with sync_to_async threads of the request
+_request = contextvars.ContextVar('replica_request', default=None)
+
+_health = {}
+_probing = set()
+_health_lock = threading.Lock()
+
+
+def replica_aliases():
+    return [alias for alias in settings.DATABASES if alias != PRIMARY]
+
+
+def pin_seconds():
+    return getattr(settings, 'REPLICA_PIN_SECONDS', 5)
+
+
+def probe(alias):
+    """Runs the health query on a replica and records the result."""
+    try:
+        with connections[alias].cursor() as cursor:
+            cursor.execute('SELECT 1 FROM django_migrations LIMIT 1')
+        healthy = True
+    except DatabaseError:
+        healthy = False
+    finally:
+        connections[alias].close()
+    with _health_lock:
+        _health[alias] = (healthy, time.monotonic() + HEALTH_CHECK_SECONDS)
+        _probing.discard(alias)
+    return healthy
+
+
+def is_healthy(alias):
+    """
+    The last probe result. Probes run in a background thread (the router is
+    also called from async views, which can't block on a query), so a
+    replica is only used once its first probe has passed.
+    """
+    with _health_lock:
+        healthy, expires = _health.get(alias, (False, 0))
+        if expires <= time.monotonic() and alias not in _probing:
+            _probing.add(alias)
+            threading.Thread(target=probe, args=(alias,), daemon=True).start()
+    return healthy
+
+
+def pin():
+    """Sends the rest of this request's reads to the primary."""
+    state = _request.get()
+    if state is not None:
+        state.pinned = state.wrote = True
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _request.get()
+        if state is None or state.pinned or connections[PRIMARY].in_atomic_block:
+            return PRIMARY
+        healthy = [alias for alias in replica_aliases() if is_healthy(alias)]
+        return random.choice(healthy) if healthy else PRIMARY
+
+    def db_for_write(self, model, **hints):
+        pin()
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == PRIMARY
+
+
+class ReplicaMiddleware:
+    """Put it right after InstrumentationMiddleware, before SessionMiddleware."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def start(self, request):
+        recent_write = PIN_COOKIE in request.COOKIES
+        return _request.set(RequestState(pinned=recent_write))
+
+    def finish(self, token, response):
+        state = _request.get()
+        _request.reset(token)
+        # Only responses to requests that wrote get the cookie, plain reads stay cacheable
+        if state.wrote and replica_aliases() and not response.streaming:
+            response.set_cookie(PIN_COOKIE, '1', max_age=pin_seconds(), httponly=True, samesite='Lax')
+        return response
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = self.start(request)
+        try:
+            response = self.get_response(request)
+        except BaseException:
+            _request.reset(token)
+            raise
+        return self.finish(token, response)
+
+    async def __acall__(self, request):
+        token = self.start(request)
+        try:
+            response = await self.get_response(request)
+        except BaseException:
+            _request.reset(token)
+            raise
+        return self.finish(token, response)
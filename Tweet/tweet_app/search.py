@@ -0,0 +1,223 @@
+"""
+Tweet search backends.
+
+The backend is picked from the database in use:
+  - SQLite: an FTS5 virtual table (tweet_app_tweet_fts) kept in sync by the
+    Tweet post_save/post_delete signals in models.py
+  - PostgreSQL: a generated tsvector column with a GIN index
+  - anything else: the old icontains scan
+Set TWEET_SEARCH_BACKEND in settings to a dotted class path to override.
+
+All backends return ranked (score, id) pairs, lower score = better match, so
+search results can be keyset-paginated on (score, id) like the feeds.
+"""
+import re
+
+from django.conf import settings
+from django.db import connection, connections, router
+from django.utils.module_loading import import_string
+
+from .pagination import PAGE_SIZE, pack_cursor, unpack_cursor
+
+FTS_TABLE = 'tweet_app_tweet_fts'
+
+# #hashtags and @mentions are indexed as whole tokens in their own column
+TAG_RE = re.compile(r'[#@]\w+')
+WORD_RE = re.compile(r'\w+')
+
+
+def split_text(text):
+    """Returns (body, tags): the plain words and the '#tag @user' tokens of a tweet."""
+    tags = ' '.join(tag.lower() for tag in TAG_RE.findall(text))
+    body = text.replace('#', ' ').replace('@', ' ')
+    return body, tags
+
+
+def read_connection(using=None):
+    """The connection searches run on: `using`, or a replica when the router picks one."""
+    from .models import Tweet
+    return connections[using or router.db_for_read(Tweet)]
+
+
+class SearchBackend:
+    """Fallback backend: no index, a LIKE scan ordered by newest first."""
+
+    def index(self, tweet):
+        pass
+
+    def remove(self, tweet_id):
+        pass
+
+    def remove_many(self, tweet_ids):
+        for tweet_id in tweet_ids:
+            self.remove(tweet_id)
+
+    def rebuild(self, batch_size=1000):
+        return 0
+
+    def search(self, query, after=None, limit=PAGE_SIZE, using=None):
+        from .models import Tweet
+
+        tweets = Tweet.objects.using(using).filter(text__icontains=query)
+        if after:
+            tweets = tweets.filter(id__lt=after[1])
+        return [(0.0, pk) for pk in tweets.order_by('-id').values_list('id', flat=True)[:limit]]
+
+
+class SQLiteFTSBackend(SearchBackend):
+    """FTS5 table with rowid = tweet id, ranked by bm25."""
+
+    def index(self, tweet):
+        body, tags = split_text(tweet.text)
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [tweet.pk])
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE} (rowid, body, tags) VALUES (%s, %s, %s)",
+                [tweet.pk, body, tags],
+            )
+
+    def remove(self, tweet_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [tweet_id])
+
+    def remove_many(self, tweet_ids):
+        if tweet_ids:
+            placeholders = ', '.join(['%s'] * len(tweet_ids))
+            with connection.cursor() as cursor:
+                cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})", list(tweet_ids))
+
+    def rebuild(self, batch_size=1000):
+        from .models import Tweet
+
+        count = 0
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE}")
+            batch = []
+            for pk, text in Tweet.objects.values_list('id', 'text').iterator(chunk_size=batch_size):
+                batch.append((pk, *split_text(text)))
+                if len(batch) >= batch_size:
+                    count += self._insert_many(cursor, batch)
+                    batch = []
+            count += self._insert_many(cursor, batch)
+        return count
+
+    def _insert_many(self, cursor, rows):
+        if rows:
+            cursor.executemany(
+                f"INSERT INTO {FTS_TABLE} (rowid, body, tags) VALUES (%s, %s, %s)", rows
+            )
+        return len(rows)
+
+    def match_expression(self, query):
+        """
+        Builds an FTS5 query: every term must match, plain words as prefixes
+        ("pyth" finds "python"), #tags and @mentions as exact tokens.
+        """
+        terms = []
+        for term in query.split():
+            term = term.replace('"', '""')
+            if TAG_RE.fullmatch(term):
+                terms.append(f'tags : "{term.lower()}"')
+            elif WORD_RE.search(term):
+                terms.append(f'body : "{term}"*')
+        return ' '.join(terms)
+
+    def search(self, query, after=None, limit=PAGE_SIZE, using=None):
+        match = self.match_expression(query)
+        if not match:
+            return []
+        sql = (
+            f"SELECT score, id FROM ("
+            f" SELECT bm25({FTS_TABLE}) AS score, rowid AS id FROM {FTS_TABLE}"
+            f" WHERE {FTS_TABLE} MATCH %s)"
+        )
+        params = [match]
+        if after:
+            sql += " WHERE score > %s OR (score = %s AND id < %s)"
+            params += [after[0], after[0], after[1]]
+        sql += " ORDER BY score, id DESC LIMIT %s"
+        with read_connection(using).cursor() as cursor:
+            cursor.execute(sql, params + [limit])
+            return cursor.fetchall()
+
+
+class PostgresSearchBackend(SearchBackend):
+    """
+    Uses the generated tweet_app_tweet.search_vector column (GIN indexed), so
+    Postgres keeps the index in sync by itself and index/remove are no-ops.
+    """
+
+    def rebuild(self, batch_size=1000):
+        with connection.cursor() as cursor:
+            cursor.execute("REINDEX INDEX tweet_search_vector_idx")
+            cursor.execute("SELECT COUNT(*) FROM tweet_app_tweet")
+            return cursor.fetchone()[0]
+
+    def search(self, query, after=None, limit=PAGE_SIZE, using=None):
+        words = WORD_RE.findall(query)
+        if not words:
+            return []
+        tsquery = ' & '.join(f'{word}:*' for word in words)
+        sql = (
+            "SELECT score, id FROM ("
+            " SELECT -ts_rank(search_vector, q) AS score, id"
+            " FROM tweet_app_tweet, to_tsquery('simple', %s) q"
+            " WHERE search_vector @@ q) ranked"
+        )
+        params = [tsquery]
+        if after:
+            sql += " WHERE score > %s OR (score = %s AND id < %s)"
+            params += [after[0], after[0], after[1]]
+        sql += " ORDER BY score, id DESC LIMIT %s"
+        with read_connection(using).cursor() as cursor:
+            cursor.execute(sql, params + [limit])
+            return cursor.fetchall()
+
+
+_backend = None
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        path = getattr(settings, 'TWEET_SEARCH_BACKEND', None)
+        if path:
+            _backend = import_string(path)()
+        elif connection.vendor == 'postgresql':
+            _backend = PostgresSearchBackend()
+        elif connection.vendor == 'sqlite' and FTS_TABLE in connection.introspection.table_names():
+            _backend = SQLiteFTSBackend()
+        else:
+            _backend = SearchBackend()
+    return _backend
+
+
+def search_hits(query, cursor=None, page_size=PAGE_SIZE, using=None):
+    """
+    Returns (ids, next_cursor) for one page of ranked results, best first.
+    The cursor carries the (score, id) of the last result on the page.
+    `using` names the database to read, by default the router picks.
+    """
+    after = None
+    position = unpack_cursor(cursor)
+    if position:
+        try:
+            after = (float(position[0]), int(position[1]))
+        except (IndexError, ValueError):
+            after = None
+
+    hits = get_backend().search(query, after=after, limit=page_size + 1, using=using)
+    next_cursor = None
+    if len(hits) > page_size:
+        hits = hits[:page_size]
+        next_cursor = pack_cursor(repr(hits[-1][0]), hits[-1][1])
+    return [pk for _, pk in hits], next_cursor
+
+
+def search_tweets(query, cursor=None, page_size=PAGE_SIZE):
+    """Returns (tweets, next_cursor) for one page of ranked results."""
+    from .models import Tweet
+
+    ids, next_cursor = search_hits(query, cursor, page_size)
+    by_id = Tweet.objects.select_related('user').in_bulk(ids)
+    return [by_id[pk] for pk in ids if pk in by_id], next_cursor
@@ -0,0 +1,66 @@
+"""
+Static files for the ASGI app, served in front of Django.
+
+WhiteNoiseMiddleware is sync-only: in the async middleware chain Django
+adapts it, so every request (not just static ones) would hop to a thread
+and back before reaching the async views. StaticFilesApp wraps the ASGI
+application instead (Tweet/asgi.py). It reuses WhiteNoise's Django
+configuration and file index (hashed names, immutable caching, .gz/.br
+variants, 304s, ranges), answers STATIC_URL requests itself and hands
+everything else to Django untouched. File reads go through a thread in
+CHUNK_SIZE pieces, so a large file never blocks the event loop.
+
+runserver (WSGI) keeps using Django's own static handler in development.
+"""
+import asyncio
+
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+CHUNK_SIZE = 64 * 1024
+
+
+def wsgi_headers(scope):
+    """The request headers the way WhiteNoise reads them (HTTP_IF_NONE_MATCH...)."""
+    return {
+        'HTTP_' + name.decode('latin-1').upper().replace('-', '_'): value.decode('latin-1')
+        for name, value in scope['headers']
+    }
+
+
+class StaticFilesApp:
+    def __init__(self, application):
+        self.application = application
+        # Only for its settings-derived configuration and file index
+        self.whitenoise = WhiteNoiseMiddleware()
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http' and scope['path'].startswith(self.whitenoise.static_prefix):
+            static_file = await self.find(scope['path'])
+            if static_file is not None:
+                return await self.serve(static_file, scope, send)
+        return await self.application(scope, receive, send)
+
+    async def find(self, path):
+        if self.whitenoise.autorefresh:
+            # Looks at the disk on every request (development only)
+            return await asyncio.to_thread(self.whitenoise.find_file, path)
+        return self.whitenoise.files.get(path)
+
+    async def serve(self, static_file, scope, send):
+        response = await asyncio.to_thread(static_file.get_response, scope['method'], wsgi_headers(scope))
+        headers = [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in response.headers]
+        await send({'type': 'http.response.start', 'status': int(response.status), 'headers': headers})
+        if response.file is None:
+            return await send({'type': 'http.response.body', 'body': b''})
+        # Range responses come seeked to the start, Content-Length says where to stop
+        remaining = int(dict(response.headers)['Content-Length'])
+        try:
+            while remaining > 0:
+                chunk = await asyncio.to_thread(response.file.read, min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            response.file.close()
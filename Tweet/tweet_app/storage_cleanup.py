@@ -0,0 +1,54 @@
+"""
+Deferred, batched deletion of media files nobody references any more.
+
+Requests only record the names (discard_files: one INSERT, no storage call).
+The purge_orphan_files job, queued at most once at a time, then removes them
+in batches: on S3 one DeleteObjects call per 1000 keys, on the local
+filesystem storage.delete() per file.
+"""
+from django.core.files.storage import default_storage
+
+from . import jobs
+
+S3_BATCH_LIMIT = 1000
+
+# Give a burst of deletes a moment to pile up into one batch
+PURGE_DELAY_SECONDS = 30
+
+
+def discard_files(names):
+    from .models import OrphanFile
+
+    names = [name for name in names if name]
+    if not names:
+        return
+    OrphanFile.objects.bulk_create([OrphanFile(name=name) for name in names])
+    jobs.enqueue_once('purge_orphan_files', delay=PURGE_DELAY_SECONDS)
+
+
+def batch_delete(names, storage=None):
+    """Deletes many files with as few storage calls as the backend allows."""
+    storage = storage or default_storage
+    bucket = getattr(storage, 'bucket', None)
+    if bucket is None:
+        for name in names:
+            storage.delete(name)
+        return
+    # django-storages S3Boto3Storage: keys include its location prefix
+    for start in range(0, len(names), S3_BATCH_LIMIT):
+        keys = [{'Key': storage._normalize_name(name)} for name in names[start:start + S3_BATCH_LIMIT]]
+        bucket.delete_objects(Delete={'Objects': keys, 'Quiet': True})
+
+
+def purge_orphan_files(batch_size=S3_BATCH_LIMIT, storage=None):
+    """Deletes every recorded orphan; returns how many files were removed."""
+    from .models import OrphanFile
+
+    purged = 0
+    while True:
+        batch = list(OrphanFile.objects.order_by('pk').values_list('pk', 'name')[:batch_size])
+        if not batch:
+            return purged
+        batch_delete(sorted({name for _, name in batch}), storage)
+        OrphanFile.objects.filter(pk__in=[pk for pk, _ in batch]).delete()
+        purged += len(batch)
@@ -0,0 +1,53 @@
+"""Jobs run by `manage.py run_worker` (see jobs.py)."""
+import logging
+import time
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.auth.models import User
+
+from . import deletion, ranking, storage_cleanup, trending, utils
+from .jobs import job
+from .likes import reconcile_like_counts as reconcile
+
+logger = logging.getLogger(__name__)
+
+
+@job()
+def send_otp_email(session_key, otp_time):
+    """
+    Emails the code waiting in a registration session. The job row only
+    names the session, so the code never sits in Job or DeadJob. Nothing is
+    sent once the code has expired or a newer one replaced it.
+    """
+    session = import_module(settings.SESSION_ENGINE).SessionStore(session_key)
+    if session.get('otp_time') != otp_time or time.time() - otp_time > utils.OTP_TTL:
+        return
+    utils.send_otp_email(session['reg_email'], session['otp'])
+
+
+@job()
+def purge_orphan_files():
+    """Batch-deletes the files recorded by storage_cleanup.discard_files."""
+    storage_cleanup.purge_orphan_files()
+
+
+@job(max_attempts=3)
+def reconcile_like_counts(batch_size=1000):
+    reconcile(batch_size=batch_size)
+
+
+@job(max_attempts=3)
+def rescore_tweets(batch_size=1000):
+    ranking.rescore(batch_size=batch_size)
+
+
+@job(max_attempts=3)
+def compact_trends():
+    trending.compact()
+
+
+@job(max_attempts=3)
+def delete_users(user_ids, batch_size=500):
+    """Deletes accounts too heavy to delete within a request (deletion.py); safe to retry."""
+    deletion.delete_users(User.objects.filter(pk__in=user_ids), batch_size=batch_size, log=logger.info)
@@ -0,0 +1,31 @@
+from django import template
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+from tweet_app import assets
+
+register = template.Library()
+
+_built = None
+
+
+@register.inclusion_tag('assets_bundle.html')
+def asset_tags():
+    """
+    {% asset_tags %}
+    The self-hosted bundle (assets.py). The CDN links stand in for a missing
+    bundle only with ASSETS_CDN_FALLBACK (development and tests).
+    """
+    global _built
+    # Checked once per process, except in development where it may appear later
+    if _built is None or settings.DEBUG:
+        _built = assets.bundle_built()
+    if not _built:
+        if not assets.cdn_fallback():
+            raise ImproperlyConfigured('The asset bundle is missing, run build_assets and collectstatic')
+        return {'cdn': True}
+    return {
+        'bundle_css': assets.BUNDLE_CSS,
+        'bundle_js': assets.BUNDLE_JS,
+        'bundle_font': assets.BUNDLE_FONT,
+    }
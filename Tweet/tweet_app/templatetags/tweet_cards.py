@@ -0,0 +1,23 @@
+from django import template
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from tweet_app.fragment_cache import VIEWER_MARKER, render_card
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def tweet_card(context, tweet, template_name):
+    """
+    {% tweet_card tweet "tweet_card_feed.html" %}
+    Cached card HTML with this viewer's like button layered on top.
+    """
+    card = render_card(tweet, template_name)
+    like_area = render_to_string('tweet_like_area.html', {
+        'tweet': tweet,
+        'user': context.get('user'),
+        'liked_ids': context.get('liked_ids', ()),
+        'csrf_token': context.get('csrf_token'),
+    })
+    return mark_safe(card.replace(VIEWER_MARKER, like_area))
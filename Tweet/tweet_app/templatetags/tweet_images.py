@@ -0,0 +1,35 @@
+from django import template
+from django.utils.html import format_html, format_html_join
+
+register = template.Library()
+
+
+@register.simple_tag
+def responsive_img(field, renditions, sizes='100vw', **attrs):
+    """
+    {% responsive_img tweet.photo tweet.photo_renditions "400px" class="card-img-top" %}
+    A <picture> with WebP and JPEG srcsets built from images.py renditions,
+    or a plain <img> of the original while those don't exist yet.
+    """
+    attrs.setdefault('loading', 'lazy')
+    attrs.setdefault('decoding', 'async')
+    if not renditions:
+        attr_html = format_html_join(' ', '{}="{}"', attrs.items())
+        return format_html('<img src="{}" {}>', field.url, attr_html)
+
+    storage = field.storage
+    entries = sorted(renditions.values(), key=lambda entry: entry['w'])
+
+    def srcset(ext):
+        return ', '.join(f"{storage.url(entry[ext])} {entry['w']}w" for entry in entries)
+
+    smallest = entries[0]
+    attrs.setdefault('width', smallest['w'])
+    attrs.setdefault('height', smallest['h'])
+    attr_html = format_html_join(' ', '{}="{}"', attrs.items())
+    return format_html(
+        '<picture><source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}" {}></picture>',
+        srcset('webp'), sizes,
+        storage.url(smallest['jpeg']), srcset('jpeg'), sizes, attr_html,
+    )
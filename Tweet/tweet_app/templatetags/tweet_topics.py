@@ -0,0 +1,10 @@
+from django import template
+
+from tweet_app.topics import linkify_tweet
+
+register = template.Library()
+
+# {{ tweet|linkify_topics }}: the text with #tags, and @mentions of existing
+# users, as links. Views load the mentions of the page first
+# (topics.aload_mentions), async views can't query while rendering.
+register.filter('linkify_topics', linkify_tweet)
@@ -1,3 +1,1289 @@
-from django.test import TestCase
+import asyncio
+import importlib
+import inspect
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+from datetime import timedelta
+from io import BytesIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import iscoroutinefunction
+from django.apps import apps as django_apps
+from django.contrib.admin.models import CHANGE, DELETION, LogEntry
+from django.contrib.auth import authenticate
+from django.contrib.auth.models import AnonymousUser, User
+from django.db import IntegrityError, connection, transaction
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete
+from django.core import mail
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.base import ContentFile
+from django.core.handlers.asgi import ASGIHandler
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+
+from . import (
+    api, assets, deletion, events, fragment_cache, images, jobs, ranking, ratelimit, replicas, storage_cleanup,
+    timeline, topics, transfer, trending, utils, views,
+)
+from .backends import EmailBackend
+from .forms import UserUpdateForm
+from .instrumentation import QueryBudget, fingerprint
+from .likes import liked_tweet_ids, reconcile_like_counts, set_like
+from .models import DeadJob, Follow, Hashtag, Job, Mention, OrphanFile, Profile, TimelineEntry, TrendCounter, Tweet, TweetTag
+from .pagination import decode_cursor, encode_cursor, paginate_tweets
+from .search import SQLiteFTSBackend, get_backend, search_tweets
+from .static_asgi import StaticFilesApp
+from .timeline import follow
+
+
+class QueryBudgetTests(TestCase):
+    """
+    Upper bounds on the queries the hot views run. A page of 20 tweets by
+    several authors, some liked, so a per-row query shows up as 20 repeats.
+    If you make a view cheaper, lower its budget.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [User.objects.create_user(f'user{i}', password='pass') for i in range(4)]
+        for i in range(25):
+            tweet = Tweet.objects.create(user=cls.users[i % 4], text=f'hello #tag{i % 5} world {i}')
+            if i % 3 == 0:
+                set_like(tweet.pk, cls.users[0])
+                set_like(tweet.pk, cls.users[1])
+        follow(cls.users[0], cls.users[1])
+        cls.tweet = Tweet.objects.order_by('-id').first()
+
+    def setUp(self):
+        # Measure the uncached path
+        fragment_cache.local_cache.clear()
+        self.client.force_login(self.users[0])
+
+    def get_within(self, budget, url, **headers):
+        with QueryBudget(budget) as queries:
+            response = self.client.get(url, headers=headers)
+        self.assertEqual(response.status_code, 200)
+        queries.assert_no_duplicates()
+        return response
+
+    def test_tweet_list(self):
+        self.get_within(3, '/tweet_home/')
+
+    def test_tweet_list_next_page(self):
+        response = self.client.get('/tweet_home/')
+        cursor = response.context['next_url'].split('cursor=')[1]
+        self.get_within(2, f'/tweet_home/?cursor={cursor}', HX_Request='true')
+
+    def test_tweet_list_logged_out(self):
+        self.client.logout()
+        self.get_within(1, '/tweet_home/')
+
+    def test_top_feed(self):
+        response = self.get_within(3, '/tweet_home/?sort=top')
+        cursor = response.context['next_url'].split('cursor=')[1]
+        self.get_within(2, f'/tweet_home/?sort=top&cursor={cursor}', HX_Request='true')
+
+    def test_home_timeline(self):
+        self.get_within(6, '/home/')
+
+    def test_tweet_detail(self):
+        self.get_within(3, f'/{self.tweet.pk}/')
+
+    def test_profile(self):
+        self.get_within(5, f'/profile/{self.users[1].username}/')
+
+    def test_search(self):
+        self.get_within(4, '/search/?search=hello')
+
+    def test_tag_page(self):
+        response = self.get_within(4, '/tag/TAG1/')
+        self.assertEqual(len(response.context['tweets']), 5)
+
+    def test_like(self):
+        self.client.force_login(self.users[3])
+        # Includes rewriting the "top" feed score
+        with QueryBudget(9) as queries:
+            response = self.client.post(f'/tweet_like/{self.tweet.pk}', {'action': 'like'}, HTTP_HX_REQUEST='true')
+        self.assertEqual(response.status_code, 200)
+        queries.assert_no_duplicates()
+
+    def test_conditional_get(self):
+        response = self.client.get('/tweet_home/')
+        etag = response['ETag']
+        self.assertNotIn('Last-Modified', response)
+        # Nothing changed: 304, from the same queries and no rendering
+        with QueryBudget(3):
+            response = self.client.get('/tweet_home/', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        # A like leaves updated_at alone but still changes the page
+        set_like(self.tweet.pk, self.users[3])
+        response = self.client.get('/tweet_home/', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        # A date alone never gets a 304
+        response = self.client.get('/tweet_home/', headers={'If-Modified-Since': 'Fri, 01 Jan 2100 00:00:00 GMT'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_missing_pages_are_404(self):
+        self.assertEqual(self.client.get('/999999/').status_code, 404)
+        self.assertEqual(self.client.get('/profile/nobody/').status_code, 404)
+
+    def test_budget_catches_per_row_queries(self):
+        with self.assertRaises(AssertionError):
+            with QueryBudget(30) as queries:
+                for tweet in Tweet.objects.all()[:5]:
+                    tweet.user.username
+            queries.assert_no_duplicates()
+
+        with self.assertRaises(AssertionError):
+            with QueryBudget(1):
+                list(Tweet.objects.all())
+                list(User.objects.all())
+
+
+class PaginationTests(TestCase):
+    def test_cursor_round_trip_with_tied_timestamps(self):
+        user = User.objects.create_user('alice')
+        tweets = Tweet.objects.bulk_create([Tweet(user=user, text=str(i)) for i in range(7)])
+        # One created_at for all: the id alone has to keep the pages apart
+        Tweet.objects.update(created_at=timezone.now())
+        seen, cursor = [], None
+        while True:
+            page, cursor = paginate_tweets(Tweet.objects.all(), cursor, page_size=3)
+            seen += page
+            if not cursor:
+                break
+        self.assertEqual(seen, sorted(tweets, key=lambda t: t.pk, reverse=True))
+
+        created_at, pk = decode_cursor(encode_cursor(seen[2].created_at, seen[2].pk))
+        self.assertEqual((created_at, pk), (seen[2].created_at, seen[2].pk))
+        # A garbled cursor starts from the top
+        self.assertIsNone(decode_cursor('not a cursor'))
+        self.assertEqual(paginate_tweets(Tweet.objects.all(), 'not a cursor', page_size=3)[0], seen[:3])
+
+
+class LikeTests(TestCase):
+    def setUp(self):
+        self.alice, self.bob = (User.objects.create_user(name) for name in ('alice', 'bob'))
+        self.tweets = [Tweet.objects.create(user=self.alice, text=str(i)) for i in range(3)]
+
+    def test_counter_and_liked_set(self):
+        for user in (self.alice, self.bob):
+            set_like(self.tweets[0].pk, user)
+        set_like(self.tweets[1].pk, self.bob)
+        self.assertEqual([t.like_count for t in Tweet.objects.order_by('pk')], [2, 1, 0])
+        with QueryBudget(1):
+            self.assertEqual(liked_tweet_ids(self.bob, self.tweets), {self.tweets[0].pk, self.tweets[1].pk})
+        with QueryBudget(0):
+            self.assertEqual(liked_tweet_ids(AnonymousUser(), self.tweets), set())
+
+        # A counter that drifted is put back from the likes themselves
+        Tweet.objects.filter(pk=self.tweets[1].pk).update(like_count=7)
+        self.assertEqual(reconcile_like_counts(batch_size=2), 1)
+        self.assertEqual(Tweet.objects.get(pk=self.tweets[1].pk).like_count, 1)
+
+
+    def test_like_and_unlike_are_idempotent(self):
+        tweet = self.tweets[0]
+        self.assertEqual(set_like(tweet.pk, self.bob, liked=True), (True, 1, True))
+        self.assertEqual(set_like(tweet.pk, self.bob, liked=True), (True, 1, False))
+        self.assertEqual(set_like(tweet.pk, self.bob, liked=False), (False, 0, True))
+        self.assertEqual(set_like(tweet.pk, self.bob, liked=False), (False, 0, False))
+        # No intent toggles
+        self.assertEqual(set_like(tweet.pk, self.bob), (True, 1, True))
+
+        self.client.force_login(self.alice)
+        for _ in range(3):
+            response = self.client.post(f'/tweet_like/{tweet.pk}', {'action': 'like'}, HTTP_HX_REQUEST='true')
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual(Tweet.objects.get(pk=tweet.pk).like_count, 2)
+        self.assertEqual(self.client.post('/tweet_like/999999', {'action': 'like'}).status_code, 404)
+        with self.assertRaises(Tweet.DoesNotExist):
+            set_like(999999, self.bob)
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('alice')
+
+    def texts(self, query):
+        return [tweet.text for tweet in search_tweets(query)[0]]
+
+    def test_matching_and_removal(self):
+        self.assertIsInstance(get_backend(), SQLiteFTSBackend)
+        tweet = Tweet.objects.create(user=self.user, text='Learning Python with #Django')
+        Tweet.objects.create(user=self.user, text='python snakes')
+        Tweet.objects.create(user=self.user, text='about django, not the tag')
+        self.assertEqual(sorted(self.texts('pyth')), ['Learning Python with #Django', 'python snakes'])
+        self.assertEqual(self.texts('#django'), ['Learning Python with #Django'])
+        self.assertEqual(self.texts('python learning'), ['Learning Python with #Django'])
+        self.assertEqual(self.texts('"'), [])
+
+        tweet.text = 'edited'
+        tweet.save()
+        self.assertEqual(self.texts('#django'), [])
+        self.assertEqual(self.texts('edited'), ['edited'])
+        tweet.delete()
+        self.assertEqual(self.texts('edited'), [])
+
+    def test_pages(self):
+        Tweet.objects.bulk_create([Tweet(user=self.user, text=f'needle {i}') for i in range(5)])
+        self.assertEqual(get_backend().rebuild(batch_size=2), 5)
+        first, cursor = search_tweets('needle', page_size=3)
+        rest, end = search_tweets('needle', cursor, page_size=3)
+        self.assertIsNone(end)
+        self.assertEqual(len({tweet.pk for tweet in first + rest}), 5)
+
+
+class TimelineTests(TestCase):
+    def setUp(self):
+        self.alice, self.bob, self.carol = (User.objects.create_user(name) for name in ('alice', 'bob', 'carol'))
+
+    def post(self, user, text):
+        tweet = Tweet.objects.create(user=user, text=text)
+        timeline.fan_out_tweet(tweet)
+        return tweet
+
+    def texts(self, user):
+        return [tweet.text for tweet in timeline.home_timeline(user)[0]]
+
+    def test_fan_out_on_follow_and_unfollow(self):
+        self.post(self.bob, 'before')
+        self.assertTrue(follow(self.alice, self.bob))
+        self.assertFalse(follow(self.alice, self.bob))
+        self.assertFalse(follow(self.alice, self.alice))
+        # Backfilled on follow, pushed on write
+        self.post(self.bob, 'after')
+        self.post(self.carol, 'not followed')
+        self.assertEqual(self.texts(self.alice), ['after', 'before'])
+        self.assertEqual(Profile.objects.get(user=self.bob).follower_count, 1)
+
+        self.assertTrue(timeline.unfollow(self.alice, self.bob))
+        self.assertFalse(timeline.unfollow(self.alice, self.bob))
+        self.post(self.alice, 'mine')
+        self.assertEqual(self.texts(self.alice), ['mine'])
+        self.assertEqual(Profile.objects.get(user=self.bob).follower_count, 0)
+
+    def test_big_accounts_are_merged_on_read(self):
+        follow(self.alice, self.bob)
+        Profile.objects.filter(user=self.bob).update(follower_count=timeline.FANOUT_LIMIT + 1)
+        self.bob.profile.refresh_from_db()
+        tweet = self.post(self.bob, 'famous')
+        self.assertFalse(TimelineEntry.objects.filter(tweet=tweet, user=self.alice).exists())
+        self.assertEqual(self.texts(self.alice), ['famous'])
+
+    def test_database_timelines_are_capped_on_write(self):
+        follow(self.alice, self.bob)
+        with mock.patch.object(timeline, 'TIMELINE_LENGTH', 3):
+            tweets = [self.post(self.bob, f'tweet {n}') for n in range(5)]
+            self.assertEqual(timeline.get_store().range(self.alice.id), [t.pk for t in tweets[:-4:-1]])
+            self.assertEqual(TimelineEntry.objects.filter(user=self.bob).count(), 3)
+            self.assertEqual(timeline.get_store().trim(3), 0)
+
+
+class FragmentCacheTests(TestCase):
+    def setUp(self):
+        fragment_cache.local_cache.clear()
+        self.addCleanup(fragment_cache.local_cache.clear)
+        self.user = User.objects.create_user('alice')
+        self.tweet = Tweet.objects.create(user=self.user, text='cached card')
+
+    def render(self):
+        tweet = Tweet.objects.select_related('user').get(pk=self.tweet.pk)
+        with mock.patch.object(fragment_cache, 'render_to_string', wraps=fragment_cache.render_to_string) as render:
+            html = fragment_cache.render_card(tweet, 'tweet_card_feed.html')
+        return html, render.call_count
+
+    def test_cards_are_rendered_once_per_version(self):
+        html, renders = self.render()
+        self.assertEqual(renders, 1)
+        self.assertIn('cached card', html)
+        self.assertIn(fragment_cache.VIEWER_MARKER, html)
+        self.assertEqual(self.render(), (html, 0))
+
+        # A like is a new version, an edit also drops the old entries
+        set_like(self.tweet.pk, self.user)
+        self.assertEqual(self.render()[1], 1)
+        self.tweet.refresh_from_db()
+        self.tweet.text = 'edited card'
+        self.tweet.save()
+        self.assertFalse(fragment_cache.local_cache.data)
+        html, renders = self.render()
+        self.assertEqual(renders, 1)
+        self.assertIn('edited card', html)
+
+    def test_renamed_mention_is_a_new_version(self):
+        bob = User.objects.create_user('bob')
+        self.tweet.text = 'hi @bob'
+        self.tweet.save()
+        html, renders = self.render()
+        self.assertIn('/profile/bob/', html)
+        self.assertEqual(self.render(), (html, 0))
+        # The tweet itself is unchanged, its @bob no longer names anyone
+        bob.username = 'robert'
+        bob.save()
+        html, renders = self.render()
+        self.assertEqual(renders, 1)
+        self.assertNotIn('/profile/bob/', html)
+        self.assertNotIn('/profile/robert/', html)
+
+    def test_viewer_part_is_not_cached(self):
+        set_like(self.tweet.pk, self.user)
+        bob = User.objects.create_user('bob')
+        pages = []
+        for viewer in (self.user, bob):
+            self.client.force_login(viewer)
+            pages.append(self.client.get(f'/{self.tweet.pk}/').content.decode())
+        self.assertIn('bi-heart-fill', pages[0])
+        self.assertNotIn('bi-heart-fill', pages[1])
+
+
+class CachePolicyTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('alice')
+        self.tweet = Tweet.objects.create(user=self.user, text='hello')
+
+    def test_policies(self):
+        response = self.client.get('/tweet_home/')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=60')
+        self.assertIn('Cookie', response['Vary'])
+        self.assertIn('no-store', self.client.get('/login/')['Cache-Control'])
+        self.assertEqual(self.client.get('/999999/')['Cache-Control'], 'no-store, no-cache, must-revalidate')
+
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get('/tweet_home/')['Cache-Control'], 'private, no-cache')
+        response = self.client.post(f'/tweet_like/{self.tweet.pk}', {'action': 'like'})
+        self.assertIn('no-store', response['Cache-Control'])
+
+    def test_304_on_a_matching_etag(self):
+        url = f'/{self.tweet.pk}/'
+        etag = self.client.get(url)['ETag']
+        response = self.client.get(url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        # Another viewer (their own likes, their own page) never shares an ETag
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(url, headers={'If-None-Match': etag}).status_code, 200)
+        etag = self.client.get(url)['ETag']
+        self.tweet.text = 'edited'
+        self.tweet.save()
+        self.assertEqual(self.client.get(url, headers={'If-None-Match': etag}).status_code, 200)
+
+    def test_shared_file_cache_is_private(self):
+        from django.conf import settings
+
+        shared = settings.CACHES['shared']
+        if 'LOCATION' not in shared or shared['BACKEND'].endswith('RedisCache'):
+            self.skipTest('shared cache is not file based')
+        # Its entries are unpickled on read: nobody else may write there
+        self.assertFalse(shared['LOCATION'].startswith(tempfile.gettempdir()))
+        self.assertEqual(os.stat(shared['LOCATION']).st_mode & 0o777, 0o700)
+
+
+class TopicTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user('alice')
+        self.bob = User.objects.create_user('bob.smith')
+
+    def test_extract(self):
+        text = 'Hi @bob.smith. #Django #django, mail me at a@b.com @ghost #c#d'
+        self.assertEqual(topics.extract_hashtags(text), ['django', 'c'])
+        self.assertEqual(topics.extract_mentions(text), ['bob.smith', 'ghost'])
+
+    def test_tweets_are_indexed_on_save(self):
+        tweet = Tweet.objects.create(user=self.alice, text='#one #two @bob.smith @ghost')
+        self.assertEqual(set(TweetTag.objects.filter(tweet=tweet).values_list('tag__name', flat=True)), {'one', 'two'})
+        self.assertEqual(list(Mention.objects.filter(tweet=tweet).values_list('user', flat=True)), [self.bob.pk])
+
+        tweet = Tweet.objects.get(pk=tweet.pk)
+        tweet.text = '#two only'
+        tweet.save()
+        self.assertEqual(list(tweet.tags.values_list('name', flat=True)), ['two'])
+        self.assertFalse(Mention.objects.filter(tweet=tweet).exists())
+
+    def test_pages_and_backfill(self):
+        tweets = Tweet.objects.bulk_create([
+            Tweet(user=self.alice, text=f'{i} #Bench @bob.smith') for i in range(25)
+        ])
+        self.assertEqual(self.client.get('/tag/bench/').context['tweets'], [])
+        self.assertEqual(topics.backfill(batch_size=10), 25)
+
+        response = self.client.get('/tag/bench/')
+        cursor = response.context['next_url'].split('cursor=')[1]
+        rest = self.client.get(f'/tag/bench/?cursor={cursor}').context['tweets']
+        newest_first = sorted(tweets, key=lambda t: (t.created_at, t.pk), reverse=True)
+        self.assertEqual(response.context['tweets'] + rest, newest_first)
+
+        response = self.client.get('/profile/bob.smith/mentions/')
+        self.assertEqual(len(response.context['tweets']), 20)
+        self.assertEqual(self.client.get('/profile/nobody/mentions/').status_code, 404)
+
+    def test_linkify(self):
+        self.assertEqual(
+            topics.linkify('<b> #Py @bob. @ghost', {'bob'}),
+            '&lt;b&gt; <a href="/tag/Py/">#Py</a> <a href="/profile/bob/">@bob</a>. @ghost',
+        )
+
+    def test_cards_link_only_existing_users(self):
+        tweet = Tweet.objects.create(user=self.alice, text='hi @bob.smith and @ghost #news')
+        for url in ('/tweet_home/', f'/{tweet.pk}/', '/profile/alice/'):
+            content = self.client.get(url).content.decode()
+            self.assertIn('<a href="/profile/bob.smith/">@bob.smith</a>', content)
+            self.assertIn('<a href="/tag/news/">#news</a>', content)
+            self.assertNotIn('/profile/ghost/', content)
+
+
+@override_settings(TRENDING_FLUSH_SECONDS=0)
+class TrendingTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('alice')
+        cache.delete(trending.SIDEBAR_KEY)
+
+    def test_tags_and_likes_are_counted(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            for text in ['#a', '#a #b', '#a']:
+                tweet = Tweet.objects.create(user=self.user, text=text)
+        with self.captureOnCommitCallbacks(execute=True):
+            set_like(tweet.pk, self.user)
+        a, b = Hashtag.objects.get(name='a'), Hashtag.objects.get(name='b')
+        self.assertEqual([key for _, key in trending.top('tag')], [a.pk, b.pk])
+        self.assertEqual([key for _, key in trending.top('like')], [tweet.pk])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            set_like(tweet.pk, self.user)
+        self.assertEqual(trending.top('like'), [])
+
+    def test_older_counts_weigh_less(self):
+        now = timezone.now()
+        TrendCounter.objects.create(kind='tag', key=1, resolution='h', bucket=now - timedelta(hours=6), count=5)
+        TrendCounter.objects.create(kind='tag', key=2, resolution='m', bucket=now, count=2)
+        TrendCounter.objects.create(kind='tag', key=3, resolution='h', bucket=now - timedelta(hours=30), count=99)
+        (score2, key2), (score1, key1) = trending.top('tag', now=now)
+        self.assertEqual((key2, key1), (2, 1))
+        self.assertAlmostEqual(score1, 5 / 8)
+
+    def test_compact(self):
+        now = timezone.now().replace(minute=30)
+        hour = now.replace(minute=0, second=0, microsecond=0) - timedelta(hours=3)
+        for minute in (1, 2, 59):
+            TrendCounter.objects.create(kind='like', key=7, resolution='m', bucket=hour + timedelta(minutes=minute), count=1)
+        TrendCounter.objects.create(kind='like', key=7, resolution='m', bucket=now, count=1)
+        TrendCounter.objects.create(kind='like', key=7, resolution='h', bucket=now - timedelta(days=2), count=1)
+
+        self.assertEqual(trending.compact(now), (1, 1))
+        self.assertEqual(
+            sorted(TrendCounter.objects.values_list('resolution', 'bucket', 'count')),
+            [('h', hour, 3), ('m', now, 1)],
+        )
+
+    def test_sidebar(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Tweet.objects.create(user=self.user, text='hello #django')
+        response = self.client.get('/trending/')
+        self.assertContains(response, '#django')
+        self.assertIn('max-age=60', response['Cache-Control'])
+
+
+class RankingTests(TestCase):
+    def setUp(self):
+        self.users = [User.objects.create_user(f'user{i}') for i in range(3)]
+
+    def test_likes_and_recency(self):
+        old, new = (Tweet.objects.create(user=self.users[0], text=text) for text in ('old', 'new'))
+        Tweet.objects.filter(pk=old.pk).update(created_at=old.created_at - timedelta(seconds=ranking.GRAVITY_SECONDS))
+        ranking.rescore()
+        self.assertEqual(list(ranking.page_query(Tweet.objects.all(), None)), [new, old])
+
+        # Ten times the likes make up for the age (log10 of 1 and 2 likes is tiny)
+        for user in self.users[:2]:
+            set_like(old.pk, user)
+        old.refresh_from_db()
+        self.assertEqual(old.score, ranking.hot_score(2, old.created_at))
+        self.assertEqual(list(ranking.page_query(Tweet.objects.all(), None)), [new, old])
+        Tweet.objects.filter(pk=old.pk).update(like_count=20)
+        self.assertEqual(ranking.rescore(), 1)
+        self.assertEqual(list(ranking.page_query(Tweet.objects.all(), None)), [old, new])
+
+    def test_pages_do_not_overlap(self):
+        Tweet.objects.bulk_create([Tweet(user=self.users[0], text=str(i), like_count=i % 4) for i in range(45)])
+        ranking.rescore()
+        seen, cursor = [], None
+        for _ in range(3):
+            response = self.client.get('/tweet_home/', {'sort': 'top', **({'cursor': cursor} if cursor else {})})
+            seen += response.context['tweets']
+            cursor = response.context['next_url'] and response.context['next_url'].split('cursor=')[1]
+        self.assertIsNone(cursor)
+        self.assertEqual(len(set(seen)), 45)
+        self.assertEqual(seen, sorted(seen, key=lambda t: (t.score, t.pk), reverse=True))
+
+
+class ApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('alice')
+        cls.other = User.objects.create_user('bob')
+        Tweet.objects.bulk_create([
+            Tweet(user=cls.user if i % 2 else cls.other, text=f'post {i} #api') for i in range(7)
+        ])
+
+    async def get(self, url, params=None, **headers):
+        response = await self.async_client.get(url, params or {}, headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b''.join([chunk async for chunk in response.streaming_content]).decode()
+
+    async def test_pages_with_selected_fields(self):
+        seen, cursor = [], None
+        while True:
+            page = json.loads(await self.get('/api/tweets/', {
+                'fields': 'id,text', 'limit': 3, **({'cursor': cursor} if cursor else {}),
+            }))
+            self.assertTrue(all(set(row) == {'id', 'text'} for row in page['results']))
+            seen += [row['id'] for row in page['results']]
+            cursor = page['next']
+            if not cursor:
+                break
+        expected = [pk async for pk in Tweet.objects.order_by('-created_at', '-id').values_list('id', flat=True)]
+        self.assertEqual(seen, expected)
+
+    async def test_ndjson_user_tweets(self):
+        body = await self.get('/api/users/alice/tweets/', {'limit': 2}, accept='application/x-ndjson')
+        lines = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual([row['username'] for row in lines[:2]], ['alice', 'alice'])
+        self.assertEqual(set(lines[2]), {'next'})
+        body = await self.get('/api/users/alice/tweets/', {'format': 'ndjson', 'cursor': lines[2]['next']})
+        self.assertEqual(len(body.splitlines()), 1)
+
+    async def test_search_and_errors(self):
+        # bulk_create skips the search index signal
+        await Tweet.objects.acreate(user=self.user, text='needle in the api')
+        results = json.loads(await self.get('/api/search/', {'q': 'needle', 'fields': 'text'}))['results']
+        self.assertEqual(results, [{'text': 'needle in the api'}])
+        for url in ('/api/tweets/?fields=password', '/api/tweets/?limit=5000', '/api/search/'):
+            response = await self.async_client.get(url)
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('error', json.loads(response.content))
+        self.assertEqual((await self.async_client.get('/api/users/nobody/tweets/')).status_code, 404)
+
+    async def test_pages_are_written_in_pieces(self):
+        with mock.patch.object(api, 'FLUSH_BYTES', 100):
+            response = await self.async_client.get('/api/tweets/', {'sort': 'top'})
+            chunks = [chunk async for chunk in response.streaming_content]
+        self.assertGreater(len(chunks), 2)
+        self.assertIn('Accept', response['Vary'])
+        page = json.loads(b''.join(chunks))
+        self.assertEqual(len(page['results']), 7)
+        self.assertIsNone(page['next'])
+        self.assertTrue(all(list(row) == list(api.DEFAULT_FIELDS) for row in page['results']))
+
+    async def test_rows_are_read_where_the_request_was_routed(self):
+        # The body is streamed after ReplicaMiddleware is done: a read routed
+        # then would go to the 'outside' alias and fail
+        def db_for_read(model, **hints):
+            return 'default' if replicas._request.get() else 'outside'
+
+        await Tweet.objects.acreate(user=self.user, text='needle in the api')
+        with mock.patch.object(api.router, 'db_for_read', side_effect=db_for_read), \
+                self.assertLogs('tweet_app.requests', logging.INFO) as logs:
+            body = await self.get('/api/tweets/', {'limit': 3})
+            await self.get('/api/search/', {'q': 'needle'})
+        self.assertEqual(len(json.loads(body)['results']), 3)
+        # The log line is written when the stream closes, with its queries
+        lines = [json.loads(output.split(':', 2)[2]) for output in logs.output]
+        self.assertTrue(all(line['queries'] >= 1 for line in lines))
+
+
+class TransferTests(TestCase):
+    def test_round_trip(self):
+        alice, bob = (User.objects.create_user(name, f'{name}@example.com', 'pass') for name in ('alice', 'bob'))
+        follow(bob, alice)
+        tweet = Tweet.objects.create(user=alice, text='hello #export @bob')
+        Tweet.objects.filter(pk=tweet.pk).update(created_at=tweet.created_at - timedelta(days=3))
+        set_like(tweet.pk, bob)
+        Tweet.objects.create(user=bob, text='second')
+        columns = ('pk', 'user_id', 'text', 'created_at', 'like_count')
+        before = list(Tweet.objects.order_by('pk').values_list(*columns))
+        scores = list(Tweet.objects.order_by('pk').values_list('score', flat=True))
+
+        path = os.path.join(tempfile.mkdtemp(), 'export.ndjson.gz')
+        self.addCleanup(os.remove, path)
+        counts = transfer.export_data(path, batch_size=1)
+        self.assertEqual(counts, {'user': 2, 'profile': 2, 'follow': 1, 'tweet': 2, 'like': 1})
+        with self.assertRaises(ValueError):
+            transfer.import_data(path)
+
+        User.objects.all().delete()
+        self.assertEqual(transfer.import_data(path, batch_size=1), counts)
+        after = list(Tweet.objects.order_by('pk').values_list(*columns))
+        self.assertEqual(after, before)
+        # A new tweet is scored a few microseconds before auto_now_add stamps
+        # created_at, the rescore uses created_at itself
+        for score, rescored in zip(scores, Tweet.objects.order_by('pk').values_list('score', flat=True)):
+            self.assertAlmostEqual(score, rescored, places=5)
+        self.assertEqual(Profile.objects.get(user__username='alice').follower_count, 1)
+        self.assertTrue(User.objects.get(username='alice').check_password('pass'))
+        self.assertEqual(list(topics.tagged('export').values_list('tweet_id', flat=True)), [tweet.pk])
+        self.assertEqual(list(topics.mentioning(User.objects.get(username='bob')).values_list('tweet_id', flat=True)), [tweet.pk])
+        self.assertEqual(search_tweets('second')[0][0].text, 'second')
+
+
+class ImageTests(TestCase):
+    def test_exif_is_stripped_without_losing_the_original_first(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        exif = Image.Exif()
+        exif[0x010F] = 'Camera maker'
+        buffer = BytesIO()
+        Image.new('RGB', (600, 300)).save(buffer, 'JPEG', exif=exif)
+        with self.settings(MEDIA_ROOT=media):
+            tweet = Tweet.objects.create(user=User.objects.create_user('alice'), text='photo')
+            tweet.photo.save('cat.jpg', ContentFile(buffer.getvalue()))
+            uploaded = tweet.photo.name
+            images.process_image('tweet_app.Tweet', tweet.pk, 'photo', 'photo_renditions', images.TWEET_RENDITIONS)
+
+            tweet.refresh_from_db()
+            self.assertNotEqual(tweet.photo.name, uploaded)
+            with tweet.photo.open('rb') as clean:
+                self.assertFalse(Image.open(clean).getexif())
+            self.assertEqual(tweet.photo_renditions['thumb']['w'], 400)
+            # The upload is still there until the purge job runs
+            self.assertTrue(tweet.photo.storage.exists(uploaded))
+            self.assertEqual(list(OrphanFile.objects.values_list('name', flat=True)), [uploaded])
+
+
+    @staticmethod
+    def jpeg(width, height):
+        buffer = BytesIO()
+        Image.new('RGB', (width, height), 'red').save(buffer, 'JPEG')
+        return ContentFile(buffer.getvalue(), name='pic.jpg')
+
+    def test_renditions_are_built_after_the_request(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        user = User.objects.create_user('alice')
+        self.client.force_login(user)
+        with self.settings(MEDIA_ROOT=media, IMAGE_PROCESSING_ASYNC=False):
+            with self.captureOnCommitCallbacks() as callbacks:
+                self.client.post('/create/', {'text': 'photo', 'photo': self.jpeg(1600, 800)})
+            tweet = Tweet.objects.get(text='photo')
+            # Nothing is resized on the request path
+            self.assertEqual(tweet.photo_renditions, {})
+            self.assertIn(f'src="{tweet.photo.url}"', self.client.get(f'/{tweet.pk}/').content.decode())
+            for callback in callbacks:
+                callback()
+
+            tweet.refresh_from_db()
+            self.assertEqual(
+                {label: (entry['w'], entry['h']) for label, entry in tweet.photo_renditions.items()},
+                {'thumb': (400, 200), 'detail': (1200, 600)},
+            )
+            for name in images.rendition_files(tweet.photo_renditions):
+                self.assertTrue(tweet.photo.storage.exists(name))
+            content = self.client.get(f'/{tweet.pk}/').content.decode()
+            self.assertIn('type="image/webp"', content)
+            self.assertIn(tweet.photo_renditions['detail']['webp'], content)
+
+            profile = user.profile
+            profile.profile_pic.save('me.jpg', self.jpeg(500, 300))
+            images.process_image(
+                'tweet_app.Profile', profile.pk, 'profile_pic', 'pic_renditions', images.AVATAR_RENDITIONS, True,
+            )
+            profile.refresh_from_db()
+            self.assertEqual(profile.pic_renditions['avatar2x']['w'], profile.pic_renditions['avatar2x']['h'])
+
+
+class StorageCleanupTests(TestCase):
+    def test_replaced_and_deleted_photos_are_purged_in_batches(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        with self.settings(MEDIA_ROOT=media):
+            tweet = Tweet.objects.create(user=User.objects.create_user('alice'), text='photo')
+            tweet.photo.save('old.jpg', ContentFile(b'old'))
+            storage, old = tweet.photo.storage, tweet.photo.name
+
+            tweet = Tweet.objects.get(pk=tweet.pk)
+            tweet.photo.save('new.jpg', ContentFile(b'new'))
+            new = tweet.photo.name
+            self.assertEqual(list(OrphanFile.objects.values_list('name', flat=True)), [old])
+            # Saving without a new file discards nothing
+            tweet.text = 'edited'
+            tweet.save()
+            tweet.delete()
+            self.assertEqual(sorted(OrphanFile.objects.values_list('name', flat=True)), sorted([old, new]))
+            self.assertEqual(Job.objects.filter(name='purge_orphan_files').count(), 1)
+
+            self.assertTrue(storage.exists(old))
+            self.assertEqual(storage_cleanup.purge_orphan_files(batch_size=1), 2)
+            self.assertFalse(storage.exists(old) or storage.exists(new))
+            self.assertFalse(OrphanFile.objects.exists())
+
+    def test_replaced_profile_pics_are_purged_with_their_renditions(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        user = User.objects.create_user('alice', 'alice@example.com')
+        self.client.force_login(user)
+
+        def upload():
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post('/profile/edit/', {
+                    'username': 'alice', 'email': 'alice@example.com', 'bio': '',
+                    'profile_pic': ImageTests.jpeg(400, 400),
+                })
+            self.assertEqual(response.status_code, 302)
+            return Profile.objects.get(user=user)
+
+        with self.settings(MEDIA_ROOT=media, IMAGE_PROCESSING_ASYNC=False):
+            first = upload()
+            self.assertEqual(len(first.pic_renditions), 2)
+            # The shared default.jpg is left alone
+            self.assertFalse(OrphanFile.objects.exists())
+
+            second = upload()
+            self.assertNotEqual(second.profile_pic.name, first.profile_pic.name)
+            self.assertEqual(len(second.pic_renditions), 2)
+            self.assertEqual(
+                sorted(OrphanFile.objects.values_list('name', flat=True)),
+                sorted([first.profile_pic.name, *images.rendition_files(first.pic_renditions)]),
+            )
+
+    def test_s3_deletes_up_to_1000_keys_per_call(self):
+        storage = mock.Mock()
+        storage._normalize_name.side_effect = lambda name: f'media/{name}'
+        storage_cleanup.batch_delete([f'photos/{i}.jpg' for i in range(1500)], storage)
+        calls = storage.bucket.delete_objects.call_args_list
+        self.assertEqual([len(call.kwargs['Delete']['Objects']) for call in calls], [1000, 500])
+        self.assertEqual(calls[0].kwargs['Delete']['Objects'][0], {'Key': 'media/photos/0.jpg'})
+        storage.delete.assert_not_called()
+
+
+class DeletionTests(TestCase):
+    def setUp(self):
+        self.alice, self.bob = (User.objects.create_user(name) for name in ('alice', 'bob'))
+
+    def post(self, user, count, **fields):
+        return Tweet.objects.bulk_create([Tweet(user=user, text=f'post {i}', **fields) for i in range(count)])
+
+    def test_query_count_does_not_grow_with_tweets(self):
+        def queries_to_delete(count):
+            self.post(self.alice, count)
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(deletion.delete_tweets(Tweet.objects.filter(user=self.alice), batch_size=50), count)
+            return len(queries)
+
+        self.assertEqual(queries_to_delete(30), queries_to_delete(3))
+
+    def test_delete_user(self):
+        photos = self.post(self.alice, 3, photo='photos/a.jpg', photo_renditions={'small': {'webp': 'photos/a-small.webp'}})
+        mine = Tweet.objects.create(user=self.alice, text='findme')
+        theirs = Tweet.objects.create(user=self.bob, text='hi @alice')
+        set_like(theirs.pk, self.alice)
+        set_like(mine.pk, self.bob)
+        follow(self.alice, self.bob)
+        follow(self.bob, self.alice)
+
+        logged = []
+        counts = deletion.delete_users([self.alice], batch_size=2, log=logged.append)
+        self.assertEqual(counts, {'users': 1, 'tweets': 4, 'likes': 1})
+        self.assertEqual(logged, ['alice: 2 tweets deleted', 'alice: 4 tweets deleted', 'alice: account deleted'])
+
+        self.assertFalse(User.objects.filter(username='alice').exists())
+        self.assertEqual(list(Tweet.objects.all()), [theirs])
+        theirs.refresh_from_db()
+        self.assertEqual((theirs.like_count, theirs.score), (0, ranking.hot_score(0, theirs.created_at)))
+        self.assertEqual(Profile.objects.get(user=self.bob).follower_count, 0)
+        self.assertFalse(Follow.objects.exists() or Mention.objects.exists())
+        self.assertEqual(search_tweets('findme')[0], [])
+        # Queued for purge_orphan_files, nothing deleted from storage yet
+        self.assertEqual(
+            sorted(OrphanFile.objects.values_list('name', flat=True)),
+            sorted(['photos/a.jpg', 'photos/a-small.webp'] * len(photos)),
+        )
+
+
+    def test_admin_deletes_through_deletion(self):
+        admin_user = User.objects.create_superuser('admin', 'admin@example.com', 'pass')
+        self.client.force_login(admin_user)
+        tweet = Tweet.objects.create(user=self.bob, text='delete me')
+        for url, action in (('/admin/tweet_app/tweet/', 'delete_in_batches'), ('/admin/auth/user/', 'delete_in_background')):
+            response = self.client.get(url)
+            self.assertContains(response, f'value="{action}"')
+            self.assertNotContains(response, 'value="delete_selected"')
+
+        with mock.patch.object(deletion, 'delete_tweets', wraps=deletion.delete_tweets) as delete_tweets:
+            self.client.post(f'/admin/tweet_app/tweet/{tweet.pk}/delete/', {'post': 'yes'})
+        delete_tweets.assert_called_once()
+        self.assertFalse(Tweet.objects.filter(pk=tweet.pk).exists())
+
+        response = self.client.post(f'/admin/auth/user/{self.alice.pk}/delete/', {'post': 'yes'}, follow=True)
+        self.assertContains(response, 'Queued deletion of alice.')
+        # The worker deletes the account
+        self.assertTrue(User.objects.filter(pk=self.alice.pk).exists())
+        self.assertEqual(Job.objects.get(name='delete_users').args, [[self.alice.pk]])
+        entry = LogEntry.objects.get(content_type__model='user', object_id=str(self.alice.pk))
+        self.assertEqual((entry.action_flag, entry.get_change_message()), (CHANGE, 'Deletion scheduled.'))
+
+    def test_admin_actions_ask_first(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'pass'))
+        tweets = self.post(self.bob, 2)
+        for url, action, selected in (
+            ('/admin/tweet_app/tweet/', 'delete_in_batches', [tweet.pk for tweet in tweets]),
+            ('/admin/auth/user/', 'delete_in_background', [self.alice.pk]),
+        ):
+            data = {'action': action, '_selected_action': selected}
+            before = Tweet.objects.count(), Job.objects.count()
+            response = self.client.post(url, data)
+            self.assertContains(response, 'Are you sure')
+            self.assertContains(response, f'<input type="hidden" name="action" value="{action}">', html=True)
+            self.assertEqual((Tweet.objects.count(), Job.objects.count()), before)
+            self.assertEqual(self.client.post(url, {**data, 'post': 'yes'}).status_code, 302)
+
+        self.assertFalse(Tweet.objects.exists())
+        self.assertEqual(LogEntry.objects.filter(action_flag=DELETION).count(), 2)
+        self.assertEqual(Job.objects.get(name='delete_users').args, [[self.alice.pk]])
+        self.assertEqual(LogEntry.objects.get(content_type__model='user').action_flag, CHANGE)
+
+    def test_raw_delete_is_available(self):
+        # delete_tweets relies on this private QuerySet method: a bulk DELETE
+        # that returns the row count and sends no signals
+        self.assertEqual(list(inspect.signature(QuerySet._raw_delete).parameters), ['self', 'using'])
+        self.post(self.alice, 2)
+        received = []
+
+        def receiver(instance, **kwargs):
+            received.append(instance)
+
+        post_delete.connect(receiver, sender=Tweet)
+        self.addCleanup(post_delete.disconnect, receiver, sender=Tweet)
+        self.assertEqual(Tweet.objects.filter(user=self.alice)._raw_delete('default'), 2)
+        self.assertEqual(received, [])
+        self.assertFalse(Tweet.objects.exists())
+
+
+class AssetTests(TestCase):
+    ICONS_CSS = """
+    .bi::before,
+    [class^="bi-"]::before { font-family: bootstrap-icons !important; }
+    .bi-heart::before { content: "\\f417"; }
+    .bi-heart-fill::before { content: "\\f415"; }
+    .bi-alarm::before { content: "\\f102"; }
+    """
+
+    def test_icon_css_keeps_used_icons(self):
+        css, codepoints = assets.icon_css(self.ICONS_CSS, {'heart', 'heart-fill', 'not-an-icon'})
+        self.assertIn('.bi-heart::before{content:"\\f417"}', css)
+        self.assertNotIn('alarm', css)
+        self.assertEqual(codepoints, [0xf417, 0xf415])
+        self.assertIn('heart-fill', assets.used_icons())
+
+    def test_cdn_fallback_until_built(self):
+        response = self.client.get('/login/')
+        self.assertContains(response, 'https://cdn.jsdelivr.net/npm/bootstrap@5.3.8')
+        self.assertContains(response, 'js/live.js')
+        self.assertNotContains(response, 'fontawesome')
+
+    def test_no_cdn_fallback_in_production(self):
+        with override_settings(ASSETS_CDN_FALLBACK=False):
+            self.assertEqual([error.id for error in assets.check_bundle(None)], ['tweet_app.E001'])
+            with self.assertRaises(ImproperlyConfigured):
+                self.client.get('/login/')
+        self.assertEqual(assets.check_bundle(None), [])
+
+    def test_unpinned_files_are_refused(self):
+        with override_settings(BASE_DIR=tempfile.mkdtemp()):
+            os.makedirs(assets.vendor_dir())
+            assets.write_sums({'bootstrap.min.css': 'x'})
+            with mock.patch('urllib.request.urlopen') as urlopen, self.assertRaisesMessage(ValueError, 'htmx.min.js'):
+                assets.fetch(log=lambda message: None)
+            urlopen.assert_not_called()
+        # The hash layout.html pinned for Bootstrap's CDN link is kept
+        self.assertEqual(
+            assets.read_sums(assets.sums_path())['bootstrap.min.css'],
+            'sRIl4kxILFvY47J16cr9ZwB07vP4J8+LH7qKQnuqkuIAvNWLzeN8tE5YBujZqJLB',
+        )
+
+
+class ReplicaRouterTests(SimpleTestCase):
+    # SimpleTestCase: TestCase wraps each test in a transaction, which pins reads to the primary
+    def setUp(self):
+        patcher = mock.patch.object(replicas, 'replica_aliases', return_value=['replica_1'])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        replicas._health['replica_1'] = (True, time.monotonic() + 60)
+        self.addCleanup(replicas._health.clear)
+        self.router = replicas.ReplicaRouter()
+
+    def in_request(self, view, cookies=None):
+        request = RequestFactory().get('/')
+        request.COOKIES.update(cookies or {})
+        return replicas.ReplicaMiddleware(view)(request)
+
+    def test_reads_go_to_the_replica_until_the_request_writes(self):
+        seen = []
+
+        def view(request):
+            seen.append(self.router.db_for_read(Tweet))
+            self.router.db_for_write(Tweet)
+            seen.append(self.router.db_for_read(Tweet))
+            return HttpResponse()
+
+        response = self.in_request(view)
+        self.assertEqual(seen, ['replica_1', 'default'])
+        self.assertEqual(response.cookies[replicas.PIN_COOKIE]['max-age'], 5)
+
+    def test_pinned_browser_and_unhealthy_replica_read_primary(self):
+        def view(request):
+            return HttpResponse(self.router.db_for_read(Tweet))
+
+        self.assertEqual(self.in_request(view).content, b'replica_1')
+        self.assertEqual(self.in_request(view, {replicas.PIN_COOKIE: '1'}).content, b'default')
+        # Reads without a write don't renew the pin
+        self.assertNotIn(replicas.PIN_COOKIE, self.in_request(view, {replicas.PIN_COOKIE: '1'}).cookies)
+
+        replicas._health['replica_1'] = (False, time.monotonic() + 60)
+        self.assertEqual(self.in_request(view).content, b'default')
+
+    def test_outside_requests_use_primary(self):
+        self.assertEqual(self.router.db_for_read(Tweet), 'default')
+
+
+class AsgiTests(SimpleTestCase):
+    def test_no_middleware_is_adapted(self):
+        # Django logs "Synchronous/Asynchronous handler adapted for middleware ..."
+        with self.assertNoLogs('django.request', 'DEBUG'):
+            ASGIHandler()
+
+    @override_settings(WHITENOISE_USE_FINDERS=True, WHITENOISE_AUTOREFRESH=False)
+    async def test_static_files_are_served_in_front_of_django(self):
+        async def django(scope, receive, send):
+            raise AssertionError('static request reached Django')
+
+        app = StaticFilesApp(django)
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {'type': 'http', 'method': 'GET', 'path': '/static/js/live.js', 'headers': [(b'range', b'bytes=0-9')]}
+        await app(scope, None, send)
+        self.assertEqual(sent[0]['status'], 206)
+        self.assertEqual(b''.join(message['body'] for message in sent[1:]), b'// Live li')
+        self.assertFalse(sent[-1].get('more_body'))
+
+
+class AsyncViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('alice', password='pass')
+        cls.tweet = Tweet.objects.create(user=cls.user, text='async hello')
+
+    def test_views_are_async(self):
+        for view in (views.tweet_list, views.tweet_detail, views.profile, views.tweet_like, views.tweet_search):
+            self.assertTrue(iscoroutinefunction(view), view.__name__)
+
+    async def test_pages_and_likes_over_asgi(self):
+        await self.async_client.aforce_login(self.user)
+        for url in ('/tweet_home/', f'/{self.tweet.pk}/', '/profile/alice/', '/search/?search=async'):
+            response = await self.async_client.get(url)
+            self.assertContains(response, 'async hello')
+        response = await self.async_client.post(
+            f'/tweet_like/{self.tweet.pk}', {'action': 'like'}, headers={'HX-Request': 'true'},
+        )
+        self.assertContains(response, 'bi-heart-fill')
+        self.assertEqual((await Tweet.objects.aget(pk=self.tweet.pk)).like_count, 1)
+        self.assertEqual((await self.async_client.get('/999999/')).status_code, 404)
+
+
+class EventTests(SimpleTestCase):
+    def setUp(self):
+        patcher = mock.patch.object(events, '_broker', events.LocalBroker())
+        self.broker = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def test_stream_forwards_published_events(self):
+        response = await self.async_client.get('/events/')
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertEqual(response['Cache-Control'], 'no-cache')
+        stream = aiter(response.streaming_content)
+        self.assertEqual(await anext(stream), b'retry: 5000\n\n')
+
+        events.publish('tweet', {'id': 1, 'user': 'alice'})
+        self.assertEqual(await anext(stream), b'event: tweet\ndata: {"id": 1, "user": "alice"}\n\n')
+        with mock.patch.object(views, 'EVENTS_HEARTBEAT', 0.01):
+            self.assertEqual(await anext(stream), b': ping\n\n')
+        # When the client goes away the server cancels the stream
+        pending = asyncio.ensure_future(anext(stream))
+        await asyncio.sleep(0)
+        pending.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await pending
+        self.assertEqual(self.broker.subscriptions, set())
+
+    @override_settings(LIKE_COALESCE_SECONDS=60)
+    def test_like_counts_are_coalesced(self):
+        with mock.patch.object(events, 'publish') as publish, \
+                mock.patch.object(events, '_pending_likes', {}), mock.patch.object(events, '_flush_timer', None):
+            for count in (1, 2, 3):
+                events.like_count_changed(5, count)
+            events.like_count_changed(6, 1)
+            publish.assert_not_called()
+            events._flush_timer.cancel()
+            events.flush_like_counts()
+        publish.assert_called_once_with('likes', {'5': 3, '6': 1})
+
+    @override_settings(REDIS_URL='redis://cache:6379/1')
+    def test_redis_broker_factory(self):
+        redis = mock.Mock()
+        with mock.patch.dict('sys.modules', redis=redis):
+            broker = events.redis_broker()
+        redis.Redis.from_url.assert_called_once_with('redis://cache:6379/1')
+        self.assertIs(broker.client, redis.Redis.from_url.return_value)
+        broker.publish('tweet', {'id': 1})
+        broker.client.publish.assert_called_once_with('tweet_app:events', '["tweet", {"id": 1}]')
+
+
+class InstrumentationTests(TestCase):
+    def test_server_timing_and_log_line(self):
+        with self.assertLogs('tweet_app.requests', logging.INFO) as logs:
+            response = self.client.get('/tweet_home/')
+        self.assertRegex(response['Server-Timing'], r'^db;dur=[\d.]+;desc="\d+ queries", tpl;dur=[\d.]+, total;dur=[\d.]+$')
+        self.assertIn('"view": "tweet_list"', logs.output[0])
+
+    def test_fingerprint_ignores_values(self):
+        self.assertEqual(
+            fingerprint('SELECT * FROM t WHERE id IN (%s, %s) AND name = \'a\' LIMIT 21')[0],
+            fingerprint('SELECT * FROM t WHERE id IN (%s) AND name = \'bob\' LIMIT 5')[0],
+        )
+
+
+class EmailAuthTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('alice', 'Alice@Example.com', 'pass')
+
+    def test_login_by_email_any_case(self):
+        self.assertEqual(authenticate(email='alice@example.com', password='pass'), self.user)
+        self.assertIsNone(authenticate(email='alice@example.com', password='wrong'))
+        self.assertIsNone(authenticate(email='bob@example.com', password='pass'))
+
+    def test_login_view(self):
+        response = self.client.post('/login/', {'email': 'ALICE@example.com', 'password': 'pass'})
+        self.assertRedirects(response, '/tweet_home/')
+
+    def test_email_is_unique(self):
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            User.objects.create_user('alice2', 'alice@example.COM', 'pass')
+        # Blank emails don't count
+        User.objects.create_user('nomail1')
+        User.objects.create_user('nomail2')
+
+    def test_migration_clears_duplicate_emails(self):
+        migration = importlib.import_module('tweet_app.migrations.0012_user_email_unique')
+        with connection.cursor() as cursor:
+            cursor.execute(migration.DROP_INDEX)
+        User.objects.create_user('alice2', 'ALICE@example.com', last_login=timezone.now())
+        User.objects.create_user('alice3', 'alice@EXAMPLE.com')
+        with mock.patch('builtins.print'):
+            migration.clear_duplicate_emails(django_apps, mock.Mock(connection=connection))
+        with connection.cursor() as cursor:
+            cursor.execute(migration.CREATE_INDEX)
+        # The address stays with the account that logged in last
+        emails = dict(User.objects.values_list('username', 'email'))
+        self.assertEqual(emails, {'alice': '', 'alice2': 'ALICE@example.com', 'alice3': ''})
+
+    def test_profile_email_must_stay_unique(self):
+        bob = User.objects.create_user('bob', 'bob@example.com', 'pass')
+        form = UserUpdateForm({'username': 'bob', 'email': 'ALICE@example.com'}, instance=bob)
+        self.assertIn('email', form.errors)
+        # Keeping your own address, in any case, is fine
+        form = UserUpdateForm({'username': 'bob', 'email': 'Bob@Example.com'}, instance=bob)
+        self.assertTrue(form.is_valid())
+
+    def test_cached_user_is_dropped_on_save(self):
+        backend = EmailBackend()
+        backend.get_user(self.user.pk)
+        with QueryBudget(0):
+            cached = backend.get_user(self.user.pk)
+        self.assertEqual(cached.username, 'alice')
+
+        self.user.set_password('new')
+        self.user.save()
+        self.assertTrue(backend.get_user(self.user.pk).check_password('new'))
+
+
+class JobTests(TestCase):
+    def register(self, func, **options):
+        func = jobs.job(**options)(func)
+        self.addCleanup(jobs.REGISTRY.pop, func.job_name)
+        return func
+
+    def test_retried_with_backoff_then_dead(self):
+        calls = []
+
+        def flaky(n):
+            calls.append(n)
+            raise OSError('SMTP is down')
+
+        self.register(flaky, name='test_flaky', max_attempts=2).delay(7)
+        self.assertEqual(jobs.work(once=True), 1)
+        job_row = Job.objects.get(name='test_flaky')
+        self.assertEqual((job_row.status, job_row.attempts), ('pending', 1))
+        self.assertIn('SMTP is down', job_row.last_error)
+        # Not due again until the backoff has passed
+        self.assertGreater(job_row.run_at, timezone.now() + timedelta(seconds=jobs.RETRY_BASE_SECONDS - 1))
+        self.assertEqual(jobs.work(once=True), 0)
+
+        Job.objects.update(run_at=timezone.now())
+        with self.assertLogs('tweet_app.jobs', logging.WARNING):
+            self.assertEqual(jobs.work(once=True), 1)
+        self.assertEqual(calls, [7, 7])
+        self.assertFalse(Job.objects.exists())
+        dead = DeadJob.objects.get()
+        self.assertEqual((dead.name, dead.args, dead.attempts), ('test_flaky', [7], 2))
+
+    def test_done_jobs_are_deleted_and_batches_queued_once(self):
+        done = []
+
+        def ok(n):
+            done.append(n)
+
+        self.register(ok, name='test_ok')
+        jobs.enqueue_once('test_ok', 1)
+        jobs.enqueue_once('test_ok', 2)
+        self.assertEqual(jobs.work(once=True), 1)
+        self.assertEqual(done, [1])
+        self.assertFalse(Job.objects.exists() or DeadJob.objects.exists())
+        # A job left running by a dead worker is picked up again
+        job_row = jobs.enqueue('test_ok', 3)
+        Job.objects.filter(pk=job_row.pk).update(status='running', locked_at=timezone.now() - jobs.LOCK_TIMEOUT * 2)
+        self.assertEqual(jobs.work(once=True), 1)
+        self.assertEqual(done, [1, 3])
+
+
+class OtpEmailTests(TestCase):
+    def setUp(self):
+        fresh_rate_limits(self)
+
+    def register(self):
+        self.client.post('/', {
+            'send_otp': '1', 'username': 'carol', 'email': 'carol@example.com',
+            'password1': 'a-long-pass-123', 'password2': 'a-long-pass-123',
+        })
+        return self.client.session['otp']
+
+    def test_job_names_the_session_not_the_code(self):
+        otp = self.register()
+        job_row = Job.objects.get(name='send_otp_email')
+        self.assertNotIn(otp, json.dumps([job_row.args, job_row.kwargs]))
+        self.assertEqual(jobs.work(once=True), 1)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn(otp, mail.outbox[0].body)
+
+    def test_signup_that_lost_a_race_shows_the_form(self):
+        otp = self.register()
+        User.objects.create_user('someone', 'CAROL@example.com', 'pass')
+        response = self.client.post('/', {'verify_otp': '1', 'otp': otp})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('email', response.context['form'].errors)
+        self.assertFalse(User.objects.filter(username='carol').exists())
+
+    def test_expired_and_replaced_codes_are_not_sent(self):
+        self.register()
+        with mock.patch('tweet_app.tasks.time.time', return_value=time.time() + utils.OTP_TTL + 1):
+            jobs.work(once=True)
+        self.assertEqual(mail.outbox, [])
+
+        # Two codes queued, only the newer one goes out
+        self.register()
+        self.client.post('/', {'resend_otp': '1'})
+        otp = self.client.session['otp']
+        jobs.work(once=True)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn(otp, mail.outbox[0].body)
+        self.assertFalse(DeadJob.objects.exists())
+
+
+def fresh_rate_limits(test):
+    """Fresh buckets for a test, and none left behind in the shared cache."""
+    for name in ('_store', '_shared_store'):
+        setattr(ratelimit, name, ratelimit.LocalStore())
+        test.addCleanup(setattr, ratelimit, name, None)
+
+
+class RateLimitTests(TestCase):
+    def setUp(self):
+        fresh_rate_limits(self)
+
+    def test_parse_rate(self):
+        self.assertEqual(ratelimit.parse_rate('10/m'), (10, 60))
+        self.assertEqual(ratelimit.parse_rate('3/10m'), (3, 600))
+        with self.assertRaises(ValueError):
+            ratelimit.parse_rate('ten per minute')
+
+    def test_token_bucket(self):
+        store, rate = ratelimit.LocalStore(), ratelimit.parse_rate('2/s')
+        waits = [store.consume('k', rate, now=now) for now in (0, 0, 0, 0.5, 0.5)]
+        self.assertEqual(waits, [0, 0, 0.5, 0, 0.5])
+
+    def test_login_is_throttled(self):
+        # A fast hasher, ten real password checks would take seconds
+        with self.settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher']):
+            User.objects.create_user('alice', 'alice@example.com', 'pass')
+            for _ in range(10):
+                self.client.post('/login/', {'email': 'alice@example.com', 'password': 'wrong'})
+            response = self.client.post('/login/', {'email': 'alice@example.com', 'password': 'wrong'})
+        self.assertEqual(response.status_code, 429)
+        self.assertGreater(int(response['Retry-After']), 0)
+        # Only POSTs count
+        self.assertEqual(self.client.get('/login/').status_code, 200)
+        # Counted where every worker sees it
+        self.assertIn('login:ip:127.0.0.1', ratelimit._shared_store.buckets)
+        self.assertNotIn('login:ip:127.0.0.1', ratelimit._store.buckets)
+
+    def assert_throttled(self, response):
+        self.assertEqual(response.status_code, 429)
+        self.assertGreater(int(response['Retry-After']), 0)
+
+    def test_otp_requests_are_throttled(self):
+        data = {
+            'send_otp': '1', 'username': 'carol', 'email': 'carol@example.com',
+            'password1': 'a-long-pass-123', 'password2': 'a-long-pass-123',
+        }
+        for _ in range(3):
+            self.assertEqual(self.client.post('/', data).status_code, 200)
+        self.assert_throttled(self.client.post('/', data))
+        # Resending counts against the same address
+        self.assert_throttled(self.client.post('/', {'resend_otp': '1'}))
+        self.assertEqual(Job.objects.filter(name='send_otp_email').count(), 3)
+        self.assertIn('otp_email:carol@example.com', ratelimit._shared_store.buckets)
+
+    def test_otp_guesses_are_throttled(self):
+        self.client.post('/', {
+            'send_otp': '1', 'username': 'carol', 'email': 'carol@example.com',
+            'password1': 'a-long-pass-123', 'password2': 'a-long-pass-123',
+        })
+        for _ in range(5):
+            self.assertEqual(self.client.post('/', {'verify_otp': '1', 'otp': 'wrong'}).status_code, 200)
+        # Even the right code is refused once the guesses are used up
+        response = self.client.post('/', {'verify_otp': '1', 'otp': self.client.session['otp']})
+        self.assert_throttled(response)
+        self.assertFalse(User.objects.filter(username='carol').exists())
+
+    @override_settings(RATE_LIMITS={'tweet_like': ('2/m', 'user')})
+    def test_likes_are_throttled_per_user(self):
+        user = User.objects.create_user('alice')
+        tweet = Tweet.objects.create(user=user, text='like me')
+        self.client.force_login(user)
+        for action in ('like', 'unlike'):
+            response = self.client.post(f'/tweet_like/{tweet.pk}', {'action': action}, HTTP_HX_REQUEST='true')
+            self.assertEqual(response.status_code, 200)
+        response = self.client.post(f'/tweet_like/{tweet.pk}', {'action': 'like'}, HTTP_HX_REQUEST='true')
+        self.assert_throttled(response)
+        self.assertEqual(Tweet.objects.get(pk=tweet.pk).like_count, 0)
+        self.assertIn(f'tweet_like:user:{user.pk}', ratelimit._store.buckets)
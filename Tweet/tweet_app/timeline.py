@@ -0,0 +1,338 @@
+"""
+Home timelines (fan-out on write).
+
+When someone tweets, the tweet id is pushed into the stored timeline of each
+of their followers, so reading a home timeline is a lookup of one page of ids
+instead of a join-and-sort over every tweet. Authors with more than
+FANOUT_LIMIT followers are skipped at write time; their tweets are merged in
+when a follower reads (fan-out on read), so one tweet never turns into
+millions of writes.
+
+Where the timelines live is pluggable with the TIMELINE_STORE setting (dotted
+path to a zero-argument factory):
+  - DatabaseTimelineStore (default): TimelineEntry rows, shared by all workers
+  - RedisTimelineStore: sorted sets in anything that speaks the redis-py API;
+    local_store() gives one backed by LocalRedis, an in-process stand-in
+"""
+import threading
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery, Window
+from django.db.models.functions import Coalesce, RowNumber
+from django.utils.module_loading import import_string
+
+from .models import Follow, Profile, Tweet, TimelineEntry
+from .pagination import PAGE_SIZE, pack_cursor, unpack_cursor
+
+# Newest entries kept per timeline
+TIMELINE_LENGTH = 800
+
+# Authors with more followers than this are fanned out on read
+FANOUT_LIMIT = 1000
+
+
+class DatabaseTimelineStore:
+    """Timelines as (user, tweet) rows; reads use the unique (user, tweet) index."""
+
+    def push(self, user_ids, tweet_id):
+        TimelineEntry.objects.bulk_create(
+            [TimelineEntry(user_id=user_id, tweet_id=tweet_id) for user_id in user_ids],
+            batch_size=1000,
+            ignore_conflicts=True,
+        )
+        # Like the sorted sets, each write keeps its timelines capped
+        self.trim(TIMELINE_LENGTH, user_ids)
+
+    def replace(self, user_id, tweet_ids):
+        TimelineEntry.objects.filter(user_id=user_id).delete()
+        self.add(user_id, tweet_ids)
+
+    def add(self, user_id, tweet_ids):
+        TimelineEntry.objects.bulk_create(
+            [TimelineEntry(user_id=user_id, tweet_id=tweet_id) for tweet_id in tweet_ids],
+            batch_size=1000,
+            ignore_conflicts=True,
+        )
+        self.trim(TIMELINE_LENGTH, [user_id])
+
+    def range(self, user_id, before=None, count=PAGE_SIZE):
+        entries = TimelineEntry.objects.filter(user_id=user_id)
+        if before:
+            entries = entries.filter(tweet_id__lt=before)
+        return list(entries.order_by('-tweet_id').values_list('tweet_id', flat=True)[:count])
+
+    def exists(self, user_id):
+        return TimelineEntry.objects.filter(user_id=user_id).exists()
+
+    def trim(self, length=TIMELINE_LENGTH, user_ids=None):
+        """
+        Drops everything past the newest `length` entries of each timeline,
+        or only of the timelines of `user_ids`.
+        """
+        if user_ids is None:
+            return self._trim(TimelineEntry.objects.all(), length)
+        user_ids = list(user_ids)
+        return sum(
+            self._trim(TimelineEntry.objects.filter(user_id__in=user_ids[start:start + 1000]), length)
+            for start in range(0, len(user_ids), 1000)
+        )
+
+    def _trim(self, entries, length):
+        ranked = entries.annotate(
+            rank=Window(RowNumber(), partition_by=F('user_id'), order_by=F('tweet_id').desc())
+        ).filter(rank__gt=length)
+        pks = list(ranked.values_list('pk', flat=True))
+        for start in range(0, len(pks), 1000):
+            TimelineEntry.objects.filter(pk__in=pks[start:start + 1000]).delete()
+        return len(pks)
+
+
+class RedisTimelineStore:
+    """
+    One sorted set per user, scored by tweet id. Only uses zadd,
+    zrevrangebyscore, zremrangebyrank, exists, delete and pipeline, so it
+    works with redis.Redis or with LocalRedis below.
+    """
+
+    def __init__(self, client):
+        self.client = client
+
+    def key(self, user_id):
+        return f'timeline:{user_id}'
+
+    def push(self, user_ids, tweet_id):
+        pipe = self.client.pipeline()
+        for user_id in user_ids:
+            pipe.zadd(self.key(user_id), {tweet_id: tweet_id})
+            pipe.zremrangebyrank(self.key(user_id), 0, -TIMELINE_LENGTH - 1)
+        pipe.execute()
+
+    def replace(self, user_id, tweet_ids):
+        self.client.delete(self.key(user_id))
+        self.add(user_id, tweet_ids)
+
+    def add(self, user_id, tweet_ids):
+        if tweet_ids:
+            self.client.zadd(self.key(user_id), {tweet_id: tweet_id for tweet_id in tweet_ids})
+            self.client.zremrangebyrank(self.key(user_id), 0, -TIMELINE_LENGTH - 1)
+
+    def range(self, user_id, before=None, count=PAGE_SIZE):
+        top = f'({before}' if before else '+inf'
+        ids = self.client.zrevrangebyscore(self.key(user_id), top, '-inf', start=0, num=count)
+        return [int(tweet_id) for tweet_id in ids]
+
+    def exists(self, user_id):
+        return bool(self.client.exists(self.key(user_id)))
+
+    def trim(self, length=TIMELINE_LENGTH, user_ids=None):
+        # Every write trims its own set already
+        return 0
+
+
+class LocalRedis:
+    """
+    In-process stand-in for the few redis-py sorted set commands
+    RedisTimelineStore needs. Per process only: fine for tests and a single
+    dev server, not for several gunicorn workers.
+    """
+
+    def __init__(self):
+        self.sets = {}
+        self.lock = threading.Lock()
+
+    def pipeline(self):
+        return LocalPipeline(self)
+
+    def zadd(self, key, mapping):
+        with self.lock:
+            self.sets.setdefault(key, {}).update(mapping)
+
+    def zremrangebyrank(self, key, start, stop):
+        with self.lock:
+            members = sorted(self.sets.get(key, {}).items(), key=lambda item: item[1])
+            stop = len(members) + stop if stop < 0 else stop
+            for member, _ in members[start:stop + 1]:
+                del self.sets[key][member]
+
+    def zrevrangebyscore(self, key, max, min, start=0, num=None):
+        def bound(value, default):
+            value = str(value)
+            if value.endswith('inf'):
+                return default, False
+            if value.startswith('('):
+                return float(value[1:]), True
+            return float(value), False
+
+        high, high_open = bound(max, float('inf'))
+        low, low_open = bound(min, float('-inf'))
+        with self.lock:
+            members = sorted(self.sets.get(key, {}).items(), key=lambda item: item[1], reverse=True)
+        hits = [
+            member for member, score in members
+            if (score < high if high_open else score <= high)
+            and (score > low if low_open else score >= low)
+        ]
+        return hits[start:] if num is None else hits[start:start + num]
+
+    def exists(self, key):
+        return int(bool(self.sets.get(key)))
+
+    def delete(self, key):
+        with self.lock:
+            return int(self.sets.pop(key, None) is not None)
+
+
+class LocalPipeline:
+    def __init__(self, client):
+        self.client = client
+        self.calls = []
+
+    def __getattr__(self, name):
+        def queue(*args, **kwargs):
+            self.calls.append((name, args, kwargs))
+            return self
+        return queue
+
+    def execute(self):
+        calls, self.calls = self.calls, []
+        return [getattr(self.client, name)(*args, **kwargs) for name, args, kwargs in calls]
+
+
+def local_store():
+    return RedisTimelineStore(LocalRedis())
+
+
+_store = None
+
+
+def get_store():
+    global _store
+    if _store is None:
+        path = getattr(settings, 'TIMELINE_STORE', 'tweet_app.timeline.DatabaseTimelineStore')
+        _store = import_string(path)()
+    return _store
+
+
+def fan_out_tweet(tweet):
+    """Pushes a new tweet onto the author's and their followers' timelines."""
+    user_ids = [tweet.user_id]
+    if tweet.user.profile.follower_count <= FANOUT_LIMIT:
+        user_ids += list(
+            Follow.objects.filter(followee_id=tweet.user_id).values_list('follower_id', flat=True)
+        )
+    get_store().push(user_ids, tweet.pk)
+
+
+def recent_tweet_ids(user_ids, limit=TIMELINE_LENGTH):
+    return list(
+        Tweet.objects.filter(user_id__in=user_ids)
+        .order_by('-id')
+        .values_list('id', flat=True)[:limit]
+    )
+
+
+def rebuild_timeline(user):
+    """Fills a timeline from scratch (new store, lost cache, first visit)."""
+    followees = Follow.objects.filter(
+        follower=user, followee__profile__follower_count__lte=FANOUT_LIMIT
+    ).values_list('followee_id', flat=True)
+    get_store().replace(user.id, recent_tweet_ids([user.id, *followees]))
+
+
+def follow(follower, followee):
+    """Follows followee; returns False if already following (or self)."""
+    if follower.pk == followee.pk:
+        return False
+    try:
+        with transaction.atomic():
+            Follow.objects.create(follower=follower, followee=followee)
+            Profile.objects.filter(user=followee).update(follower_count=F('follower_count') + 1)
+    except IntegrityError:
+        return False
+    # Backfill the followee's recent tweets so they show up right away
+    if followee.profile.follower_count <= FANOUT_LIMIT:
+        get_store().add(follower.id, recent_tweet_ids([followee.id], limit=PAGE_SIZE * 5))
+    return True
+
+
+def unfollow(follower, followee):
+    """Unfollows followee; returns False if not following."""
+    with transaction.atomic():
+        removed, _ = Follow.objects.filter(follower=follower, followee=followee).delete()
+        if not removed:
+            return False
+        Profile.objects.filter(user=followee, follower_count__gt=0).update(
+            follower_count=F('follower_count') - 1
+        )
+    # Cheaper to rebuild lazily than to pick the followee's ids out of the timeline
+    get_store().replace(follower.id, [])
+    return True
+
+
+def reconcile_follower_counts(batch_size=1000):
+    """
+    Recomputes Profile.follower_count from the Follow rows, in pk ranges
+    like likes.reconcile_like_counts. Returns how many profiles were fixed.
+    """
+    actual = (
+        Follow.objects.filter(followee_id=OuterRef('user_id'))
+        .values('followee_id')
+        .annotate(c=Count('*'))
+        .values('c')
+    )
+    fixed = 0
+    last_pk = 0
+    while True:
+        pks = list(
+            Profile.objects.filter(pk__gt=last_pk)
+            .order_by('pk')
+            .values_list('pk', flat=True)[:batch_size]
+        )
+        if not pks:
+            return fixed
+        last_pk = pks[-1]
+        fixed += (
+            Profile.objects.filter(pk__in=pks)
+            .annotate(actual=Coalesce(Subquery(actual), 0))
+            .filter(~Q(follower_count=F('actual')))
+            .update(follower_count=Coalesce(Subquery(actual), 0))
+        )
+
+
+def home_timeline(user, cursor=None, page_size=PAGE_SIZE):
+    """
+    Returns (tweets, next_cursor) for one page of the user's home timeline:
+    the stored ids merged with recent tweets of high-follower followees.
+    """
+    store = get_store()
+    if not store.exists(user.id):
+        rebuild_timeline(user)
+
+    before = None
+    position = unpack_cursor(cursor)
+    if position:
+        try:
+            before = int(position[0])
+        except ValueError:
+            before = None
+
+    ids = set(store.range(user.id, before, page_size + 1))
+
+    # Fan-out on read for accounts too big to push to
+    celebrities = Follow.objects.filter(
+        follower=user, followee__profile__follower_count__gt=FANOUT_LIMIT
+    ).values_list('followee_id', flat=True)
+    pulled = Tweet.objects.filter(user_id__in=celebrities)
+    if before:
+        pulled = pulled.filter(id__lt=before)
+    ids.update(pulled.order_by('-id').values_list('id', flat=True)[:page_size + 1])
+
+    ids = sorted(ids, reverse=True)[:page_size + 1]
+    next_cursor = None
+    if len(ids) > page_size:
+        ids = ids[:page_size]
+        next_cursor = pack_cursor(ids[-1])
+
+    by_id = Tweet.objects.select_related('user').in_bulk(ids)
+    return [by_id[pk] for pk in ids if pk in by_id], next_cursor
@@ -0,0 +1,195 @@
+"""
+#hashtag and @mention lookup tables.
+
+Every saved tweet is parsed (post_save signal in models.py) into TweetTag
+rows (tweet, hashtag) and Mention rows (tweet, mentioned user). Both copy the
+tweet's created_at and are indexed on (tag or user, created_at, tweet), so a
+topic page is a range scan over that index, keyset-paginated like the feeds,
+followed by one in_bulk of the page's tweets. No scan of the tweets table
+and no LIKE '%#tag%'.
+
+Tags are stored lowercased (#Django and #django are one topic); mentions
+only count when the username exists. Tweets saved before this existed are
+parsed by `manage.py backfill_topics`.
+"""
+import re
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.urls import reverse
+from django.utils.html import escape, format_html
+from django.utils.safestring import mark_safe
+
+from .pagination import PAGE_SIZE, page_query, split_page
+
+HASHTAG_RE = re.compile(r'(?<![\w#])#(\w{1,100})')
+# Usernames may also hold . + - (Django's default validator); a trailing
+# dot is the end of the sentence, not part of the name
+MENTION_RE = re.compile(r'(?<![\w@])@([\w.+-]{1,150})')
+
+
+def extract_hashtags(text):
+    """The distinct tags of a text, lowercased, in order of appearance."""
+    return list(dict.fromkeys(tag.lower() for tag in HASHTAG_RE.findall(text or '')))
+
+
+def extract_mentions(text):
+    """The distinct @usernames of a text, in order of appearance."""
+    names = (name.rstrip('.') for name in MENTION_RE.findall(text or ''))
+    return list(dict.fromkeys(name for name in names if name))
+
+
+def linkify(text, usernames=()):
+    """
+    Escaped text with #tags linked to their tag page, and the @names found in
+    usernames to their profile (other @names stay plain text).
+    """
+    matches = sorted(
+        [(m.start(), m.end(), 'tag_tweets', m.group(1)) for m in HASHTAG_RE.finditer(text)]
+        + [(m.start(), m.start() + 1 + len(name), 'profile', name)
+           for m in MENTION_RE.finditer(text) if (name := m.group(1).rstrip('.')) in usernames]
+    )
+    pieces, last = [], 0
+    for start, end, view, value in matches:
+        pieces.append(escape(text[last:start]))
+        pieces.append(format_html('<a href="{}">{}</a>', reverse(view, args=[value]), text[start:end]))
+        last = end
+    pieces.append(escape(text[last:]))
+    return mark_safe(''.join(pieces))
+
+
+def mention_rows(tweets):
+    """(tweet_id, username) of the users the tweets mention, one query; None if none has @names."""
+    from .models import Mention
+
+    ids = [tweet.pk for tweet in tweets if extract_mentions(tweet.text)]
+    if not ids:
+        return None
+    return Mention.objects.filter(tweet_id__in=ids).values_list('tweet_id', 'user__username')
+
+
+def attach_mentions(tweets, rows):
+    names = {}
+    for tweet_id, username in rows:
+        names.setdefault(tweet_id, set()).add(username)
+    for tweet in tweets:
+        tweet.mentioned_usernames = names.get(tweet.pk, set())
+
+
+def load_mentions(tweets):
+    """
+    Sets tweet.mentioned_usernames on a page of tweets: the @names that are
+    users, from their Mention rows (see index_tweets). Used by linkify_tweet.
+    """
+    rows = mention_rows(tweets)
+    attach_mentions(tweets, list(rows) if rows is not None else [])
+
+
+async def aload_mentions(tweets):
+    """load_mentions for async views, which render without touching the database."""
+    rows = mention_rows(tweets)
+    attach_mentions(tweets, [row async for row in rows] if rows is not None else [])
+
+
+def linkify_tweet(tweet):
+    if not hasattr(tweet, 'mentioned_usernames'):
+        load_mentions([tweet])
+    return linkify(tweet.text, tweet.mentioned_usernames)
+
+
+def hashtag_ids(names):
+    """{name: id} for the given tag names, creating the missing ones."""
+    from .models import Hashtag
+
+    if not names:
+        return {}
+    ids = dict(Hashtag.objects.filter(name__in=names).values_list('name', 'id'))
+    missing = [name for name in names if name not in ids]
+    if missing:
+        # Another request may create the same tag meanwhile, so re-read
+        Hashtag.objects.bulk_create([Hashtag(name=name) for name in missing], ignore_conflicts=True)
+        ids.update(Hashtag.objects.filter(name__in=missing).values_list('name', 'id'))
+    return ids
+
+
+def index_tweets(tweets):
+    """
+    (Re)builds the TweetTag and Mention rows of some tweets: a handful of
+    queries for the whole batch, not per tweet. Returns the TweetTag rows.
+    """
+    from .models import Mention, TweetTag
+
+    tweets = [tweet for tweet in tweets if tweet.pk]
+    if not tweets:
+        return []
+    tags = {tweet.pk: extract_hashtags(tweet.text) for tweet in tweets}
+    mentions = {tweet.pk: extract_mentions(tweet.text) for tweet in tweets}
+
+    tag_ids = hashtag_ids(list(dict.fromkeys(name for names in tags.values() for name in names)))
+    user_ids = dict(User.objects.filter(
+        username__in={name for names in mentions.values() for name in names}
+    ).values_list('username', 'id'))
+
+    with transaction.atomic():
+        TweetTag.objects.filter(tweet__in=tweets).delete()
+        Mention.objects.filter(tweet__in=tweets).delete()
+        tagged = TweetTag.objects.bulk_create([
+            TweetTag(tweet_id=tweet.pk, tag_id=tag_ids[name], created_at=tweet.created_at)
+            for tweet in tweets
+            for name in tags[tweet.pk]
+        ], batch_size=1000)
+        Mention.objects.bulk_create([
+            Mention(tweet_id=tweet.pk, user_id=user_ids[name], created_at=tweet.created_at)
+            for tweet in tweets
+            for name in mentions[tweet.pk]
+            if name in user_ids
+        ], batch_size=1000)
+    return tagged
+
+
+def index_tweet(tweet):
+    return index_tweets([tweet])
+
+
+def backfill(batch_size=1000, log=None):
+    """Indexes every tweet, batch_size at a time in id order; returns the count."""
+    from .models import Tweet
+
+    done = 0
+    last_pk = 0
+    while True:
+        batch = list(
+            Tweet.objects.filter(pk__gt=last_pk).order_by('pk').only('id', 'text', 'created_at')[:batch_size]
+        )
+        if not batch:
+            return done
+        index_tweets(batch)
+        done += len(batch)
+        last_pk = batch[-1].pk
+        if log:
+            log(f'{done} tweets')
+
+
+async def apage(entries, cursor=None, page_size=PAGE_SIZE):
+    """
+    One page of the tweets behind TweetTag or Mention rows, newest first:
+    returns (tweets, next_cursor), same cursors as pagination.py.
+    """
+    from .models import Tweet
+
+    ids = [
+        tweet_id async for tweet_id in
+        page_query(entries, cursor, id_field='tweet_id').values_list('tweet_id', flat=True)[:page_size + 1]
+    ]
+    by_id = {tweet.pk: tweet async for tweet in Tweet.objects.select_related('user').filter(pk__in=ids)}
+    return split_page([by_id[pk] for pk in ids if pk in by_id], page_size)
+
+
+def tagged(name):
+    from .models import TweetTag
+    return TweetTag.objects.filter(tag__name=name.lower())
+
+
+def mentioning(user):
+    from .models import Mention
+    return Mention.objects.filter(user=user)
@@ -0,0 +1,173 @@
+"""
+Export and import of users, profiles, follows, tweets and likes.
+
+    python manage.py export_tweets backup.ndjson.gz
+    python manage.py import_tweets backup.ndjson.gz     (into an empty database)
+
+The file is NDJSON, gzip-compressed (or xz/bz2 by extension): a header line,
+then one {"kind": ..., <columns>} line per row, section by section in
+SECTIONS order so every row comes after the rows it points at. Rows keep
+their ids. Export reads each table with .values().iterator(chunk_size);
+import buffers batch_size rows and bulk_creates them, so memory stays at
+one batch whatever the size of the file.
+
+bulk_create sends no model signals, so the per-row handlers in models.py
+(create_profile, search/topic indexing, photo cleanup, scoring) never run
+during an import. What they would have produced is rebuilt once at the
+end, in batches: like counts, "top" scores, follower counts, hashtag and
+mention tables, the search index. Home timelines fill themselves on first
+visit (timeline.rebuild_timeline). Trending counters and media files are
+not part of the export; copy the media bucket separately.
+
+The file holds password hashes and email addresses, keep it private.
+"""
+import bz2
+import contextlib
+import gzip
+import json
+import lzma
+from datetime import datetime
+
+from django.contrib.auth.models import User
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.utils.dateparse import parse_datetime
+
+from . import ranking, search, topics
+from .likes import Like, reconcile_like_counts
+from .models import Follow, Profile, Tweet
+from .timeline import reconcile_follower_counts
+
+FORMAT = 'tweet_app-export'
+VERSION = 1
+
+# kind -> (model, exported columns); like_count, score and follower_count
+# are derived and recomputed on import
+SECTIONS = {
+    'user': (User, [
+        'id', 'username', 'email', 'password', 'first_name', 'last_name', 'is_active',
+        'is_staff', 'is_superuser', 'date_joined', 'last_login',
+    ]),
+    'profile': (Profile, ['id', 'user_id', 'bio', 'profile_pic', 'pic_renditions']),
+    'follow': (Follow, ['id', 'follower_id', 'followee_id', 'created_at']),
+    'tweet': (Tweet, ['id', 'user_id', 'text', 'photo', 'photo_renditions', 'created_at', 'updated_at']),
+    'like': (Like, ['id', 'tweet_id', 'user_id']),
+}
+DATETIME_COLUMNS = {'date_joined', 'last_login', 'created_at', 'updated_at'}
+
+
+def open_file(path, mode):
+    """Text-mode handle, compressed according to the extension (gzip by default)."""
+    opener = {'.xz': lzma.open, '.bz2': bz2.open}.get(path[path.rfind('.'):], gzip.open)
+    return opener(path, mode + 't', encoding='utf-8')
+
+
+def encode_datetime(value):
+    # Full precision, unlike DjangoJSONEncoder: feed cursors compare microseconds
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def export_data(path, batch_size=2000, log=None):
+    """Writes every section to path; returns {kind: rows}."""
+    encode = json.JSONEncoder(separators=(',', ':'), ensure_ascii=False, default=encode_datetime).encode
+    counts = {}
+    with open_file(path, 'w') as f:
+        f.write(encode({'format': FORMAT, 'version': VERSION}) + '\n')
+        for kind, (model, columns) in SECTIONS.items():
+            counts[kind] = 0
+            rows = model.objects.order_by('pk').values(*columns).iterator(chunk_size=batch_size)
+            for row in rows:
+                f.write(encode({'kind': kind, **row}) + '\n')
+                counts[kind] += 1
+                if log and counts[kind] % (batch_size * 50) == 0:
+                    log(f'{counts[kind]} {kind} rows')
+            if log:
+                log(f'{counts[kind]} {kind} rows exported')
+    return counts
+
+
+@contextlib.contextmanager
+def keep_timestamps(models):
+    """Turns auto_now/auto_now_add off so imported rows keep their dates."""
+    fields = [
+        field for model in models for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+    ]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def build(kind, row):
+    model, columns = SECTIONS[kind]
+    values = {column: row.get(column) for column in columns}
+    for column in DATETIME_COLUMNS.intersection(values):
+        if values[column]:
+            values[column] = parse_datetime(values[column])
+    return model(**values)
+
+
+def import_data(path, batch_size=2000, log=None):
+    """
+    Loads a file written by export_data into an empty database and rebuilds
+    the derived data; returns {kind: rows}. The rows go in as one
+    transaction, so a failed import leaves nothing behind.
+    """
+    models = [model for model, _ in SECTIONS.values()]
+    if User.objects.exists() or Tweet.objects.exists():
+        raise ValueError('The database already has users or tweets, import needs an empty one')
+
+    counts = dict.fromkeys(SECTIONS, 0)
+    batch, batch_kind = [], None
+
+    def flush():
+        if batch:
+            SECTIONS[batch_kind][0].objects.bulk_create(batch, batch_size=batch_size)
+            counts[batch_kind] += len(batch)
+            if log:
+                log(f'{counts[batch_kind]} {batch_kind} rows')
+            batch.clear()
+
+    with open_file(path, 'r') as f, transaction.atomic(), keep_timestamps(models):
+        header = json.loads(f.readline() or '{}')
+        if header.get('format') != FORMAT or header.get('version') != VERSION:
+            raise ValueError(f'{path} is not a version {VERSION} export')
+        for line in f:
+            row = json.loads(line)
+            kind = row.pop('kind')
+            if kind not in SECTIONS:
+                raise ValueError(f'Unknown row kind {kind!r}')
+            if kind != batch_kind or len(batch) >= batch_size:
+                flush()
+                batch_kind = kind
+            batch.append(build(kind, row))
+        flush()
+        # Rows came with their ids, move the sequences past them (PostgreSQL)
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(no_style(), models):
+                cursor.execute(sql)
+
+    rebuild_derived(batch_size=batch_size, log=log)
+    return counts
+
+
+def rebuild_derived(batch_size=2000, log=None):
+    """Recomputes everything the model signals would have maintained."""
+    log = log or (lambda message: None)
+    reconcile_like_counts(batch_size=batch_size)
+    log('like counts recomputed')
+    ranking.rescore(batch_size=batch_size)
+    log('tweets scored')
+    reconcile_follower_counts(batch_size=batch_size)
+    log('follower counts recomputed')
+    topics.backfill(batch_size=batch_size)
+    log('hashtags and mentions indexed')
+    indexed = search.get_backend().rebuild(batch_size=batch_size)
+    log(f'{indexed} tweets indexed for search')
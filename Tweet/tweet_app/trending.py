@@ -0,0 +1,180 @@
+"""
+Trending hashtags and tweets from time-decayed counters.
+
+Activity is counted into TrendCounter rows, one per (kind, key, bucket):
+  - kind 'tag': a new tweet used hashtag `key` (models.py signal)
+  - kind 'like': tweet `key` was liked (+1) or unliked (-1) (likes.py)
+Counts go to minute buckets first. Increments are summed in memory and
+written every TRENDING_FLUSH_SECONDS in one transaction, so a burst of likes costs a
+handful of row updates, not one write per like. compact() (the
+compact_trends job, queued after a flush) rolls minute buckets older than
+MINUTE_RETENTION into hour buckets and drops anything past WINDOW, so the
+table stays at roughly (active keys x buckets in the window) rows.
+
+top(kind) reads the buckets of the window (index on (kind, bucket)),
+weighs each count by 0.5 ** (age / HALF_LIFE) and keeps the best K with a
+heap; it never looks at the tweets table. sidebar() caches the names and
+snippets the trending partial shows for TRENDING_CACHE_SECONDS.
+
+Settings: TRENDING_FLUSH_SECONDS (0 writes at once, as tests do),
+TRENDING_CACHE_SECONDS.
+"""
+import heapq
+import logging
+import math
+import threading
+from collections import Counter, defaultdict
+from datetime import timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F, Sum
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+
+from . import jobs
+
+logger = logging.getLogger(__name__)
+
+MINUTE, HOUR = 'm', 'h'
+WINDOW = timedelta(hours=24)
+MINUTE_RETENTION = timedelta(hours=1)
+HALF_LIFE = timedelta(hours=2)
+# How often the compact_trends job runs while there is activity
+COMPACT_DELAY_SECONDS = 600
+
+SIDEBAR_KEY = 'trending:sidebar'
+SIDEBAR_SIZE = 5
+
+
+def flush_seconds():
+    return getattr(settings, 'TRENDING_FLUSH_SECONDS', 5)
+
+
+def floor_minute(when):
+    return when.replace(second=0, microsecond=0)
+
+
+_pending = Counter()
+_pending_lock = threading.Lock()
+_flush_timer = None
+
+
+def add(counts, resolution):
+    """Adds {(kind, key, bucket): n} to the counters, creating missing rows."""
+    from .models import TrendCounter
+
+    with transaction.atomic():
+        for (kind, key, bucket), n in counts.items():
+            row = TrendCounter.objects.filter(kind=kind, key=key, resolution=resolution, bucket=bucket)
+            if row.update(count=F('count') + n):
+                continue
+            try:
+                with transaction.atomic():
+                    TrendCounter.objects.create(kind=kind, key=key, resolution=resolution, bucket=bucket, count=n)
+            except IntegrityError:
+                # Another process created it first
+                row.update(count=F('count') + n)
+
+
+def flush():
+    global _flush_timer
+    with _pending_lock:
+        counts = {key: n for key, n in _pending.items() if n}
+        _pending.clear()
+        _flush_timer = None
+    if not counts:
+        return
+    add(counts, MINUTE)
+    jobs.enqueue_once('compact_trends', delay=COMPACT_DELAY_SECONDS)
+
+
+def flush_in_thread():
+    try:
+        flush()
+    except Exception:
+        # Trending is best effort, a lost minute of counts is fine
+        logger.exception('Could not write trending counters')
+    finally:
+        connection.close()
+
+
+def record(kind, keys, n=1):
+    """Counts n for each key once the current transaction commits."""
+    keys = list(keys)
+    if keys:
+        transaction.on_commit(lambda: _record(kind, keys, n))
+
+
+def _record(kind, keys, n):
+    global _flush_timer
+    bucket = floor_minute(timezone.now())
+    delay = flush_seconds()
+    with _pending_lock:
+        for key in keys:
+            _pending[kind, key, bucket] += n
+        if delay and _flush_timer is None:
+            _flush_timer = threading.Timer(delay, flush_in_thread)
+            _flush_timer.daemon = True
+            _flush_timer.start()
+    if not delay:
+        flush()
+
+
+def compact(now=None):
+    """Rolls old minute buckets into hour buckets and drops expired ones."""
+    from .models import TrendCounter
+
+    now = now or timezone.now()
+    cutoff = (now - MINUTE_RETENTION).replace(minute=0, second=0, microsecond=0)
+    with transaction.atomic():
+        old = TrendCounter.objects.filter(resolution=MINUTE, bucket__lt=cutoff)
+        hours = (
+            old.annotate(hour=TruncHour('bucket', tzinfo=dt_timezone.utc))
+            .values('kind', 'key', 'hour')
+            .annotate(total=Sum('count'))
+        )
+        rolled = {(row['kind'], row['key'], row['hour']): row['total'] for row in hours}
+        old.delete()
+        add(rolled, HOUR)
+        expired, _ = TrendCounter.objects.filter(bucket__lt=now - WINDOW).delete()
+    return len(rolled), expired
+
+
+def top(kind, k=10, now=None):
+    """[(score, key)] of the k highest decayed counts of the window, best first."""
+    from .models import TrendCounter
+
+    now = now or timezone.now()
+    half_life = HALF_LIFE.total_seconds()
+    scores = defaultdict(float)
+    rows = TrendCounter.objects.filter(kind=kind, bucket__gte=now - WINDOW).values_list('key', 'bucket', 'count')
+    for key, bucket, count in rows.iterator(chunk_size=2000):
+        age = max(0.0, (now - bucket).total_seconds())
+        scores[key] += count * math.pow(0.5, age / half_life)
+    return heapq.nlargest(k, ((score, key) for key, score in scores.items() if score > 0))
+
+
+def sidebar():
+    """What the trending partial shows, cached for TRENDING_CACHE_SECONDS."""
+    from .models import Hashtag, Tweet
+
+    data = cache.get(SIDEBAR_KEY)
+    if data is not None:
+        return data
+    tags = top('tag', SIDEBAR_SIZE)
+    names = Hashtag.objects.in_bulk([key for _, key in tags])
+    liked = top('like', SIDEBAR_SIZE)
+    tweets = Tweet.objects.select_related('user').only('id', 'text', 'user__username').in_bulk(
+        [key for _, key in liked]
+    )
+    data = {
+        'tags': [names[key].name for _, key in tags if key in names],
+        'tweets': [
+            {'id': key, 'username': tweets[key].user.username, 'text': tweets[key].text[:80]}
+            for _, key in liked if key in tweets
+        ],
+    }
+    cache.set(SIDEBAR_KEY, data, getattr(settings, 'TRENDING_CACHE_SECONDS', 60))
+    return data
@@ -5,6 +5,7 @@ from . import views
 
 urlpatterns = [
     path('tweet_home/', views.tweet_list, name='tweet_list'),
+    path('home/', views.home_timeline, name='home_timeline'),
     path('<int:tweet_id>/', views.tweet_detail, name='tweet_detail'),
     path('create/', views.tweet_create, name='tweet_create'),
     path('<int:tweet_id>/edit', views.tweet_edit, name='tweet_edit'),
@@ -12,7 +13,15 @@ urlpatterns = [
     path('search/', views.tweet_search, name='tweet_search'),
     path('profile/edit/', views.profile_edit, name='profile_edit'),
     path('profile/<str:username>/', views.profile, name='profile'),
+    path('profile/<str:username>/follow/', views.follow_toggle, name='follow_toggle'),
+    path('profile/<str:username>/mentions/', views.user_mentions, name='user_mentions'),
+    path('tag/<str:name>/', views.tag_tweets, name='tag_tweets'),
+    path('trending/', views.trending_sidebar, name='trending'),
     path('tweet_like/<int:tweet_id>', views.tweet_like, name='tweet_like'),
+    path('events/', views.tweet_events, name='tweet_events'),
+    path('api/tweets/', views.api_tweets, name='api_tweets'),
+    path('api/users/<str:username>/tweets/', views.api_user_tweets, name='api_user_tweets'),
+    path('api/search/', views.api_search, name='api_search'),
     # Authentication
     path('', views.register, name='register'),
     path('login/', views.login_view, name='login'),
@@ -3,6 +3,9 @@ from django.core.mail import send_mail
 from django.conf import settings
 from textwrap import dedent
 
+# Seconds a registration code stays valid
+OTP_TTL = 120
+
 def generate_otp():
     return str(random.randint(100000, 999999))
 
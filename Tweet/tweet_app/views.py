@@ -1,16 +1,26 @@
 from django.contrib import messages
 from django.shortcuts import render
-from .models import Tweet
+from .models import Tweet, Follow
 from .forms import TweetForm, UserRegistrationsForm, UserLoginForm, UserUpdateForm, ProfileUpdateForm
-from django.shortcuts import get_object_or_404, redirect
+from django.shortcuts import get_object_or_404, aget_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
 from django.contrib.auth import authenticate, login
-from .utils import generate_otp, send_otp_email
+from .utils import OTP_TTL, generate_otp
+from .tasks import send_otp_email
+from .pagination import apaginate_tweets
+from .search import search_tweets
+from . import timeline, images, events, ratelimit, topics, trending, ranking, api
+from .conditional import conditional_page
+from .likes import liked_tweet_ids, aliked_tweet_ids, set_like
+from asgiref.sync import sync_to_async
 import time
 from django.urls import reverse
 # from django.urls import reverse
-from django.http import HttpResponseRedirect
+from django.db import IntegrityError, transaction
+from django.http import HttpResponseRedirect, Http404, JsonResponse, StreamingHttpResponse
+from django.views.decorators.cache import cache_control
+import asyncio
 
 # Create your views here.
 #Create a tweet
@@ -22,41 +32,160 @@ def tweet_create(request):
             tweet = form.save(commit=False)
             tweet.user = request.user
             tweet.save()
+            if tweet.photo:
+                images.schedule_tweet_photo(tweet)
+            timeline.fan_out_tweet(tweet)
+            events.tweet_posted(tweet)
             return redirect('tweet_list')
     else:
         form = TweetForm()
     return render(request, "tweet_form.html",{'form':form})
 
 
+# Async views can't touch the lazy request.user (it would query the DB
+# synchronously), so load it once with the async API and store it back
+async def resolve_user(request):
+    request.user = await request.auser()
+    return request.user
+
+
 # Like or unlike a tweet
 @login_required
-def tweet_like(request, tweet_id):
-    tweet = get_object_or_404(Tweet, pk=tweet_id)
-    
-    if tweet.likes.filter(id=request.user.id).exists():
-        tweet.likes.remove(request.user)
-    else:
-        tweet.likes.add(request.user)
+async def tweet_like(request, tweet_id):
+    user = await resolve_user(request)
+    # "like"/"unlike" are idempotent, anything else toggles
+    intent = {'like': True, 'unlike': False}.get(request.POST.get('action'))
+    try:
+        # One transaction; Django has no async transactions, so it runs in a thread
+        state = await sync_to_async(set_like)(tweet_id, user, liked=intent)
+    except Tweet.DoesNotExist:
+        raise Http404("No Tweet matches the given query.")
     
     # ✅ If the request is from HTMX (the button), just render the button, not the whole page
     if request.headers.get('HX-Request'):
-        return render(request, 'tweet_like_area.html', {'tweet': tweet})
+        # The like area only needs the id and the count, no need to load the row
+        tweet = Tweet(pk=tweet_id, like_count=state.like_count)
+        liked_ids = {tweet_id} if state.liked else set()
+        return render(request, 'tweet_like_area.html', {'tweet': tweet, 'liked_ids': liked_ids})
 
     # Fallback for non-JS users
     return HttpResponseRedirect(request.META.get('HTTP_REFERER', reverse('tweet_list')))
 
 
-#All the tweets
-def tweet_list(request):
+# Seconds between keep-alive comments on an idle stream
+EVENTS_HEARTBEAT = 15
+
+
+# Server-Sent Events stream of like counts and new tweets (see events.py)
+async def tweet_events(request):
+    async def stream():
+        subscription = events.get_broker().subscribe()
+        try:
+            # Reconnect after 5s if the connection drops
+            yield 'retry: 5000\n\n'
+            while True:
+                try:
+                    event, data = await subscription.get(timeout=EVENTS_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    yield ': ping\n\n'
+                    continue
+                yield events.format_event(event, data)
+        finally:
+            subscription.close()
+
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Don't let nginx-style proxies buffer the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+# Builds the ?cursor=... link for the next page, keeping the other query params (e.g. search)
+def next_page_url(request, next_cursor):
+    if not next_cursor:
+        return None
+    params = request.GET.copy()
+    params['cursor'] = next_cursor
+    return f"{request.path}?{params.urlencode()}"
+
+
+# Renders a full page, or only the cards partial when HTMX asks for the next page
+def render_feed(request, template, partial, context):
+    if request.headers.get('HX-Request') and request.GET.get('cursor'):
+        return render(request, partial, context)
+    return render(request, template, context)
+
+
+# What a page of cards depends on, for the ETag of conditional.py
+def feed_version(tweets, next_cursor, liked_ids):
+    return (
+        [(t.pk, t.updated_at, t.like_count, t.user.username) for t in tweets],
+        sorted(liked_ids),
+        next_cursor,
+    )
+
+
+# ?sort=top ranks by the stored score (ranking.py), anything else is newest first
+def feed_paginator(request):
+    return ranking.apaginate_tweets if request.GET.get('sort') == 'top' else apaginate_tweets
+
+
+# Loads the page once: the ETag is computed from it, and the view renders it
+async def tweet_list_page(request):
+    user = await resolve_user(request)
     # Use select_related to join the User table
-    tweets = Tweet.objects.select_related('user').all().order_by("-created_at")
-    return render(request, 'tweet_list.html',{"tweets":tweets})
+    tweets, next_cursor = await feed_paginator(request)(
+        Tweet.objects.select_related('user'), request.GET.get('cursor')
+    )
+    liked_ids = await aliked_tweet_ids(user, tweets)
+    await topics.aload_mentions(tweets)
+    parts = (feed_version(tweets, next_cursor, liked_ids), request.GET.get('sort'))
+    return parts, {'tweets': tweets, 'next_cursor': next_cursor, 'liked_ids': liked_ids}
+
+
+#All the tweets
+@conditional_page(tweet_list_page)
+async def tweet_list(request, page):
+    return render_feed(request, 'tweet_list.html', 'tweet_cards.html', {
+        "tweets": page['tweets'],
+        "liked_ids": page['liked_ids'],
+        "next_url": next_page_url(request, page['next_cursor']),
+        "sort": "top" if request.GET.get('sort') == 'top' else "latest",
+    })
+
+
+# Home timeline: tweets from the people you follow (and your own)
+@login_required
+def home_timeline(request):
+    tweets, next_cursor = timeline.home_timeline(request.user, request.GET.get('cursor'))
+    topics.load_mentions(tweets)
+    return render_feed(request, 'tweet_list.html', 'tweet_cards.html', {
+        "tweets": tweets,
+        "liked_ids": liked_tweet_ids(request.user, tweets),
+        "next_url": next_page_url(request, next_cursor),
+        "message": None if tweets or request.GET.get('cursor') else "Follow people to fill your home timeline.",
+    })
+
+
+async def tweet_detail_page(request, tweet_id):
+    user = await resolve_user(request)
+    tweet = await Tweet.objects.select_related('user').filter(pk=tweet_id).afirst()
+    if tweet is None:
+        return None, None
+    liked_ids = await aliked_tweet_ids(user, [tweet])
+    await topics.aload_mentions([tweet])
+    return feed_version([tweet], None, liked_ids), {'tweet': tweet, 'liked_ids': liked_ids}
 
 
 #singal tweets
-def tweet_detail(request,tweet_id):
-    tweet = get_object_or_404(Tweet, pk =tweet_id)
-    return render(request ,'tweet_detail.html',{"tweet":tweet})
+@conditional_page(tweet_detail_page)
+async def tweet_detail(request, tweet_id, page):
+    if page is None:
+        raise Http404("No Tweet matches the given query.")
+    return render(request ,'tweet_detail.html',{
+        "tweet": page['tweet'],
+        "liked_ids": page['liked_ids'],
+    })
 
 
 #Edit a tweet
@@ -69,6 +198,8 @@ def tweet_edit(request,tweet_id):
             tweet = form.save(commit=False)
             tweet.user = request.user
             tweet.save()
+            if 'photo' in form.changed_data and tweet.photo:
+                images.schedule_tweet_photo(tweet)
             return redirect("tweet_list")
     else:
         form = TweetForm(instance=tweet)
@@ -87,23 +218,30 @@ def tweet_delete(request, tweet_id):
 
 
 @login_required
-def tweet_search(request):
+async def tweet_search(request):
+    user = await resolve_user(request)
     query = request.GET.get('search', '')
     message = None
     
+    next_cursor = None
+
     if query:
-        tweets = Tweet.objects.filter(text__icontains=query)
-        if not tweets.exists():
+        # Ranked full-text search, see search.py for the backends (raw SQL, so in a thread)
+        tweets, next_cursor = await sync_to_async(search_tweets)(query, request.GET.get('cursor'))
+        if not tweets:
             message = "No tweets found matching your search."
+        await topics.aload_mentions(tweets)
     else:
         # If no query, show no results (or all tweets, your choice)
-        tweets = Tweet.objects.none() # Or Tweet.objects.all()
+        tweets = [] # Or Tweet.objects.all()
         message = "Please enter a search term."
 
-    return render(request, 'tweet_list.html', {
+    return render_feed(request, 'tweet_list.html', 'tweet_cards.html', {
         'tweets': tweets,
+        'liked_ids': await aliked_tweet_ids(user, tweets),
         'message': message,
-        'query': query  # Pass query back to show in search box
+        'query': query,  # Pass query back to show in search box
+        'next_url': next_page_url(request, next_cursor),
     })
 
 
@@ -121,6 +259,8 @@ def register(request):
     return redirect('register')
 
 
+# Password guessing: 10 attempts a minute per client
+@ratelimit.ratelimit('login', '10/m', key='ip', methods=('POST',), shared=True)
 def login_view(request):
     if request.method == 'POST':
         # 1. Bind the POST data to the form
@@ -131,15 +271,8 @@ def login_view(request):
             email = form.cleaned_data.get('email')
             password = form.cleaned_data.get('password')
 
-            # 3. Get username from email
-            try:
-                user_obj = User.objects.get(email=email)
-            except User.DoesNotExist:
-                messages.error(request, "Invalid email or password.")
-                return render(request, 'registration/login.html', {'form': form})
-
-            # 4. Authenticate
-            user = authenticate(request, username=user_obj.username, password=password)
+            # 3. Authenticate by email in one lookup (EmailBackend in backends.py)
+            user = authenticate(request, email=email, password=password)
             if user is not None:
                 login(request, user)
                 return redirect('tweet_list')
@@ -157,17 +290,109 @@ def login_view(request):
 
 
 
-# View any user's profile
-def profile(request, username):
-    user_obj = get_object_or_404(User, username=username)
-    # Get all tweets by this specific user
-    user_tweets = Tweet.objects.filter(user=user_obj).order_by("-created_at")
-    
-    return render(request, 'profile.html', {
+async def profile_page(request, username):
+    user = await resolve_user(request)
+    # The template shows profile_user.profile, load it in the same query
+    user_obj = await User.objects.select_related('profile').filter(username=username).afirst()
+    if user_obj is None:
+        return None, None
+    # Get one page of tweets by this specific user
+    user_tweets, next_cursor = await apaginate_tweets(
+        Tweet.objects.filter(user=user_obj), request.GET.get('cursor')
+    )
+    # All tweets on the page share the same author, no need to join it per row
+    for tweet in user_tweets:
+        tweet.user = user_obj
+    liked_ids = await aliked_tweet_ids(user, user_tweets)
+    await topics.aload_mentions(user_tweets)
+    is_following = await is_following_user(user, user_obj)
+    profile = user_obj.profile
+    header = (user_obj.email, profile.bio, profile.profile_pic.name, profile.follower_count, is_following)
+    return (feed_version(user_tweets, next_cursor, liked_ids), header), {
         'profile_user': user_obj,
-        'user_tweets': user_tweets
+        'is_following': is_following,
+        'user_tweets': user_tweets,
+        'liked_ids': liked_ids,
+        'next_cursor': next_cursor,
+    }
+
+
+async def is_following_user(user, user_obj):
+    return user.is_authenticated and await Follow.objects.filter(follower=user, followee=user_obj).aexists()
+
+
+# View any user's profile
+@conditional_page(profile_page)
+async def profile(request, username, page):
+    if page is None:
+        raise Http404("No User matches the given query.")
+    next_cursor = page.pop('next_cursor')
+    return render_feed(request, 'profile.html', 'profile_tweets.html', {
+        **page,
+        'next_url': next_page_url(request, next_cursor),
+    })
+
+# Tweets with a #hashtag, newest first (index scan on TweetTag, see topics.py)
+async def tag_tweets(request, name):
+    user = await resolve_user(request)
+    tweets, next_cursor = await topics.apage(topics.tagged(name), request.GET.get('cursor'))
+    await topics.aload_mentions(tweets)
+    return render_feed(request, 'topic_tweets.html', 'tweet_cards.html', {
+        'heading': f'#{name.lower()}',
+        'tweets': tweets,
+        'liked_ids': await aliked_tweet_ids(user, tweets),
+        'next_url': next_page_url(request, next_cursor),
+    })
+
+
+# Trending sidebar, loaded by layout.html after the page; same for everyone
+@cache_control(public=True, max_age=60)
+def trending_sidebar(request):
+    return render(request, 'trending_sidebar.html', trending.sidebar())
+
+
+# Tweets that @mention a user
+async def user_mentions(request, username):
+    user = await resolve_user(request)
+    user_obj = await aget_object_or_404(User, username=username)
+    tweets, next_cursor = await topics.apage(topics.mentioning(user_obj), request.GET.get('cursor'))
+    await topics.aload_mentions(tweets)
+    return render_feed(request, 'topic_tweets.html', 'tweet_cards.html', {
+        'heading': f'Mentions of @{user_obj.username}',
+        'tweets': tweets,
+        'liked_ids': await aliked_tweet_ids(user, tweets),
+        'next_url': next_page_url(request, next_cursor),
     })
 
+
+# Streaming JSON API (see api.py): all tweets, one author's, search results
+async def api_tweets(request):
+    return api.stream_tweets(request, Tweet.objects.all())
+
+
+async def api_user_tweets(request, username):
+    user_obj = await aget_object_or_404(User, username=username)
+    return api.stream_tweets(request, Tweet.objects.filter(user=user_obj))
+
+
+async def api_search(request):
+    query = request.GET.get('q', '').strip()
+    if not query:
+        return JsonResponse({'error': 'q is required'}, status=400)
+    return api.stream_search(request, query)
+
+
+# Follow / unfollow a user
+@login_required
+def follow_toggle(request, username):
+    followee = get_object_or_404(User, username=username)
+    if request.method == 'POST':
+        if request.POST.get('action') == 'unfollow':
+            timeline.unfollow(request.user, followee)
+        else:
+            timeline.follow(request.user, followee)
+    return redirect('profile', username=username)
+
 # Edit your own profile
 @login_required
 def profile_edit(request):
@@ -176,8 +401,11 @@ def profile_edit(request):
         p_form = ProfileUpdateForm(request.POST, request.FILES, instance=request.user.profile)
 
         if u_form.is_valid() and p_form.is_valid():
+            # The old picture and its resized copies are discarded on save (models.py)
             u_form.save()
-            p_form.save()
+            profile = p_form.save()
+            if 'profile_pic' in p_form.changed_data:
+                images.schedule_profile_pic(profile)
             messages.success(request, f'Your account has been updated!')
             return redirect('profile', username=request.user.username)
 
@@ -195,14 +423,41 @@ def profile_edit(request):
 
 
 # ------------All registeration helper functions with otp
+
+# Every OTP is an email we pay for: cap them per address and per client
+OTP_RATES = [('otp_email', '3/10m', 'email'), ('otp_ip', '10/h', 'ip')]
+
+
+def otp_throttled(request, email, otp_phase):
+    for name, rate, key in OTP_RATES:
+        wait = ratelimit.check(request, name, rate, (lambda r: email) if key == 'email' else key, shared=True)
+        if wait:
+            messages.error(request, f"Too many codes requested. Try again in {int(wait) + 1} seconds.")
+            context = {'otp_phase': True, 'email': email} if otp_phase else {'form': UserRegistrationsForm(request.POST)}
+            response = render(request, 'registration/register.html', context, status=429)
+            response['Retry-After'] = str(int(wait) + 1)
+            return response
+    return None
+
+
+def queue_otp_email(request):
+    # Queued: the SMTP round-trip happens in the job worker. The job gets the
+    # session, not the code; save it now so the worker can read it.
+    request.session.save()
+    send_otp_email.delay(request.session.session_key, request.session['otp_time'])
+
+
 def handle_registration_request(request):
     form = UserRegistrationsForm(request.POST)
     if not form.is_valid():
         return render(request, 'registration/register.html', {'form': form})
 
     # Data is valid (checks were moved to forms.py)
-    otp = generate_otp()
     email = form.cleaned_data['email']
+    throttled = otp_throttled(request, email, otp_phase=False)
+    if throttled:
+        return throttled
+    otp = generate_otp()
 
     # Save to session
     request.session['pending_reg'] = form.cleaned_data
@@ -210,7 +465,7 @@ def handle_registration_request(request):
     request.session['otp_time'] = time.time()
     request.session['reg_email'] = email
 
-    send_otp_email(email, otp)
+    queue_otp_email(request)
     
     messages.info(request, f"OTP sent to {email}.")
     return render(request, 'registration/register.html', {'otp_phase': True, 'email': email})
@@ -226,21 +481,41 @@ def handle_otp_verification(request):
         messages.error(request, "Session expired. Please register again.")
         return redirect('register')
 
-    # 2. Check Time Expiry (120 seconds)
-    if time.time() - otp_time > 120:
+    # 2. Check Time Expiry (OTP_TTL seconds)
+    if time.time() - otp_time > OTP_TTL:
         messages.error(request, "OTP expired.")
         return render(request, 'registration/register.html', {
             'otp_phase': True, 
             'email': user_data['email']
         })
 
-    # 3. Verify OTP
+    # 3. Verify OTP (a handful of guesses per code, not a million)
+    wait = ratelimit.check(request, 'otp_verify', '5/2m', key=lambda r: user_data['email'], shared=True)
+    if wait:
+        messages.error(request, "Too many attempts. Please wait and try again.")
+        response = render(request, 'registration/register.html', {
+            'otp_phase': True,
+            'email': user_data['email']
+        }, status=429)
+        response['Retry-After'] = str(int(wait) + 1)
+        return response
+
     if request.POST.get('otp') == saved_otp:
-        User.objects.create_user(
-            username=user_data['username'],
-            email=user_data['email'],
-            password=user_data['password1']
-        )
+        try:
+            with transaction.atomic():
+                User.objects.create_user(
+                    username=user_data['username'],
+                    email=user_data['email'],
+                    password=user_data['password1']
+                )
+        except IntegrityError:
+            # Another signup took the username or email (any case) since the
+            # form was checked; bound again, the form says which one
+            request.session.flush()
+            form = UserRegistrationsForm(user_data)
+            form.is_valid()
+            messages.error(request, "That account was just registered. Please choose another.")
+            return render(request, 'registration/register.html', {'form': form})
         # Flush session data specifically related to registration
         request.session.flush() 
         messages.success(request, "Registration successful!")
@@ -257,12 +532,15 @@ def handle_resend_otp(request):
     email = request.session.get('reg_email')
     if not email:
         return redirect('register')
+    throttled = otp_throttled(request, email, otp_phase=True)
+    if throttled:
+        return throttled
         
     otp = generate_otp()
     request.session['otp'] = otp
     request.session['otp_time'] = time.time()
     
-    send_otp_email(email, otp)
+    queue_otp_email(request)
     messages.info(request, "New OTP sent.")
     
     return render(request, 'registration/register.html', {'otp_phase': True, 'email': email})
\ No newline at end of file